@@ -0,0 +1,126 @@
+"""So sánh overhead mỗi chunk giữa backend Selenium và CDP trên trang mock cục bộ.
+
+Chạy (cần Chrome, selenium và websocket-client):
+
+    python benchmarks/bench_backends.py --chunks 20 --mode data --output backends.json
+
+Trang mock generate audio ngay lập tức (delay=0), nên thời gian đo được chính là
+chi phí điều khiển trình duyệt + chuyển dữ liệu cho mỗi chunk.
+"""
+
+from __future__ import annotations
+
+import argparse
+import contextlib
+import functools
+import http.server
+import importlib
+import io
+import json
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+BENCH_DIR = Path(__file__).resolve().parent
+ROOT = BENCH_DIR.parent
+
+
+def load_tts_module():
+    """Code nằm trong tts_core.py cạnh 7.py (7.py chỉ là điểm vào dòng lệnh)"""
+    if str(ROOT) not in sys.path:
+        sys.path.insert(0, str(ROOT))
+    return importlib.import_module("tts_core")
+
+
+def serve_directory(directory: Path) -> tuple[http.server.ThreadingHTTPServer, int]:
+    handler = functools.partial(http.server.SimpleHTTPRequestHandler, directory=str(directory))
+    handler.log_message = lambda *args: None
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, server.server_address[1]
+
+
+def build_backend(tts, kind: str, profile_dir: Path, headless: bool):
+    if kind == "cdp":
+        return tts.CdpBackend(profile_dir, headless=headless)
+    from selenium import webdriver
+
+    opts = webdriver.ChromeOptions()
+    opts.add_argument(f"--user-data-dir={profile_dir}")
+    opts.add_argument("--no-sandbox")
+    opts.add_argument("--disable-dev-shm-usage")
+    if headless:
+        opts.add_argument("--headless=new")
+    return tts.SeleniumBackend(webdriver.Chrome(options=opts))
+
+
+def run_backend(tts, kind: str, url: str, text: str, chunks: int, headless: bool) -> list[float]:
+    timings: list[float] = []
+    with tempfile.TemporaryDirectory() as profile_dir, tempfile.TemporaryDirectory() as out_dir:
+        backend = build_backend(tts, kind, Path(profile_dir), headless)
+        try:
+            backend.open(url)
+            for _ in range(chunks):
+                start = time.perf_counter()
+                with contextlib.redirect_stdout(io.StringIO()):
+                    result = tts.simple_interaction_flow(backend, text, Path(out_dir))
+                elapsed = time.perf_counter() - start
+                if result is None:
+                    raise RuntimeError(f"{kind}: flow thất bại trên trang mock")
+                result.unlink()
+                timings.append(elapsed)
+        finally:
+            backend.quit()
+    return timings
+
+
+def summarise(timings: list[float]) -> dict:
+    ordered = sorted(timings)
+    return {
+        "chunks": len(ordered),
+        "mean_s": statistics.fmean(ordered),
+        "median_s": statistics.median(ordered),
+        "p95_s": ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))],
+        "min_s": ordered[0],
+    }
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--backends", nargs="+", default=["selenium", "cdp"])
+    parser.add_argument("--chunks", type=int, default=20)
+    parser.add_argument("--chars", type=int, default=999, help="Độ dài text mỗi chunk")
+    parser.add_argument("--mode", choices=["data", "blob"], default="data")
+    parser.add_argument("--headed", action="store_true", help="Hiện cửa sổ Chrome")
+    parser.add_argument("--output", type=Path, help="Ghi kết quả JSON ra file")
+    args = parser.parse_args(argv)
+
+    tts = load_tts_module()
+    server, port = serve_directory(BENCH_DIR)
+    url = f"http://127.0.0.1:{port}/mock_aistudio.html?mode={args.mode}&delay=0"
+    text = ("Lorem ipsum dolor sit amet. " * (args.chars // 28 + 1))[: args.chars]
+
+    report = {"mode": args.mode, "chars": args.chars, "backends": {}}
+    try:
+        for kind in args.backends:
+            print(f"⏱ {kind}: {args.chunks} chunk...")
+            report["backends"][kind] = summarise(run_backend(tts, kind, url, text, args.chunks, not args.headed))
+    finally:
+        server.shutdown()
+
+    backends = report["backends"]
+    if "selenium" in backends and "cdp" in backends:
+        report["saved_per_chunk_s"] = backends["selenium"]["median_s"] - backends["cdp"]["median_s"]
+
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        args.output.write_text(output, encoding="utf-8")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,255 @@
+"""Micro-benchmark cho các đường xử lý không cần trình duyệt: chia text, đổi tên chunk, kiểm tra WAV, merge.
+
+Chạy offline, input sinh ngẫu nhiên có seed cố định nên kết quả so sánh được giữa các commit:
+
+    python benchmarks/bench_core.py --scale small --output core.json
+    python benchmarks/bench_core.py --scale small --compare core.json   # exit 1 nếu chậm đi
+
+Thang đo (``--scale``): small chạy vài giây, medium ~1 phút, full lên tới 500 MB text
+và 10.000 chunk WAV (cần vài GB RAM / đĩa tạm).
+"""
+
+from __future__ import annotations
+
+import argparse
+import contextlib
+import io
+import itertools
+import json
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Callable
+
+from bench_backends import ROOT, load_tts_module
+
+KB = 1024
+MB = 1024 * KB
+
+SCALES = {
+    "small": {"text": [10 * KB, 1 * MB], "chunks": [10, 100]},
+    "medium": {"text": [10 * KB, 1 * MB, 50 * MB], "chunks": [10, 100, 1000]},
+    "full": {"text": [10 * KB, 1 * MB, 50 * MB, 500 * MB], "chunks": [10, 100, 1000, 10000]},
+}
+
+SPLIT_SENTENCE_MAX = 10 * MB  # Một "câu" dài hơn thế không có trong sách thật
+CHUNK_SECONDS = 0.5
+FRAMERATE = 24000
+
+WORDS = (
+    "một hai ba bốn năm sáu bảy tám chín mười trong ngoài trên dưới trước sau "
+    "người nhà sách chương đoạn câu chữ tiếng nói giọng đọc nghe thấy biết rằng "
+    "lorem ipsum dolor sit amet consectetur adipiscing elit sed do eiusmod tempor"
+).split()
+
+
+@dataclass
+class BenchResult:
+    name: str
+    param: str
+    repeat: int
+    min_s: float
+    median_s: float
+    unit: str  # Đơn vị cho throughput
+    throughput: float  # unit / giây, tính theo min_s
+
+
+def synthetic_text(size: int, seed: int = 1234) -> str:
+    """Text giống văn xuôi: câu 5-40 từ, dấu câu đa dạng, thỉnh thoảng xuống dòng"""
+    rng = random.Random(seed)
+    parts: list[str] = []
+    length = 0
+    base_size = min(size, 1 * MB)
+    while length < base_size:
+        words = rng.choices(WORDS, k=rng.randint(5, 40))
+        words[0] = words[0].capitalize()
+        sentence = " ".join(words) + rng.choice(".!?.,;") + rng.choice(("  ", " ", "\n", " \t"))
+        parts.append(sentence)
+        length += len(sentence)
+    base = "".join(parts)
+    # Text lớn: lặp lại 1 MB gốc, sinh từng từ cho 500 MB thì quá chậm
+    return (base * (size // len(base) + 1))[:size]
+
+
+def synthetic_chunks(tts, directory: Path, count: int, template: str) -> list[Path]:
+    fmt = tts.PcmFormat(1, 2, FRAMERATE)
+    rng = random.Random(count)
+    frames = int(CHUNK_SECONDS * FRAMERATE)
+    paths = []
+    for index in range(1, count + 1):
+        samples = rng.randbytes(frames * fmt.sampwidth)
+        path = directory / template.format(index=index)
+        path.write_bytes(tts.wav_header(fmt, len(samples)) + samples)
+        paths.append(path)
+    return paths
+
+
+def measure(fn: Callable[[], object], repeat: int, setup: Callable[[], object] | None = None) -> list[float]:
+    timings = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            fn()
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def repeats_for(size: int) -> int:
+    return 7 if size <= 1 * MB else 3 if size <= 50 * MB else 1
+
+
+def result(name: str, param: str, timings: list[float], amount: float, unit: str) -> BenchResult:
+    best = min(timings)
+    return BenchResult(name, param, len(timings), best, statistics.median(timings), unit, amount / best if best else 0.0)
+
+
+def bench_text(tts, sizes: list[int]) -> list[BenchResult]:
+    results = []
+    for size in sizes:
+        text = synthetic_text(size)
+        param = f"{size // KB}KB"
+        repeat = repeats_for(size)
+        mb = size / MB
+        results.append(result("normalise_whitespace", param, measure(lambda text=text: tts.normalise_whitespace(text), repeat), mb, "MB"))
+        results.append(result("smart_split", param, measure(lambda text=text: tts.smart_split(text, 999), repeat), mb, "MB"))
+        if size <= SPLIT_SENTENCE_MAX:
+            sentence = tts.normalise_whitespace(text).replace(".", "").replace("!", "").replace("?", "")
+            results.append(result(
+                "split_sentence", param,
+                measure(lambda: list(tts.split_sentence(sentence, 999)), repeat), mb, "MB",
+            ))
+        del text  # Text vài trăm MB: nhả trước khi sinh cỡ tiếp theo (lambda nhận text qua default)
+    return results
+
+
+def bench_rename(tts, counts: list[int], template: str) -> list[BenchResult]:
+    """Đổi tên file download vào thư mục đã có sẵn ``count`` chunk"""
+    results = []
+    for count in counts:
+        renames = min(count, 1000)
+        with tempfile.TemporaryDirectory() as tmp:
+            directory = Path(tmp)
+            for index in range(1, count + 1):
+                (directory / template.format(index=index)).touch()
+            counter = itertools.count(1)
+            batch: list[Path] = []
+
+            def setup():
+                # File download mới, tên kiểu Chrome đặt
+                batch[:] = [directory / f"download ({next(counter)}).wav" for _ in range(renames)]
+                for path in batch:
+                    path.touch()
+
+            def run():
+                for offset, path in enumerate(batch, start=count + 1):
+                    name = tts.build_target_name(template, offset, path)
+                    tts.rename_downloaded_file(path, name).unlink()
+
+            timings = measure(run, 5, setup)
+            results.append(result("build_target_name+rename", f"{count} chunks", timings, renames, "files"))
+    return results
+
+
+def bench_wav(tts, counts: list[int], template: str) -> list[BenchResult]:
+    results = []
+    for count in counts:
+        with tempfile.TemporaryDirectory() as tmp:
+            directory = Path(tmp)
+            paths = synthetic_chunks(tts, directory, count, template)
+            repeat = 5 if count <= 1000 else 3
+            timings = measure(lambda: [tts.validate_wav_chunk(p) for p in paths], repeat)
+            results.append(result("validate_wav_chunk", f"{count} chunks", timings, count, "chunks"))
+
+            downloads = [
+                tts.DownloadResult(index, path, path) for index, path in enumerate(paths, start=1)
+            ]
+            audio_mb = sum(p.stat().st_size for p in paths) / MB
+
+            def merge():
+                if tts.merge_audio_files(directory, list(downloads), count, "merged.wav") is None:
+                    raise RuntimeError("merge_audio_files thất bại")
+
+            timings = measure(merge, repeat)
+            results.append(result("merge_audio_files", f"{count} chunks", timings, audio_mb, "MB"))
+    return results
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(current: list[BenchResult], baseline_path: Path, threshold: float) -> int:
+    """In tỉ lệ thời gian so với baseline; trả về số benchmark chậm hơn ``threshold`` lần"""
+    baseline = {
+        (r["name"], r["param"]): r for r in json.loads(baseline_path.read_text(encoding="utf-8"))["results"]
+    }
+    regressions = 0
+    print(f"\n{'benchmark':<28} {'param':<14} {'baseline':>10} {'now':>10} {'ratio':>7}")
+    for r in current:
+        old = baseline.get((r.name, r.param))
+        if old is None:
+            continue
+        ratio = r.min_s / old["min_s"] if old["min_s"] else float("inf")
+        flag = "  ⚠ chậm hơn" if ratio > threshold else ""
+        regressions += ratio > threshold
+        print(f"{r.name:<28} {r.param:<14} {old['min_s']:>9.4f}s {r.min_s:>9.4f}s {ratio:>6.2f}x{flag}")
+    return regressions
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scale", choices=SCALES, default="small")
+    parser.add_argument("--only", nargs="+", choices=["text", "rename", "wav"], default=["text", "rename", "wav"])
+    parser.add_argument("--output", type=Path, help="Ghi kết quả JSON ra file")
+    parser.add_argument("--compare", type=Path, help="File JSON của lần chạy trước để so sánh")
+    parser.add_argument("--threshold", type=float, default=1.25, help="Tỉ lệ chậm đi coi là regression")
+    args = parser.parse_args(argv)
+
+    tts = load_tts_module()
+    scale = SCALES[args.scale]
+    template = tts.DEFAULT_FILENAME_TEMPLATE
+
+    results: list[BenchResult] = []
+    if "text" in args.only:
+        print("⏱ text...")
+        results += bench_text(tts, scale["text"])
+    if "rename" in args.only:
+        print("⏱ rename...")
+        results += bench_rename(tts, scale["chunks"], template)
+    if "wav" in args.only:
+        print("⏱ wav...")
+        results += bench_wav(tts, scale["chunks"], template)
+
+    for r in results:
+        print(f"{r.name:<28} {r.param:<14} min {r.min_s:.4f}s  median {r.median_s:.4f}s  {r.throughput:,.1f} {r.unit}/s")
+
+    report = {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "scale": args.scale,
+        "results": [asdict(r) for r in results],
+    }
+    if args.output:
+        args.output.write_text(json.dumps(report, indent=2), encoding="utf-8")
+
+    if args.compare:
+        return 1 if compare(results, args.compare, args.threshold) else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,26 @@
+from __future__ import annotations
+
+import importlib
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def load_tts_module():
+    """Code nằm trong tts_core.py cạnh 7.py (7.py chỉ là điểm vào dòng lệnh)"""
+    if str(ROOT) not in sys.path:
+        sys.path.insert(0, str(ROOT))
+    return importlib.import_module("tts_core")
+
+
+@pytest.fixture(scope="session")
+def tts():
+    return load_tts_module()
+
+
+def write_chunk(tts, path: Path, samples: bytes, framerate: int = 24000) -> Path:
+    path.write_bytes(tts.wav_header(tts.PcmFormat(1, 2, framerate), len(samples)) + samples)
+    return path
@@ -0,0 +1,92 @@
+import pytest
+
+TEXT = "Xin chào. Đây là câu thứ hai. " * 12
+
+
+@pytest.fixture
+def generated(tts, monkeypatch):
+    """Đếm số lần khởi động trình duyệt và số chunk thực sự được generate"""
+    counts = {"backends": 0, "chunks": []}
+    build_backend = tts.build_backend
+    submit = tts.DryRunBackend.submit
+
+    def counting_build(*args, **kwargs):
+        counts["backends"] += 1
+        return build_backend(*args, **kwargs)
+
+    def counting_submit(self):
+        counts["chunks"].append(self._text)
+        return submit(self)
+
+    monkeypatch.setattr(tts, "build_backend", counting_build)
+    monkeypatch.setattr(tts.DryRunBackend, "submit", counting_submit)
+    return counts
+
+
+def run(tts, items):
+    return tts.run_batch(items, max_length=120, delay_between_downloads=0, page_load_wait=0, backend="dry-run")
+
+
+def test_batch_shares_one_browser_session(tts, tmp_path, generated):
+    inputs = []
+    for name in ("a", "b"):
+        path = tmp_path / f"{name}.txt"
+        path.write_text(TEXT, encoding="utf-8")
+        inputs.append(path)
+    items = tts.plan_batch(inputs, tmp_path / "out")
+
+    outcomes = run(tts, items)
+
+    assert generated["backends"] == 1
+    assert [outcome.error for outcome in outcomes] == [None, None]
+    for outcome in outcomes:
+        assert outcome.completed_chunks == outcome.total_chunks > 1
+        assert outcome.merged_path.exists()
+    assert len(generated["chunks"]) == sum(outcome.total_chunks for outcome in outcomes)
+
+
+def test_batch_resumes_only_missing_chunks(tts, tmp_path, generated):
+    path = tmp_path / "book.txt"
+    path.write_text(TEXT, encoding="utf-8")
+    items = tts.plan_batch([path], tmp_path / "out")
+    (first,) = run(tts, items)
+    chunks = sorted(items[0].output_dir.glob("audio_chunk_*.wav"))
+    assert len(chunks) == first.total_chunks
+
+    chunks[1].unlink()
+    generated["chunks"].clear()
+    (second,) = run(tts, items)
+
+    assert len(generated["chunks"]) == 1  # Chỉ chunk bị thiếu được generate lại
+    assert second.completed_chunks == second.total_chunks
+    assert chunks[1].exists()
+
+
+def test_failed_input_does_not_stop_the_batch(tts, tmp_path, generated):
+    good = tmp_path / "good.txt"
+    good.write_text(TEXT, encoding="utf-8")
+    items = tts.plan_batch([tmp_path / "missing.txt", good], tmp_path / "out")
+
+    missing, ok = run(tts, items)
+
+    assert missing.error and missing.merged_path is None
+    assert ok.error is None and ok.merged_path.exists()
+
+
+def test_ffmpeg_falls_back_to_path(tts, tmp_path, monkeypatch):
+    bin_dir = tmp_path / "bin"
+    bin_dir.mkdir()
+    ffmpeg = bin_dir / ("ffmpeg.exe" if tts.os.name == "nt" else "ffmpeg")
+    ffmpeg.write_text("", encoding="utf-8")
+    ffmpeg.chmod(0o755)
+    monkeypatch.setattr(tts, "SCRIPT_DIR", tmp_path)  # Không có ffmpeg.exe cạnh script
+    monkeypatch.setenv("PATH", str(bin_dir))
+    monkeypatch.setattr(tts, "FFMPEG_BINARY", tts.FFMPEG_BINARY)
+
+    assert tts.find_ffmpeg() == ffmpeg
+    assert tts.configure_ffmpeg(None)
+    assert tts.FFMPEG_BINARY == str(ffmpeg.resolve())
+
+    monkeypatch.setenv("PATH", str(tmp_path / "empty"))
+    assert tts.find_ffmpeg() is None
+    assert not tts.configure_ffmpeg(None)
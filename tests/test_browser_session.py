@@ -0,0 +1,42 @@
+import subprocess
+import sys
+import time
+
+import pytest
+
+psutil = pytest.importorskip("psutil")
+
+# "Trình duyệt" giả: một process cha với một process con, cha bỏ qua quit
+SPAWN_TREE = "import subprocess, sys, time; subprocess.Popen([sys.executable, '-c', 'import time; time.sleep(60)']); time.sleep(60)"
+
+
+def sleeper():
+    return subprocess.Popen([sys.executable, "-c", "import time; time.sleep(60)"])
+
+
+def test_discard_kills_only_the_session_browser(tts, tmp_path):
+    browser = subprocess.Popen([sys.executable, "-c", SPAWN_TREE])
+    other_worker = sleeper()
+    try:
+        root = psutil.Process(browser.pid)
+        for _ in range(100):
+            if root.children():
+                break
+            time.sleep(0.05)
+        child = root.children()[0]
+
+        backend = tts.DryRunBackend()
+        backend.browser_pid = lambda: browser.pid
+        session = tts.BrowserSession(tmp_path, interactive=False, backend="dry-run")
+        session.backend = backend
+        session.discard()
+
+        assert session.backend is None
+        browser.wait(10)
+        psutil.wait_procs([child], timeout=10)
+        assert not child.is_running()
+        assert other_worker.poll() is None  # Process của worker khác không bị đụng tới
+    finally:
+        for process in (browser, other_worker):
+            process.kill()
+            process.wait()
@@ -0,0 +1,19 @@
+import socket
+import subprocess
+import sys
+
+import pytest
+
+
+def test_websocket_url_retries_until_timeout_when_devtools_refuses(tts):
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]  # Cổng không ai nghe: urlopen bị connection refused
+    backend = tts.CdpBackend.__new__(tts.CdpBackend)
+    backend.process = subprocess.Popen([sys.executable, "-c", "import time; time.sleep(30)"])
+    try:
+        with pytest.raises(tts.CdpError):
+            backend._page_websocket_url(port, timeout=0.5)
+    finally:
+        backend.process.kill()
+        backend.process.wait()
@@ -0,0 +1,66 @@
+import random
+
+MAX_LENGTH = 300
+WORDS = "trời hôm nay xanh lắm gió nhẹ thổi qua cánh đồng lúa chín vàng người nông dân đang gặt".split()
+
+
+def book(paragraphs=30, seed=7):
+    rng = random.Random(seed)
+    text = []
+    for _ in range(paragraphs):
+        sentences = []
+        for _ in range(rng.randint(4, 10)):
+            words = rng.choices(WORDS, k=rng.randint(4, 18))
+            sentences.append(" ".join(words).capitalize() + rng.choice(".!?"))
+        text.append(" ".join(sentences))
+    return "\n\n".join(text)
+
+
+def keys(tts, chunks):
+    return [tts.chunk_key(chunk) for chunk in chunks]
+
+
+def edit_sentence(text, paragraph, new_word="ĐÃ SỬA"):
+    paragraphs = text.split("\n\n")
+    paragraphs[paragraph] = paragraphs[paragraph].replace(" ", f" {new_word} ", 1)
+    return "\n\n".join(paragraphs)
+
+
+def test_content_chunks_respect_max_length(tts):
+    text = book()
+    chunks = tts.content_split(text, MAX_LENGTH)
+    assert all(len(chunk) <= MAX_LENGTH for chunk in chunks)
+    assert " ".join(chunks).split() == text.split()  # Không mất / lặp chữ nào
+
+
+def test_edit_changes_only_nearby_chunks(tts):
+    text = book()
+    before = tts.content_split(text, MAX_LENGTH)
+    after = tts.content_split(edit_sentence(text, 15), MAX_LENGTH)
+    old, new = keys(tts, before), keys(tts, after)
+
+    changed = [position for position, key in enumerate(new) if key not in set(old)]
+    assert 1 <= len(changed) <= 2
+    assert any("ĐÃ SỬA" in after[position] for position in changed)
+    # Phần trước và sau chỗ sửa giữ nguyên key: audio cũ được dùng lại
+    tail = len(new) - changed[-1] - 1
+    assert new[: changed[0]] == old[: changed[0]]
+    assert new[len(new) - tail:] == old[len(old) - tail:]
+
+
+def changed_positions(tts, split, text, edited):
+    old = set(keys(tts, split(text, MAX_LENGTH)))
+    return [position for position, key in enumerate(keys(tts, split(edited, MAX_LENGTH))) if key not in old]
+
+
+def test_insertion_near_start_resyncs_instead_of_shifting_everything(tts):
+    text = book()
+    edited = edit_sentence(text, 1, "một đoạn chèn thêm khá dài vào giữa câu để đẩy mọi thứ phía sau")
+    total = len(tts.content_split(edited, MAX_LENGTH))
+
+    content = changed_positions(tts, tts.content_split, text, edited)
+    assert content == list(range(content[0], content[-1] + 1))  # Một cụm liền nhau quanh chỗ sửa
+    assert content[-1] < total // 4  # Ranh giới khớp lại sớm, phần còn lại giữ key
+
+    greedy = changed_positions(tts, tts.smart_split, text, edited)
+    assert len(greedy) > total // 2  # Đóng gói tham lam: mọi chunk phía sau đều dịch
@@ -0,0 +1,90 @@
+import math
+import random
+
+import pytest
+
+TEXT = "\n\n".join(
+    " ".join(f"Câu {p}.{s} có vài chữ để đo độ dài chunk." for s in range(random.Random(p).randint(3, 12)))
+    for p in range(400)
+)
+
+
+def trace(tts, chars, outcome, latency):
+    return tts.ChunkTrace(index=1, chars=chars, attempt=1, outcome=outcome, latency=latency)
+
+
+def fitted_model(tts, seed=1):
+    """Latency = 5 + 20x + 10x² (x = nghìn ký tự), xác suất lỗi σ(-4 + 3x)"""
+    rng = random.Random(seed)
+    model = tts.ChunkCostModel()
+    for _ in range(20000):
+        chars = rng.randrange(50, 2000)
+        x = chars / 1000
+        failed = rng.random() < 1 / (1 + math.exp(4 - 3 * x))
+        latency = 5 + 20 * x + 10 * x * x
+        model.observe(trace(tts, chars, "fail" if failed else "ok", latency))
+    return model
+
+
+def test_latency_regression_recovers_quadratic(tts):
+    a, b, c = fitted_model(tts).latency_coefficients()
+    assert (a, b, c) == pytest.approx((5, 20, 10), rel=1e-6)
+
+
+def test_logistic_fit_recovers_failure_curve(tts):
+    alpha, beta = fitted_model(tts).failure_coefficients()
+    assert alpha == pytest.approx(-4, abs=0.3)
+    assert beta == pytest.approx(3, abs=0.3)
+
+
+def test_quota_and_cancelled_traces_are_ignored(tts):
+    model = tts.ChunkCostModel()
+    model.observe(trace(tts, 500, "quota", 3))
+    model.observe(trace(tts, 500, "cancelled", 3))
+    assert model.samples == 0 and not model.failure_bins
+
+
+def test_choose_max_length_matches_brute_force_on_short_text(tts):
+    model = fitted_model(tts)
+    text = TEXT[:20000]
+    best, predicted = tts.choose_max_length(text, model, cap=999)
+    brute = min(
+        (model.expected_job_time(tts.split_text(text, length), 10.0), length)
+        for length in sorted({*range(200, 999, 50), 999})
+    )
+    assert (predicted, best) == pytest.approx(brute)
+
+
+def test_choose_max_length_work_is_capped(tts, monkeypatch):
+    model = fitted_model(tts)
+    text = TEXT * 20  # Vài MB
+    split_text, fits = tts.split_text, []
+    split_sizes = []
+    failure_coefficients = model.failure_coefficients
+
+    def recording_split(sample, *args, **kwargs):
+        split_sizes.append(len(sample))
+        return split_text(sample, *args, **kwargs)
+
+    def counting_fit(*args, **kwargs):
+        fits.append(1)
+        return failure_coefficients(*args, **kwargs)
+
+    monkeypatch.setattr(tts, "split_text", recording_split)
+    monkeypatch.setattr(model, "failure_coefficients", counting_fit)
+    best, predicted = tts.choose_max_length(text, model, cap=999)
+
+    assert len(split_sizes) == 17
+    assert max(split_sizes) < 1.1 * tts.PLAN_SAMPLE_CHARS < len(text) / 10
+    assert len(fits) == 1  # Logistic chỉ fit một lần, không phải mỗi chunk
+    # Ước lượng trên mẫu gần với tính trên toàn bộ sách
+    full = model.expected_job_time(split_text(text, best), 10.0)
+    assert predicted == pytest.approx(full, rel=0.05)
+
+
+def test_new_trace_invalidates_fit(tts):
+    model = fitted_model(tts)
+    before = model.expected_latency(1000)
+    for _ in range(20000):
+        model.observe(trace(tts, 1000, "ok", 200))
+    assert model.expected_latency(1000) > before
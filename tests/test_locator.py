@@ -0,0 +1,33 @@
+SELECTORS = (
+    ("slow", "css", "textarea.slow"),
+    ("fast", "css", "textarea.fast"),
+    ("other", "css", "textarea"),
+)
+
+
+def test_fastest_selector_is_tried_first(tts, tmp_path):
+    locator = tts.Locator("input", SELECTORS, stats_path=tmp_path / "stats.json")
+    locator.record(locator.ranked(), 0, 0.050)
+    # "slow" khớp lần trước nhưng chậm hơn "fast" -> "fast" lên đầu dù trúng sau
+    locator.record([SELECTORS[1]], 0, 0.005)
+    assert [name for name, _, _ in locator.ranked()] == ["fast", "slow", "other"]
+
+    reloaded = tts.Locator("input", SELECTORS, stats_path=tmp_path / "stats.json")
+    assert reloaded.ranked()[0][0] == "fast"
+
+
+def test_missed_selector_drops_behind_working_ones(tts, tmp_path):
+    locator = tts.Locator("input", SELECTORS, stats_path=None)
+    locator.record([SELECTORS[1]], 0, 0.001)
+    ranked = locator.ranked()
+    assert ranked[0][0] == "fast"
+    # "fast" không còn khớp, "slow" trúng ở vị trí sau -> "fast" phải rời vị trí đầu
+    locator.record(ranked, 1, 0.080)
+    assert [name for name, _, _ in locator.ranked()] == ["slow", "fast", "other"]
+
+
+def test_latency_is_a_moving_average(tts):
+    locator = tts.Locator("input", SELECTORS, stats_path=None)
+    locator.record(list(SELECTORS), 0, 0.010)
+    locator.record(list(SELECTORS), 0, 0.110)
+    assert locator._load_stats()["slow"]["ms"] == 10 + tts.LOCATOR_EWMA_ALPHA * 100
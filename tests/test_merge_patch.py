@@ -0,0 +1,72 @@
+import os
+import random
+
+import pytest
+
+from conftest import write_chunk
+
+
+def pcm(seed, size):
+    rng = random.Random(seed)
+    return bytes(rng.randrange(256) for _ in range(size))
+
+
+@pytest.fixture
+def chunks(tts, tmp_path):
+    paths = [write_chunk(tts, tmp_path / f"audio_chunk_{i:04d}.wav", pcm(i, 4800 + 200 * i)) for i in range(1, 5)]
+    return [tts.DownloadResult(i, path, path) for i, path in enumerate(paths, start=1)]
+
+
+def rewrite(tts, path, samples):
+    stat = path.stat()
+    write_chunk(tts, path, samples)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+
+def merge(tts, tmp_path, chunks, name="final.wav"):
+    return tts.merge_audio_files(tmp_path, list(chunks), len(chunks), name)
+
+
+def assert_same_as_fresh_merge(tts, tmp_path, chunks, output):
+    fresh = merge(tts, tmp_path, chunks, "fresh.wav")
+    assert output.read_bytes() == fresh.read_bytes()
+
+
+def test_same_length_chunk_is_patched_in_place(tts, tmp_path, chunks, capsys):
+    output = merge(tts, tmp_path, chunks)
+    rewrite(tts, chunks[1].final_path, pcm(99, 5200))
+    capsys.readouterr()
+
+    assert merge(tts, tmp_path, chunks) == output
+    assert "Vá tại chỗ audio_chunk_0002.wav" in capsys.readouterr().out
+    assert_same_as_fresh_merge(tts, tmp_path, chunks, output)
+
+
+def test_longer_chunk_rebuilds_from_its_position(tts, tmp_path, chunks, capsys):
+    output = merge(tts, tmp_path, chunks)
+    rewrite(tts, chunks[1].final_path, pcm(99, 9000))
+    capsys.readouterr()
+
+    merge(tts, tmp_path, chunks)
+    assert "Ghi lại output từ audio_chunk_0002.wav (3 chunk)" in capsys.readouterr().out
+    assert_same_as_fresh_merge(tts, tmp_path, chunks, output)
+
+
+def test_lock_left_by_killed_process_does_not_block_patching(tts, tmp_path, chunks, capsys):
+    output = merge(tts, tmp_path, chunks)
+    output.with_name(output.name + ".lock").write_text("4242")  # Process vá trước bị kill
+    rewrite(tts, chunks[2].final_path, pcm(98, 5400))
+    capsys.readouterr()
+
+    merge(tts, tmp_path, chunks)
+    assert "Vá tại chỗ audio_chunk_0003.wav" in capsys.readouterr().out
+    assert_same_as_fresh_merge(tts, tmp_path, chunks, output)
+
+
+def test_busy_lock_falls_back_to_full_merge(tts, tmp_path, chunks):
+    output = merge(tts, tmp_path, chunks)
+    rewrite(tts, chunks[0].final_path, pcm(97, 5000))
+    with tts.FileLock(output.with_name(output.name + ".lock")):
+        assert tts.patch_merged_output(output, [c.final_path for c in chunks]) is None
+    merge(tts, tmp_path, chunks)
+    assert_same_as_fresh_merge(tts, tmp_path, chunks, output)
@@ -0,0 +1,34 @@
+from __future__ import annotations
+
+import struct
+
+import pytest
+
+from conftest import write_chunk
+
+np = pytest.importorskip("numpy")
+
+
+def tone(frames: int, amplitude: int = 8000) -> bytes:
+    return struct.pack(f"<{frames}h", *([amplitude, -amplitude] * (frames // 2)))
+
+
+def test_silent_chunk_trims_to_nothing(tts):
+    params = tts.PcmFormat(1, 2, 24000)
+    silent = bytes(24000 * 2)
+    assert bytes(tts.postprocess_pcm(silent, params, tts.PostProcessConfig())) == b""
+
+
+def test_merge_with_silent_chunk(tts, tmp_path):
+    paths = [
+        write_chunk(tts, tmp_path / "a.wav", tone(2400)),
+        write_chunk(tts, tmp_path / "b.wav", bytes(4800)),
+        write_chunk(tts, tmp_path / "c.wav", tone(2400)),
+    ]
+    config = tts.PostProcessConfig(gap_ms=100)
+    spans = tts.merge_wav_streaming(paths, tmp_path / "out.wav", config)
+
+    assert spans[1].size == 0
+    layout = tts.read_wav_layout(tmp_path / "out.wav")
+    gap = len(tts.merge_gap(layout.format, config))
+    assert layout.data_size == spans[0].size + spans[2].size + 2 * gap
@@ -0,0 +1,80 @@
+import json
+import multiprocessing
+import os
+import time
+
+from conftest import load_tts_module
+
+
+def make_profile(root):
+    files = {
+        "Local State": "{}",
+        "Default/Preferences": "{}",
+        "Default/Cookies": "cookies",
+        "Default/Local Storage/leveldb/000003.log": "storage",
+        "Default/Local Storage/leveldb/LOCK": "",
+        "Default/Cache/Cache_Data/data_0": "cache",
+        "Default/Service Worker/Database/000001.log": "sw",
+        "SingletonLock": "",
+    }
+    for name, content in files.items():
+        path = root / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(content, encoding="utf-8")
+    return root
+
+
+def tree(root):
+    return sorted(str(path.relative_to(root)).replace(os.sep, "/") for path in root.rglob("*") if path.is_file())
+
+
+def test_snapshot_keeps_only_login_state(tts, tmp_path):
+    source = make_profile(tmp_path / "Profile")
+    snapshot = tts.ProfileSnapshot(source, tmp_path / "snapshots" / "Profile")
+    snapshot.ensure()
+    assert tree(snapshot.path) == [
+        ".snapshot",
+        "Default/Cookies",
+        "Default/Local Storage/leveldb/000003.log",
+        "Default/Preferences",
+        "Local State",
+    ]
+    assert not snapshot.is_stale()
+
+    future = time.time() + 10
+    os.utime(source / "Default/Cookies", (future, future))  # Đăng nhập lại: cookie mới hơn
+    assert snapshot.is_stale()
+
+
+def clone_snapshot(source, snapshot_dir, barrier, results_path):
+    tts = load_tts_module()
+    clones = []
+    barrier.wait(30)
+    for round in range(100):
+        stamp = time.time() + 10 + round
+        os.utime(source / "Default/Cookies", (stamp, stamp))  # Worker nào cũng thấy snapshot cũ
+        clone = tts.ProfileSnapshot(source, snapshot_dir).clone()
+        clones.append(tree(clone))
+        tts.discard_profile_clone(clone)
+    results_path.write_text(json.dumps(clones), encoding="utf-8")
+
+
+def test_concurrent_clone_never_sees_a_half_built_snapshot(tts, tmp_path):
+    source = make_profile(tmp_path / "Profile")
+    snapshot_dir = tmp_path / "snapshots" / "Profile"
+    context = multiprocessing.get_context("spawn")
+    barrier = context.Barrier(4)
+    results = [tmp_path / f"clones{n}.txt" for n in range(4)]
+    workers = [
+        context.Process(target=clone_snapshot, args=(source, snapshot_dir, barrier, path)) for path in results
+    ]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join(60)
+        assert worker.exitcode == 0
+
+    expected = tree(snapshot_dir)
+    for path in results:
+        assert json.loads(path.read_text(encoding="utf-8")) == [expected] * 100
+    assert sorted(p.name for p in snapshot_dir.parent.iterdir()) == ["Profile"]
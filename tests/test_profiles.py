@@ -0,0 +1,58 @@
+import multiprocessing
+
+from conftest import load_tts_module
+
+
+def use_profile(path, times, limited):
+    tts = load_tts_module()
+    registry = tts.ProfileRegistry(path)
+    for _ in range(times):
+        registry.record_use("main")
+    if limited:
+        registry.mark_limited("spare", "quota")
+
+
+def test_concurrent_registries_keep_every_update(tts, tmp_path):
+    path = tmp_path / "profiles.json"
+    registry = tts.ProfileRegistry(path)
+    registry.add("main", daily_quota=1000)
+    registry.add("spare")
+
+    context = multiprocessing.get_context("spawn")
+    workers = [context.Process(target=use_profile, args=(path, 25, n == 0)) for n in range(2)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join(60)
+        assert worker.exitcode == 0
+
+    final = tts.ProfileRegistry(path)
+    assert final.profiles["main"].used_today == 50
+    assert final.profiles["main"].daily_quota == 1000
+    # Cooldown do một worker ghi không bị record_use của worker kia xóa
+    assert final.profiles["spare"].last_signal == "quota"
+    assert not final.profiles["spare"].is_available()
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["profiles.json"]
+
+
+def test_pick_sees_cooldown_from_other_registry(tts, tmp_path):
+    path = tmp_path / "profiles.json"
+    mine = tts.ProfileRegistry(path)
+    mine.add("main")
+    theirs = tts.ProfileRegistry(path)
+    state = mine.profiles["main"]
+
+    theirs.mark_limited("main", "rate_limit")
+    mine.reload()
+    assert state.last_signal == "rate_limit"  # Object đang dùng được cập nhật tại chỗ
+    assert not state.is_available()
+
+
+def test_file_lock_is_exclusive_and_cleaned_up(tts, tmp_path):
+    path = tmp_path / "state.lock"
+    with tts.FileLock(path):
+        assert not tts.FileLock(path).acquire(timeout=0)
+    assert not path.exists()
+    other = tts.FileLock(path)
+    assert other.acquire(timeout=0)
+    other.release()
@@ -0,0 +1,21 @@
+import tracemalloc
+
+
+def test_stop_leaves_caller_tracing_running(tts, tmp_path):
+    tracemalloc.start()
+    try:
+        profiler = tts.ChunkProfiler(tts.ProfilingConfig(tmp_path), tmp_path)
+        profiler.start()
+        profiler.stop()
+        assert tracemalloc.is_tracing()
+    finally:
+        tracemalloc.stop()
+
+
+def test_stop_ends_tracing_it_started(tts, tmp_path):
+    assert not tracemalloc.is_tracing()
+    profiler = tts.ChunkProfiler(tts.ProfilingConfig(tmp_path), tmp_path)
+    profiler.start()
+    profiler.stop()
+    assert not tracemalloc.is_tracing()
+    assert (tmp_path / "snapshot_final.txt").exists()
@@ -0,0 +1,67 @@
+from __future__ import annotations
+
+import shutil
+import struct
+
+import pytest
+
+from conftest import write_chunk
+
+pytest.importorskip("numpy")
+
+
+def tone(frames: int, amplitude: int = 8000) -> bytes:
+    return struct.pack(f"<{frames}h", *([amplitude, -amplitude] * (frames // 2)))
+
+
+def batch_merge(tts, directory, count, postprocess):
+    paths = [directory / tts.DEFAULT_FILENAME_TEMPLATE.format(index=i) for i in range(1, count + 1)]
+    results = [tts.DownloadResult(i, p, p) for i, p in enumerate(paths, start=1)]
+    return tts.merge_audio_files(directory, results, count, "batch.wav", postprocess)
+
+
+def progressive(tts, directory, count, postprocess):
+    config = tts.ProgressiveConfig("final.wav", postprocess)
+    return tts.ProgressiveOutput(directory, tts.DEFAULT_FILENAME_TEMPLATE, ["k"] * count, config)
+
+
+def chunk_path(tts, directory, index):
+    return directory / tts.DEFAULT_FILENAME_TEMPLATE.format(index=index)
+
+
+def test_silent_chunk_keeps_live_output_identical_to_merge(tts, tmp_path):
+    live_dir, merge_dir = tmp_path / "live", tmp_path / "merge"
+    live_dir.mkdir()
+    for index, samples in enumerate((tone(2400), bytes(4800), tone(1200)), start=1):
+        write_chunk(tts, chunk_path(tts, live_dir, index), samples)
+    shutil.copytree(live_dir, merge_dir)
+    postprocess = tts.PostProcessConfig(gap_ms=100)
+
+    output = progressive(tts, live_dir, 3, postprocess).start()
+
+    assert output.finished and output.path == live_dir / "final.wav"
+    merged = batch_merge(tts, merge_dir, 3, postprocess)
+    assert (live_dir / "final.wav").read_bytes() == merged.read_bytes()
+
+
+def test_failed_chunk_is_reported_and_retried(tts, tmp_path, capsys):
+    write_chunk(tts, chunk_path(tts, tmp_path, 1), tone(2400))
+    chunk_path(tts, tmp_path, 2).write_bytes(b"RIFF....WAVEjunk")
+    postprocess = tts.PostProcessConfig(gap_ms=100)
+
+    output = progressive(tts, tmp_path, 2, postprocess).start()
+
+    assert output.position == 1 and not output.finished
+    assert "audio_chunk_0002.wav" in capsys.readouterr().out
+    prefix = (tmp_path / "final.live.wav").read_bytes()
+    assert prefix[:4] == b"RIFF"
+
+    write_chunk(tts, chunk_path(tts, tmp_path, 2), tone(1200))
+    output.advance()
+
+    assert output.finished
+    final = (tmp_path / "final.wav").read_bytes()
+    (tmp_path / "final.wav").rename(tmp_path / "live_final.wav")
+    tts.MergeIndex.discard(tmp_path / "final.wav")
+    merged = batch_merge(tts, tmp_path, 2, postprocess)
+    assert final == merged.read_bytes()
@@ -0,0 +1,148 @@
+import multiprocessing
+import sys
+import time
+
+import pytest
+
+from conftest import load_tts_module, write_chunk
+
+CHUNKS = [f"Câu số {index}." for index in range(1, 41)]
+
+
+def drain(db_path, worker, results_path):
+    """Worker dry-run: nhận chunk tới khi hết, ghi lại các chunk mình hoàn thành"""
+    tts = load_tts_module()
+    queue = tts.ChunkQueue(db_path)
+    completed = []
+    try:
+        while (claimed := queue.claim("job", worker)) is not None:
+            index, _ = claimed
+            time.sleep(0.005)  # Cho các worker khác chen vào giữa claim và complete
+            if queue.complete("job", index, worker, results_path):
+                completed.append(index)
+    finally:
+        queue.close()
+    results_path.write_text(" ".join(map(str, completed)), encoding="utf-8")
+
+
+def claim_and_hang(db_path, claimed):
+    """Worker nhận chunk với lease ngắn rồi treo cho tới khi bị kill"""
+    tts = load_tts_module()
+    queue = tts.ChunkQueue(db_path)
+    index, _ = queue.claim("job", "doomed", lease_seconds=1.0)
+    claimed.put(index)
+    time.sleep(60)
+
+
+# ffmpeg giả: ghi STREAMINFO khớp WAV đầu vào, kèm tên file nguồn để biết bản nào thắng
+FAKE_FFMPEG = """#!{python}
+import struct, sys
+source, target = sys.argv[sys.argv.index("-i") + 1], sys.argv[-1]
+head = open(source, "rb").read(44)
+channels, rate = struct.unpack_from("<HI", head, 22)
+bits, = struct.unpack_from("<H", head, 34)
+size, = struct.unpack_from("<I", head, 40)
+frames = size // (channels * bits // 8)
+packed = (rate << 44) | ((channels - 1) << 41) | ((bits - 1) << 36) | frames
+info = bytes(10) + struct.pack(">Q", packed) + bytes(16)
+open(target, "wb").write(b"fLaC" + bytes([0x80, 0, 0, 34]) + info + source.encode())
+"""
+
+
+def finish_same_chunks(db_path, download_dir, ffmpeg, worker, barrier, results_path):
+    """Worker tải xong cùng các chunk với worker kia và cùng lúc nộp bản FLAC"""
+    tts = load_tts_module()
+    tts.FFMPEG_BINARY = str(ffmpeg)
+    queue = tts.ChunkQueue(db_path)
+    won = []
+    try:
+        for index in range(1, 11):
+            downloaded = write_chunk(tts, download_dir / f"download_{worker}_{index}.wav", bytes(4800))
+            barrier.wait(30)
+            target_name = f"audio_chunk_{index:04d}.wav"
+            if tts.publish_queue_chunk(queue, "job", index, worker, downloaded, target_name, "flac"):
+                won.append(index)
+    finally:
+        queue.close()
+    results_path.write_text(" ".join(map(str, won)), encoding="utf-8")
+
+
+@pytest.fixture
+def context():
+    return multiprocessing.get_context("spawn")
+
+
+def test_each_chunk_completed_exactly_once(tts, tmp_path, context):
+    db_path = tmp_path / "queue.db"
+    queue = tts.ChunkQueue(db_path)
+    queue.enqueue("job", CHUNKS)
+    results = [tmp_path / f"worker{n}.txt" for n in range(4)]
+    workers = [context.Process(target=drain, args=(db_path, f"w{n}", path)) for n, path in enumerate(results)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join(60)
+        assert worker.exitcode == 0
+
+    completed = [int(index) for path in results for index in path.read_text(encoding="utf-8").split()]
+    assert sorted(completed) == list(range(1, len(CHUNKS) + 1))
+    assert queue.progress("job").get("done") == len(CHUNKS)
+    queue.close()
+
+
+def test_lease_expires_when_worker_dies(tts, tmp_path, context):
+    db_path = tmp_path / "queue.db"
+    queue = tts.ChunkQueue(db_path)
+    queue.enqueue("job", CHUNKS[:1])
+    claimed = context.Queue()
+    doomed = context.Process(target=claim_and_hang, args=(db_path, claimed))
+    doomed.start()
+    index = claimed.get(timeout=30)
+    doomed.kill()
+    doomed.join(10)
+
+    assert queue.claim("job", "survivor") is None  # Lease còn hạn: chưa được lấy lại
+    time.sleep(1.1)
+    assert queue.claim("job", "survivor") == (index, CHUNKS[0])
+    assert queue.complete("job", index, "survivor", tmp_path / "chunk.wav")
+    queue.close()
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="ffmpeg giả là script có shebang")
+def test_losing_worker_never_touches_accepted_flac(tts, tmp_path, context):
+    db_path = tmp_path / "queue.db"
+    queue = tts.ChunkQueue(db_path)
+    queue.enqueue("job", CHUNKS[:10])
+    ffmpeg = tmp_path / "ffmpeg"
+    ffmpeg.write_text(FAKE_FFMPEG.format(python=sys.executable), encoding="utf-8")
+    ffmpeg.chmod(0o755)
+    download_dir = tmp_path / "chunks"
+    download_dir.mkdir()
+    barrier = context.Barrier(2)
+    results = {worker: tmp_path / f"{worker}.txt" for worker in ("alpha", "beta")}
+    workers = [
+        context.Process(target=finish_same_chunks, args=(db_path, download_dir, ffmpeg, worker, barrier, path))
+        for worker, path in results.items()
+    ]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join(60)
+        assert worker.exitcode == 0
+
+    winners = {}
+    for worker, path in results.items():
+        for index in path.read_text(encoding="utf-8").split():
+            assert int(index) not in winners  # Mỗi chunk chỉ một bản được công nhận
+            winners[int(index)] = worker
+    assert sorted(winners) == list(range(1, 11))
+    for index, worker in winners.items():
+        accepted = download_dir / f"audio_chunk_{index:04d}.flac"
+        assert accepted.read_bytes().endswith(f"{worker}.part.wav".encode())
+        row = queue._db.execute("SELECT result FROM chunks WHERE job = 'job' AND idx = ?", (index,)).fetchone()
+        assert row[0] == str(accepted)
+    # Bản thua chỉ xóa file riêng của nó
+    assert sorted(path.name for path in download_dir.iterdir()) == [
+        f"audio_chunk_{index:04d}.flac" for index in range(1, 11)
+    ]
+    queue.close()
@@ -0,0 +1,102 @@
+import argparse
+import time
+
+import pytest
+
+CHUNKS = [f"Câu số {index} có độ dài gần như nhau." for index in range(1, 31)]
+
+
+@pytest.fixture
+def queue(tts):
+    queue = tts.ChunkQueue(":memory:")
+    yield queue
+    queue.close()
+
+
+def add_job(queue, job, chunks=CHUNKS, **settings):
+    queue.enqueue(job, chunks)
+    if settings:
+        queue.configure_job(job, **settings)
+
+
+def run_chunk(queue, job):
+    index, _ = queue.claim(job, "worker")
+    queue.complete(job, index, "worker", f"{job}_{index}.wav")
+
+
+def test_job_at_risk_of_missing_deadline_runs_first(tts, queue):
+    add_job(queue, "urgent", deadline=time.time() + 600)  # 30 chunk x ~70s: không kịp
+    add_job(queue, "important", priority=5)
+    add_job(queue, "relaxed", deadline=time.time() + 30 * 86400)
+    scheduler = tts.JobScheduler(delay=10)
+
+    assert [stats.job for stats in scheduler.rank(queue.job_stats())] == ["urgent", "important", "relaxed"]
+    assert scheduler.next_job(queue) == "urgent"
+
+
+def test_weight_splits_work_by_virtual_time(tts, queue):
+    add_job(queue, "heavy", weight=2)
+    add_job(queue, "light")
+    scheduler = tts.JobScheduler(delay=10)
+
+    served = {"heavy": 0, "light": 0}
+    for _ in range(30):
+        job = scheduler.next_job(queue)
+        run_chunk(queue, job)
+        served[job] += 1
+    assert served == {"heavy": 20, "light": 10}
+
+
+def test_late_job_starts_at_the_current_virtual_time(tts, queue):
+    add_job(queue, "old")
+    scheduler = tts.JobScheduler(delay=10)
+    for _ in range(10):
+        run_chunk(queue, "old")
+    add_job(queue, "new")
+
+    served = {"old": 0, "new": 0}
+    for _ in range(10):
+        job = scheduler.next_job(queue)
+        run_chunk(queue, job)
+        served[job] += 1
+    assert served == {"old": 5, "new": 5}  # Không được độc chiếm worker để "đòi" phần đã lỡ
+
+
+def test_same_class_yields_only_after_quantum(tts, queue):
+    add_job(queue, "a")
+    add_job(queue, "b")
+    scheduler = tts.JobScheduler(delay=10, quantum=3)
+    for _ in range(2):
+        run_chunk(queue, "a")
+
+    assert scheduler.preempted_by(queue, "a", served=2) is None
+    run_chunk(queue, "a")
+    assert scheduler.preempted_by(queue, "a", served=3) == "b"
+
+
+def test_higher_class_preempts_immediately(tts, queue):
+    add_job(queue, "a")
+    add_job(queue, "b")
+    scheduler = tts.JobScheduler(delay=10, quantum=3)
+    run_chunk(queue, "a")
+    assert scheduler.preempted_by(queue, "a", served=1) is None
+
+    queue.configure_job("b", priority=1)
+    assert scheduler.preempted_by(queue, "a", served=1) == "b"
+
+
+def test_finished_job_is_not_reported_as_preempted(tts, queue):
+    add_job(queue, "a", chunks=CHUNKS[:1])
+    add_job(queue, "b")
+    scheduler = tts.JobScheduler(delay=10, quantum=3)
+    run_chunk(queue, "a")
+    assert scheduler.preempted_by(queue, "a", served=1) is None  # Caller tự kết thúc job a
+
+
+def test_parse_deadline(tts):
+    now = time.time()
+    assert tts.parse_deadline("90m") == pytest.approx(now + 5400, abs=5)
+    assert tts.parse_deadline("1.5h") == pytest.approx(now + 5400, abs=5)
+    assert tts.parse_deadline("2026-10-20 08:00") == tts.datetime.datetime(2026, 10, 20, 8).timestamp()
+    with pytest.raises(argparse.ArgumentTypeError):
+        tts.parse_deadline("ngày mai")
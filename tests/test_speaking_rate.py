@@ -0,0 +1,69 @@
+import pytest
+
+TEXT = "Một câu tiếng Việt đủ dài để tốc độ nói ổn định. " * 4  # ~200 ký tự
+RATE = 0.07  # giây / ký tự
+
+
+def warmed_model(tts, samples=8, **kwargs):
+    model = tts.SpeakingRateModel(path=None, min_samples=samples, **kwargs)
+    for _ in range(samples):
+        model.observe(TEXT, RATE * len(TEXT.strip()))
+    return model
+
+
+def test_accepts_anything_before_warmup(tts):
+    model = tts.SpeakingRateModel(path=None, min_samples=8)
+    for _ in range(7):
+        model.observe(TEXT, RATE * len(TEXT.strip()))
+    assert model.seconds_per_char is None
+    model.check(TEXT, 0.1)
+    model.check(TEXT, 1000.0)
+
+
+def test_rate_is_median_of_samples_after_warmup(tts):
+    model = warmed_model(tts)
+    model.observe(TEXT, 100 * len(TEXT.strip()))  # Một chunk lỗi không kéo lệch median
+    assert model.seconds_per_char == pytest.approx(RATE)
+    assert model.expected_duration(100) == pytest.approx(RATE * 100)
+
+
+@pytest.mark.parametrize("ratio", [0.56, 1.0, 1.79])
+def test_duration_within_bounds_is_accepted(tts, ratio):
+    model = warmed_model(tts)
+    model.check(TEXT, ratio * RATE * len(TEXT.strip()))
+
+
+@pytest.mark.parametrize("ratio", [0.1, 0.54, 1.81, 5.0])
+def test_duration_outside_bounds_is_rejected(tts, ratio):
+    model = warmed_model(tts)
+    with pytest.raises(tts.ImplausibleAudioError):
+        model.check(TEXT, ratio * RATE * len(TEXT.strip()))
+
+
+def test_implausible_audio_is_a_wav_format_error(tts):
+    assert issubclass(tts.ImplausibleAudioError, tts.WavFormatError)
+
+
+def test_short_text_is_neither_checked_nor_learned(tts):
+    model = warmed_model(tts)
+    short = "Xin chào."
+    model.check(short, 60.0)
+    model.observe(short, 60.0)
+    model.observe(TEXT, 0)
+    assert len(model.samples) == 8
+
+
+def test_samples_survive_save_and_reload(tts, tmp_path):
+    path = tmp_path / "speaking_rate.json"
+    model = warmed_model(tts)
+    model.path = path
+    model.save()
+    reloaded = tts.SpeakingRateModel(path=path)
+    assert reloaded.seconds_per_char == pytest.approx(RATE)
+    assert not list(tmp_path.glob("*.tmp"))
+
+
+def test_corrupt_file_starts_from_scratch(tts, tmp_path):
+    path = tmp_path / "speaking_rate.json"
+    path.write_text("{not json", encoding="utf-8")
+    assert tts.SpeakingRateModel(path=path).seconds_per_char is None
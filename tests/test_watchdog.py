@@ -0,0 +1,118 @@
+import pytest
+
+MB = 1024 * 1024
+
+
+class FakeBackend:
+    """Chỉ những gì watchdog gọi tới: prune_audio và browser_pid"""
+
+    def __init__(self, pid=4242, prune_error=None):
+        self.pid = pid
+        self.prune_error = prune_error
+        self.pruned = []
+
+    def prune_audio(self, keep_src):
+        if self.prune_error:
+            raise self.prune_error
+        self.pruned.append(keep_src)
+        return 0
+
+    def browser_pid(self):
+        return self.pid
+
+
+@pytest.fixture
+def rss(tts, monkeypatch):
+    """RSS giả (MB) cho cây process Chrome, đổi được giữa các chunk"""
+    samples = {"mb": 500.0}
+    monkeypatch.setattr(tts, "process_tree_rss", lambda pid: samples["mb"] * MB)
+    return samples
+
+
+def make_watchdog(tts, **overrides):
+    config = tts.WatchdogConfig(baseline_chunks=3, ewma_alpha=0.5, **overrides)
+    return tts.BrowserWatchdog(config)
+
+
+def run(watchdog, backend, latencies):
+    return [watchdog.after_chunk(backend, latency) for latency in latencies]
+
+
+def test_defaults_are_enabled_and_stable(tts, rss):
+    config = tts.WatchdogConfig()
+    assert config.enabled
+    watchdog = tts.BrowserWatchdog(config)
+    assert set(run(watchdog, FakeBackend(), [10.0] * 50)) == {"none"}
+
+
+def test_latency_drift_reloads_then_recycles(tts, rss):
+    watchdog = make_watchdog(tts, max_latency_drift=1.8)
+    backend = FakeBackend()
+    assert run(watchdog, backend, [10.0, 11.0, 9.0]) == ["none"] * 3
+    assert watchdog.baseline == 10.0
+    # EWMA: 10 -> 15 -> 17.5 -> 18.75 (> 18 = 1.8x mốc)
+    assert run(watchdog, backend, [20.0] * 2) == ["none"] * 2
+    assert watchdog.after_chunk(backend, 20.0) == "reload"
+    watchdog.reloaded()
+    # Mốc latency giữ nguyên, EWMA bắt đầu lại từ mẫu đầu tiên sau reload
+    assert watchdog.after_chunk(backend, 10.0) == "none"
+    assert watchdog.after_chunk(backend, 40.0) == "recycle"
+
+
+def test_no_drift_decision_during_baseline(tts, rss):
+    watchdog = make_watchdog(tts)
+    assert run(watchdog, FakeBackend(), [1.0, 100.0]) == ["none", "none"]
+    assert watchdog.latency_drift() == 1.0
+
+
+def test_rss_reload_ratio_reloads_once_then_waits_for_hard_limit(tts, rss):
+    watchdog = make_watchdog(tts, max_rss_mb=1000.0, reload_rss_ratio=0.75)
+    backend = FakeBackend()
+    rss["mb"] = 800.0
+    assert watchdog.after_chunk(backend, 10.0) == "reload"
+    watchdog.reloaded()
+    assert watchdog.after_chunk(backend, 10.0) == "none"
+    rss["mb"] = 1001.0
+    assert watchdog.after_chunk(backend, 10.0) == "recycle"
+
+
+def test_rss_over_limit_recycles_immediately(tts, rss):
+    rss["mb"] = 5000.0
+    watchdog = make_watchdog(tts, max_rss_mb=3000.0)
+    assert watchdog.after_chunk(FakeBackend(), 10.0) == "recycle"
+
+
+def test_reset_clears_baseline_and_reload_flag(tts, rss):
+    watchdog = make_watchdog(tts)
+    run(watchdog, FakeBackend(), [10.0] * 4)
+    watchdog.reloaded()
+    watchdog.reset()
+    assert watchdog.baseline is None
+    assert watchdog.chunks_since_start == 0
+    assert not watchdog.reloaded_since_start
+    rss["mb"] = 2500.0
+    assert watchdog.after_chunk(FakeBackend(), 10.0) == "reload"
+
+
+def test_recycle_every_counts_chunks_since_start(tts, rss):
+    watchdog = make_watchdog(tts, recycle_every=3)
+    assert run(watchdog, FakeBackend(), [10.0] * 3) == ["none", "none", "recycle"]
+
+
+def test_missing_pid_or_rss_failure_falls_back_to_latency(tts, monkeypatch):
+    def broken(pid):
+        raise ImportError("psutil")
+
+    monkeypatch.setattr(tts, "process_tree_rss", broken)
+    watchdog = make_watchdog(tts)
+    assert run(watchdog, FakeBackend(), [10.0] * 4) == ["none"] * 4
+    assert run(watchdog, FakeBackend(pid=None), [10.0] * 4) == ["none"] * 4
+
+
+def test_prune_failure_does_not_change_decision(tts, rss):
+    watchdog = make_watchdog(tts)
+    backend = FakeBackend(prune_error=RuntimeError("tab crashed"))
+    assert watchdog.after_chunk(backend, 10.0, keep_src="blob:x") == "none"
+    backend = FakeBackend()
+    watchdog.after_chunk(backend, 10.0, keep_src="blob:y")
+    assert backend.pruned == ["blob:y"]
@@ -0,0 +1,19 @@
+from __future__ import annotations
+
+import pytest
+
+from conftest import write_chunk
+
+
+def test_mapped_wav_keeps_original_error_with_live_view(tts, tmp_path):
+    path = write_chunk(tts, tmp_path / "a.wav", bytes(4800))
+    with pytest.raises(ValueError, match="boom"):
+        with tts.MappedWav(path) as chunk:
+            view = chunk.frames.cast("h")  # Export vẫn sống khi __exit__ chạy
+            raise ValueError(f"boom {len(view)}")
+
+
+def test_validate_rejects_empty_chunk(tts, tmp_path):
+    path = write_chunk(tts, tmp_path / "empty.wav", b"")
+    with pytest.raises(tts.WavFormatError):
+        tts.validate_wav_chunk(path)
@@ -0,0 +1,5486 @@
+"""Utilities for automating Google AI Studio text-to-speech downloads.
+Simple version with better error handling and profile management.
+
+ĐÃ CẬP NHẬT: Sửa lỗi Chrome process still running và file locked.
+"""
+
+from __future__ import annotations
+
+import argparse
+import base64
+import glob
+import hashlib
+import heapq
+import itertools
+import json
+import math
+import mmap
+import os
+import re
+import shutil
+import socket
+import sqlite3
+import statistics
+import struct
+import time
+import datetime
+import logging
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import uuid
+import zlib
+from collections import Counter, deque
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Callable, Iterable, Iterator, NamedTuple
+
+# ---------------------------------------------------------------------------
+# Import nặng (selenium, pydub, numpy, psutil) được nạp lazy: các lệnh chỉ
+# chia text hoặc merge lại chunk không phải nạp stack trình duyệt. Code nằm trong
+# module này (7.py chỉ là điểm vào) nên bytecode được cache trong __pycache__;
+# chi phí khởi động còn lại chủ yếu là import stdlib.
+# ---------------------------------------------------------------------------
+
+class _SeleniumNotLoaded(Exception):
+    """Giữ chỗ cho exception của selenium khi selenium chưa được import"""
+
+
+webdriver = By = Keys = WebDriverWait = EC = None
+TimeoutException = NoSuchElementException = SessionNotCreatedException = _SeleniumNotLoaded
+StaleElementReferenceException = _SeleniumNotLoaded
+AudioSegment = None
+np = None
+_numpy_checked = False
+
+
+def _load_selenium():
+    global webdriver, By, Keys, WebDriverWait, EC
+    global TimeoutException, NoSuchElementException, SessionNotCreatedException, StaleElementReferenceException
+    if webdriver is not None:
+        return
+    from selenium import webdriver as _webdriver
+    from selenium.common.exceptions import (
+        TimeoutException, NoSuchElementException, SessionNotCreatedException, StaleElementReferenceException,
+    )
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.common.keys import Keys
+
+    # IMPORT QUAN TRỌNG CHO VIỆC "CHỜ THÔNG MINH"
+    from selenium.webdriver.support.ui import WebDriverWait
+    from selenium.webdriver.support import expected_conditions as EC
+    webdriver = _webdriver
+
+
+def _load_pydub():
+    global AudioSegment
+    if AudioSegment is None:
+        try:
+            from pydub import AudioSegment as _AudioSegment
+        except ImportError:
+            raise RuntimeError("Lỗi: Không tìm thấy thư viện 'pydub'. Vui lòng cài đặt: pip install pydub")
+        if FFMPEG_BINARY != "ffmpeg":
+            _AudioSegment.converter = FFMPEG_BINARY
+            _AudioSegment.ffprobe = FFMPEG_BINARY
+        AudioSegment = _AudioSegment
+    return AudioSegment
+
+
+def _load_numpy() -> bool:
+    """True nếu có numpy (không có thì tắt trim/normalize khi merge)"""
+    global np, _numpy_checked
+    if not _numpy_checked:
+        _numpy_checked = True
+        try:
+            import numpy
+            np = numpy
+        except ImportError:
+            np = None
+    return np is not None
+
+
+SCRIPT_DIR = Path(__file__).resolve().parent
+DEFAULT_PROFILE_NAME = "SeleniumProfileData"
+
+# ---------------------------------------------------------------------------
+# Text utilities (giữ nguyên)
+# ---------------------------------------------------------------------------
+
+SENTENCE_END_REGEX = re.compile(r"(?<=[.!?])\s+")
+
+def normalise_whitespace(text: str) -> str:
+    return re.sub(r"\s+", " ", text).strip()
+
+def split_sentence(sentence: str, max_length: int) -> Iterator[str]:
+    words = sentence.split()
+    chunk: list[str] = []
+    for word in words:
+        candidate = " ".join((*chunk, word)) if chunk else word
+        if len(candidate) <= max_length:
+            chunk.append(word)
+            continue
+        if chunk:
+            yield " ".join(chunk)
+            chunk = [word]
+        else:
+            for start in range(0, len(word), max_length):
+                yield word[start : start + max_length]
+            chunk = []
+    if chunk:
+        yield " ".join(chunk)
+
+def smart_split(text: str, max_length: int = 999) -> list[str]:
+    text = normalise_whitespace(text)
+    sentences = SENTENCE_END_REGEX.split(text) if text else []
+    chunks: list[str] = []
+    current = []
+    for sentence in sentences:
+        sentence = sentence.strip()
+        if not sentence:
+            continue
+        if len(sentence) > max_length:
+            chunks.extend(split_sentence(sentence, max_length))
+            continue
+        prospective = " ".join((*current, sentence)) if current else sentence
+        if len(prospective) <= max_length:
+            current.append(sentence)
+            continue
+        if current:
+            chunks.append(" ".join(current))
+        current = [sentence]
+    if current:
+        chunks.append(" ".join(current))
+    return chunks
+
+CHUNKING_MODES = ("greedy", "content")
+PARAGRAPH_BREAK_REGEX = re.compile(r"\n\s*\n")
+
+def chunk_key(text: str) -> str:
+    """Định danh chunk theo nội dung (dùng cho trường ``{key}`` của template tên file)"""
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()[:12]
+
+def is_anchor_sentence(sentence: str, target_length: int) -> bool:
+    """Câu "neo" ranh giới chunk: quyết định chỉ từ nội dung câu, xác suất tỉ lệ với độ dài"""
+    digest = hashlib.blake2b(sentence.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big") / 2**64 < len(sentence) / target_length
+
+def content_split(text: str, max_length: int = 999, min_fill: float = 0.6, anchor_fill: float = 0.25) -> list[str]:
+    """Chia text với ranh giới neo theo nội dung thay vì đóng gói tham lam.
+
+    Chunk chỉ được cắt sau khi dài ít nhất ``min_fill * max_length``, tại cuối đoạn
+    văn hoặc sau một câu neo (hash của câu), hoặc bắt buộc khi câu kế tiếp làm
+    vượt ``max_length``. Sửa một câu chỉ làm đổi các chunk quanh nó: các ranh
+    giới phía sau khớp lại ngay ở câu neo tiếp theo, nên audio cũ được dùng lại.
+    """
+    min_length = int(max_length * min_fill)
+    target_length = max(1, int(max_length * anchor_fill))
+    chunks: list[str] = []
+    current: list[str] = []
+    current_length = 0
+
+    def flush():
+        nonlocal current, current_length
+        if current:
+            chunks.append(" ".join(current))
+        current, current_length = [], 0
+
+    for paragraph in PARAGRAPH_BREAK_REGEX.split(text):
+        paragraph = normalise_whitespace(paragraph)
+        units: list[str] = []
+        for sentence in SENTENCE_END_REGEX.split(paragraph) if paragraph else []:
+            sentence = sentence.strip()
+            if len(sentence) > max_length:
+                units.extend(split_sentence(sentence, max_length))
+            elif sentence:
+                units.append(sentence)
+        for position, unit in enumerate(units):
+            prospective = current_length + len(unit) + (1 if current else 0)
+            if prospective > max_length:
+                flush()
+                prospective = len(unit)
+            current.append(unit)
+            current_length = prospective
+            paragraph_end = position == len(units) - 1
+            if current_length >= min_length and (paragraph_end or is_anchor_sentence(unit, target_length)):
+                flush()
+    flush()
+    return chunks
+
+def split_text(text: str, max_length: int = 999, chunking: str = "greedy") -> list[str]:
+    if chunking == "content":
+        return content_split(text, max_length)
+    if chunking == "greedy":
+        return smart_split(text, max_length)
+    raise ValueError(f"Kiểu chia chunk không hỗ trợ: {chunking} (chọn một trong {CHUNKING_MODES})")
+
+def split_text_file(input_file: os.PathLike[str] | str, max_length: int = 999, chunking: str = "greedy") -> list[str]:
+    path = Path(input_file)
+    text = path.read_text(encoding="utf-8")
+    return split_text(text, max_length, chunking)
+
+# ---------------------------------------------------------------------------
+# Selenium automation - ĐÃ CẬP NHẬT
+# ---------------------------------------------------------------------------
+
+@dataclass
+class DownloadResult:
+    index: int
+    original_path: Path
+    final_path: Path
+
+class DownloadTimeoutError(RuntimeError):
+    pass
+
+class QuotaExceededError(RuntimeError):
+    """Page báo hết quota / rate limit - cần đổi sang profile (tài khoản) khác"""
+
+    def __init__(self, kind: str):
+        super().__init__(f"Tài khoản bị giới hạn ({kind})")
+        self.kind = kind
+
+class ChunkCancelledError(RuntimeError):
+    """Bản hedged khác của chunk đã xong trước - bỏ lượt generate này"""
+
+def kill_chrome_processes(profile_path: Path | None = None):
+    """Kill Chrome processes đang chạy
+
+    Có ``profile_path`` thì chỉ kill Chrome đang mở đúng profile đó (Chrome cũ còn
+    giữ lock), không đụng tới trình duyệt của worker khác trên cùng máy.
+    """
+    try:
+        import psutil
+
+        marker = f"--user-data-dir={profile_path}" if profile_path is not None else None
+        killed_any = False
+        for proc in psutil.process_iter(['pid', 'name', 'cmdline']):
+            try:
+                if proc.info['name'] and any(name in proc.info['name'].lower() for name in ['chrome', 'chromedriver']):
+                    if marker is not None and marker not in (proc.info['cmdline'] or ()):
+                        continue
+                    proc.kill()
+                    killed_any = True
+            except (psutil.NoSuchProcess, psutil.AccessDenied):
+                pass
+        
+        if killed_any:
+            time.sleep(3)  # Chờ lâu hơn để processes thực sự đóng
+            print("✓ Đã kill Chrome processes")
+        else:
+            print("ℹ Không có Chrome process nào đang chạy")
+    except Exception as e:
+        print(f"⚠ Không thể kill Chrome processes: {e}")
+
+def browser_process_tree(pid: int | None) -> list:
+    """Process ``pid`` cùng mọi process con (psutil.Process); rỗng nếu không đọc được"""
+    if pid is None:
+        return []
+    try:
+        import psutil
+
+        root = psutil.Process(pid)
+        return [root, *root.children(recursive=True)]
+    except Exception:
+        return []
+
+def kill_process_tree(processes: list):
+    """Kill những process còn sống trong cây lấy từ ``browser_process_tree``"""
+    if not processes:
+        return
+    import psutil
+
+    for proc in processes:
+        try:
+            proc.kill()  # psutil kiểm tra create time: PID đã bị tái sử dụng thì không kill nhầm
+        except (psutil.NoSuchProcess, psutil.AccessDenied):
+            pass
+
+def unlock_profile_directory(profile_path: Path):
+    """Xóa các file lock trong profile directory"""
+    try:
+        # Xóa các file lock thường gặp
+        lock_files = [
+            profile_path / "SingletonLock",
+            profile_path / "lockfile", 
+            profile_path / "Default" / "lockfile",
+        ]
+        
+        for lock_file in lock_files:
+            if lock_file.exists():
+                try:
+                    lock_file.unlink()
+                    print(f"✓ Đã xóa {lock_file.name}")
+                except Exception as e:
+                    print(f"⚠ Không thể xóa {lock_file.name}: {e}")
+    except Exception as e:
+        print(f"⚠ Lỗi khi unlock profile: {e}")
+
+def setup_chrome_profile(interactive: bool = True, profile_path: Path | None = None) -> Path:
+    """Tạo và thiết lập Chrome profile BIỆT LẬP trong thư mục script
+
+    ``profile_path`` chọn profile cụ thể (xem ProfileRegistry); mặc định là SeleniumProfileData.
+    """
+    _load_selenium()
+    script_dir = Path(__file__).resolve().parent
+    if profile_path is None:
+        profile_path = script_dir / DEFAULT_PROFILE_NAME
+    
+    if not profile_path.exists():
+        if not interactive:
+            # Chế độ batch không thể dừng lại chờ đăng nhập
+            raise RuntimeError(
+                f"Chưa có Chrome profile tại {profile_path}. "
+                "Hãy chạy script một lần ở chế độ thường để đăng nhập và chọn voice."
+            )
+        profile_path.mkdir(parents=True, exist_ok=True)
+        print(f"🆕 Tạo Chrome profile mới tại: {profile_path}")
+        print("🔐 LẦN ĐẦU CHẠY: Script sẽ dừng lại để bạn đăng nhập Google.")
+        print("‼️ QUAN TRỌNG: Nhân lúc này, hãy CHỌN VOICE VÀ MODE bạn muốn.")
+        print("Cửa sổ Chrome sẽ tự động mở ra. Vui lòng đăng nhập VÀ CÀI ĐẶT VOICE.")
+        
+        # Kill Chrome processes trước khi bắt đầu
+        kill_chrome_processes(profile_path)
+        
+        opts = webdriver.ChromeOptions()
+        opts.add_argument(f"--user-data-dir={str(profile_path)}")
+        opts.add_argument("--no-sandbox")
+        opts.add_argument("--disable-dev-shm-usage")
+        opts.add_argument("--disable-blink-features=AutomationControlled")
+        opts.add_experimental_option("excludeSwitches", ["enable-automation"])
+        opts.add_experimental_option('useAutomationExtension', False)
+        
+        try:
+            driver = webdriver.Chrome(options=opts)
+            driver.execute_script("Object.defineProperty(navigator, 'webdriver', {get: () => undefined})")
+            
+            driver.get("https://aistudio.google.com/")
+            
+            input("Nhấn Enter sau khi bạn đã đăng nhập VÀ CHỌN VOICE xong...")
+            driver.quit()
+            print("✓ Đã lưu thông tin đăng nhập và cài đặt.")
+        except SessionNotCreatedException:
+            print("❌ Lỗi: Profile đang được sử dụng. Đang thử tạo profile mới...")
+            # Kill Chrome processes và thử lại
+            kill_chrome_processes(profile_path)
+            time.sleep(3)
+            
+            # Thử tạo profile với tên ngẫu nhiên
+            profile_path = script_dir / f"{DEFAULT_PROFILE_NAME}_{random.randint(1000,9999)}"
+            profile_path.mkdir(parents=True, exist_ok=True)
+            print(f"🆕 Tạo Chrome profile mới tại: {profile_path}")
+            
+            opts = webdriver.ChromeOptions()
+            opts.add_argument(f"--user-data-dir={str(profile_path)}")
+            opts.add_argument("--no-sandbox")
+            opts.add_argument("--disable-dev-shm-usage")
+            
+            driver = webdriver.Chrome(options=opts)
+            driver.get("https://aistudio.google.com/")
+            
+            input("Nhấn Enter sau khi bạn đã đăng nhập VÀ CHỌN VOICE xong...")
+            driver.quit()
+            print("✓ Đã lưu thông tin đăng nhập và cài đặt.")
+        
+    return profile_path
+
+def build_driver(
+    download_dir: Path,
+    interactive: bool = True,
+    profile_path: Path | None = None,
+    isolated: bool = False,
+) -> webdriver.Chrome:
+    """Tạo Chrome driver với profile riêng
+
+    ``isolated``: ``profile_path`` là clone dùng riêng (xem ProfileSnapshot), không
+    cần kill Chrome khác hay unlock profile.
+    """
+    
+    if not isolated:
+        profile_path = setup_chrome_profile(interactive=interactive, profile_path=profile_path)
+        
+        # Kill Chrome processes trước khi tạo driver mới
+        kill_chrome_processes(profile_path)
+        time.sleep(3)
+        
+        # Unlock profile directory
+        unlock_profile_directory(profile_path)
+    
+    opts = webdriver.ChromeOptions()
+    opts.add_argument("--window-size=1920,1080")
+    opts.add_argument(f"--user-data-dir={str(profile_path)}")
+    opts.add_argument("--no-sandbox")
+    opts.add_argument("--disable-dev-shm-usage")
+    opts.add_argument("--disable-blink-features=AutomationControlled")
+    opts.add_experimental_option("excludeSwitches", ["enable-automation"])
+    opts.add_experimental_option('useAutomationExtension', False)
+
+    prefs = {
+        "download.default_directory": str(download_dir.resolve()),
+        "download.prompt_for_download": False,
+        "safebrowsing.enabled": True,
+    }
+    opts.add_experimental_option("prefs", prefs)
+    
+    try:
+        driver = webdriver.Chrome(options=opts)
+        driver.execute_script("Object.defineProperty(navigator, 'webdriver', {get: () => undefined})")
+        return driver
+    except SessionNotCreatedException as e:
+        print(f"❌ Lỗi khi khởi động Chrome: {e}")
+        if isolated:
+            raise  # Clone hỏng thì người gọi bỏ clone, không được xóa profile gốc
+        print("🔄 Đang thử khởi động lại với profile mới...")
+        # Kill Chrome processes và xóa profile cũ
+        kill_chrome_processes(profile_path)
+        time.sleep(3)
+        
+        import shutil
+        if profile_path.exists():
+            try:
+                shutil.rmtree(profile_path)
+                print("✓ Đã xóa profile cũ")
+            except Exception as ex:
+                print(f"⚠ Không thể xóa profile: {ex}")
+        time.sleep(2)
+        return build_driver(download_dir, interactive=interactive, profile_path=profile_path)  # Đệ quy thử lại
+
+def wait_for_new_file(download_dir: Path, existing: set[Path], timeout=120):
+    end = time.time() + timeout
+    while time.time() < end:
+        for f in download_dir.iterdir():
+            if f not in existing and f.is_file() and not f.name.endswith(".crdownload"):
+                return f
+        time.sleep(1)
+    raise TimeoutException("Timeout waiting for download")
+
+def build_target_name(template: str, index: int, original_path: Path, key: str | None = None) -> str:
+    candidate = template.format(index=index, key=key)
+    candidate_path = Path(candidate)
+    if candidate_path.suffix:
+        return candidate_path.name
+    return f"{candidate_path.name}{original_path.suffix}"
+
+def rename_downloaded_file(src: Path, target_name: str) -> Path:
+    destination = src.with_name(target_name)
+    counter = itertools.count(1)
+    final_destination = destination
+    while final_destination.exists():
+        suffix = final_destination.suffix
+        final_destination = destination.with_name(f"{destination.stem}_{next(counter)}{suffix}")
+    return src.rename(final_destination)
+
+# ---------------------------------------------------------------------------
+# Browser backend - Selenium (qua chromedriver) hoặc CDP trực tiếp
+# ---------------------------------------------------------------------------
+
+TEXT_INPUT_XPATH = "//h4[contains(@class, 'section-title') and contains(text(), 'Text')]/following::textarea[1]"
+
+# Các cách tìm ô Text, theo thứ tự mặc định; Locator xếp lại theo độ trễ đo được
+TEXT_INPUT_SELECTORS = (
+    ("section-title", "xpath", TEXT_INPUT_XPATH),
+    ("aria-label", "css", "textarea[aria-label*='text' i]"),
+    ("placeholder", "css", "textarea[placeholder*='text' i]"),
+    ("first-textarea", "css", "textarea"),
+)
+LOCATOR_STATS_FILE = SCRIPT_DIR / "locator_stats.json"
+LOCATOR_EWMA_ALPHA = 0.3  # Trọng số của lần đo mới trong độ trễ trung bình
+LOCATOR_STALE_SECONDS = 7 * 24 * 3600  # Không trúng lâu hơn -> quay về thứ tự mặc định
+
+# Thử lần lượt các selector trong MỘT lần gọi script. Phần tử tìm được được giữ
+# trong window[cacheKey], lần sau chỉ cần kiểm tra nó còn trong DOM và hiển thị.
+# Trả về [element, vị trí selector trúng] (-1: dùng cache, -2: không tìm thấy).
+LOCATE_SCRIPT = """
+const cacheKey = arguments[0];
+const selectors = arguments[1];
+const visible = el => !!el && el.isConnected && el.offsetParent !== null;
+if (visible(window[cacheKey])) return [window[cacheKey], -1];
+for (let i = 0; i < selectors.length; i++) {
+    const kind = selectors[i][0], expr = selectors[i][1];
+    let found = [];
+    try {
+        if (kind === 'xpath') {
+            const snapshot = document.evaluate(expr, document, null, XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null);
+            for (let j = 0; j < snapshot.snapshotLength; j++) found.push(snapshot.snapshotItem(j));
+        } else {
+            found = Array.from(document.querySelectorAll(expr));
+        }
+    } catch (e) {
+        continue;  // Selector không hợp lệ trên trình duyệt này
+    }
+    const el = found.find(visible);
+    if (el) {
+        window[cacheKey] = el;
+        return [el, i];
+    }
+}
+return [null, -2];
+"""
+
+
+class Locator:
+    """Tìm một phần tử qua danh sách selector xếp hạng (fallback tự phục hồi khi UI đổi).
+
+    Selector có độ trễ trung bình (EWMA của ``ms``) thấp nhất được thử trước; lần
+    trúng gần nhất chỉ dùng để phá hoà. Selector vừa trượt (hoặc lâu không trúng)
+    rơi về thứ tự mặc định sau các selector đang chạy tốt. Thống kê lưu trong
+    ``locator_stats.json`` để lần chạy sau cũng hưởng lợi.
+    """
+
+    def __init__(self, name: str, selectors: Iterable[tuple[str, str, str]], stats_path: Path | None = LOCATOR_STATS_FILE):
+        self.name = name
+        self.selectors = list(selectors)
+        self.stats_path = stats_path
+        self._stats: dict[str, dict] | None = None
+
+    @property
+    def cache_key(self) -> str:
+        return f"__tts_locator_{self.name.replace('-', '_')}"
+
+    def _load_stats(self) -> dict[str, dict]:
+        if self._stats is None:
+            self._stats = {}
+            if self.stats_path and self.stats_path.exists():
+                try:
+                    self._stats = json.loads(self.stats_path.read_text(encoding="utf-8")).get(self.name, {})
+                except (OSError, ValueError):
+                    pass
+        return self._stats
+
+    def ranked(self) -> list[tuple[str, str, str]]:
+        stats = self._load_stats()
+        order = {name: position for position, (name, _, _) in enumerate(self.selectors)}
+
+        fresh_after = time.time() - LOCATOR_STALE_SECONDS
+
+        def rank(selector):
+            entry = stats.get(selector[0], {})
+            last_hit = entry.get("last_hit", 0.0)
+            healthy = "ms" in entry and last_hit >= max(entry.get("last_miss", 0.0), fresh_after)
+            if not healthy:
+                return (1, 0.0, 0.0, order[selector[0]])
+            return (0, entry["ms"], -last_hit, order[selector[0]])
+
+        return sorted(self.selectors, key=rank)
+
+    def script_args(self) -> tuple[str, list[tuple[str, str, str]]]:
+        """(cacheKey, thứ tự selector) cho LOCATE_SCRIPT"""
+        return self.cache_key, self.ranked()
+
+    def record(self, ranked: list[tuple[str, str, str]], position: int, elapsed: float):
+        """Ghi nhận selector thứ ``position`` (trong ``ranked``) vừa tìm thấy phần tử"""
+        if position < 0:
+            return  # Trúng cache trong page
+        stats = self._load_stats()
+        now = time.time()
+        for missed, _, _ in ranked[:position]:
+            stats.setdefault(missed, {"hits": 0})["last_miss"] = now
+        name = ranked[position][0]
+        entry = stats.setdefault(name, {"hits": 0})
+        ms = elapsed * 1000
+        if "ms" in entry:
+            ms = entry["ms"] + LOCATOR_EWMA_ALPHA * (ms - entry["ms"])
+        entry["hits"] += 1
+        entry["last_hit"] = now
+        entry["ms"] = round(ms, 2)
+        if position > 0:
+            print(f"🩹 Selector '{ranked[0][0]}' không còn khớp, dùng '{name}'")
+        self._save()
+
+    def _save(self):
+        if not self.stats_path:
+            return
+        try:
+            payload = json.loads(self.stats_path.read_text(encoding="utf-8")) if self.stats_path.exists() else {}
+            payload[self.name] = self._stats
+            tmp = self.stats_path.with_name(f"{self.stats_path.name}.{os.getpid()}.tmp")
+            tmp.write_text(json.dumps(payload, indent=1), encoding="utf-8")
+            tmp.replace(self.stats_path)
+        except (OSError, ValueError) as e:
+            print(f"⚠ Không lưu được thống kê selector: {e}")
+
+
+TEXT_INPUT_LOCATOR = Locator("text-input", TEXT_INPUT_SELECTORS)
+
+# Một round-trip cho cả danh sách audio: [element, src] thay vì find_elements + get_attribute từng thẻ
+AUDIO_SOURCES_SCRIPT = "return Array.from(document.querySelectorAll('audio'), a => [a, a.src || '']);"
+
+# Tải blob URL trong page rồi trả về data URL (dùng với execute_async_script)
+BLOB_DOWNLOAD_SCRIPT = """
+var url = arguments[0];
+var callback = arguments[1];
+var xhr = new XMLHttpRequest();
+xhr.open('GET', url, true);
+xhr.responseType = 'blob';
+xhr.timeout = arguments[2] || 60000;
+
+xhr.onload = function() {
+    if (this.status === 200) {
+        var reader = new FileReader();
+        reader.onloadend = function() {
+            callback({success: true, data: reader.result});
+        }
+        reader.onerror = function() {
+            callback({success: false, error: 'FileReader error'});
+        }
+        reader.readAsDataURL(xhr.response);
+    } else {
+        callback({success: false, error: 'HTTP ' + this.status});
+    }
+};
+
+xhr.onerror = function() {
+    callback({success: false, error: 'Network error'});
+};
+
+xhr.ontimeout = function() {
+    callback({success: false, error: 'Timeout'});
+};
+
+xhr.send();
+"""
+
+
+class BrowserBackend:
+    """Các thao tác trình duyệt mà luồng tạo audio cần.
+
+    Mỗi method tương ứng một bước của ``simple_interaction_flow``; backend tự
+    quyết định làm bằng bao nhiêu round-trip.
+    """
+
+    name = "base"
+    profile_clone: Path | None = None  # user-data-dir tạm, xóa khi bỏ backend
+
+    def open(self, url: str):
+        raise NotImplementedError
+
+    def refresh(self):
+        raise NotImplementedError
+
+    def audio_sources(self) -> list[str]:
+        """src của tất cả thẻ <audio> trong page (chuỗi rỗng nếu chưa có src)"""
+        raise NotImplementedError
+
+    def fill_text(self, text: str, timeout: float = 30) -> bool:
+        """Xóa và điền text vào ô Text; False nếu không tìm thấy ô"""
+        raise NotImplementedError
+
+    def submit(self):
+        """Nhấn Ctrl+Enter trong ô Text để generate"""
+        raise NotImplementedError
+
+    def audio_state(self, src: str) -> tuple[int, float]:
+        """(readyState, duration) của thẻ <audio> có src tương ứng"""
+        raise NotImplementedError
+
+    def fetch_as_data_url(self, url: str, timeout: float = 60) -> dict:
+        """Tải URL (blob:) trong page; trả về {success, data | error} giống script XHR"""
+        raise NotImplementedError
+
+    def quota_signal(self) -> str | None:
+        """"quota" / "rate" nếu page đang báo hết quota hoặc bị giới hạn tốc độ"""
+        return None
+
+    def prune_audio(self, keep_src: str | None = None) -> int:
+        """Xóa các thẻ <audio> cũ (giữ thẻ mới nhất / thẻ có src ``keep_src``), trả về số thẻ đã xóa"""
+        return 0
+
+    def browser_pid(self) -> int | None:
+        """PID gốc của cây process trình duyệt (để đo RSS); None nếu không có"""
+        return None
+
+    def quit(self):
+        raise NotImplementedError
+
+
+class SeleniumBackend(BrowserBackend):
+    """Backend mặc định: mọi thao tác đi qua chromedriver (HTTP round-trip)"""
+
+    name = "selenium"
+
+    def __init__(self, driver: webdriver.Chrome):
+        _load_selenium()
+        self.driver = driver
+        self._text_input = None
+        self._audio_elements: dict[str, object] = {}  # src -> element của lần quét gần nhất
+
+    def open(self, url: str):
+        self.driver.get(url)
+
+    def refresh(self):
+        self._text_input = None
+        self._audio_elements = {}
+        self.driver.refresh()
+
+    def audio_sources(self) -> list[str]:
+        sources = []
+        self._audio_elements = {}
+        for audio, src in self.driver.execute_script(AUDIO_SOURCES_SCRIPT) or []:
+            sources.append(src)
+            self._audio_elements.setdefault(src, audio)
+        return sources
+
+    def locate(self, locator: Locator, timeout: float = 30):
+        """Phần tử đầu tiên khớp một trong các selector của ``locator`` (None nếu hết giờ)"""
+        end = time.time() + timeout
+        while True:
+            cache_key, ranked = locator.script_args()
+            started = time.perf_counter()
+            element, position = self.driver.execute_script(LOCATE_SCRIPT, cache_key, [s[1:] for s in ranked])
+            if element is not None:
+                locator.record(ranked, position, time.perf_counter() - started)
+                return element
+            if time.time() >= end:
+                return None
+            time.sleep(0.2)
+
+    def fill_text(self, text: str, timeout: float = 30) -> bool:
+        if self._text_input is not None:
+            try:
+                self._text_input.clear()
+                self._text_input.send_keys(text)
+                return True
+            except StaleElementReferenceException:
+                self._text_input = None  # Page render lại ô Text: tìm lại
+        self._text_input = self.locate(TEXT_INPUT_LOCATOR, timeout)
+        if self._text_input is None:
+            return False
+        self._text_input.clear()
+        self._text_input.send_keys(text)
+        return True
+
+    def submit(self):
+        self._text_input.send_keys(Keys.CONTROL + Keys.ENTER)
+
+    def audio_state(self, src: str) -> tuple[int, float]:
+        for _ in range(2):
+            audio = self._audio_elements.get(src)
+            if audio is None:
+                self.audio_sources()
+                audio = self._audio_elements.get(src)
+                if audio is None:
+                    return 0, 0.0
+            try:
+                ready_state, duration = self.driver.execute_script(
+                    "return [arguments[0].readyState, arguments[0].duration || 0];", audio
+                )
+                return ready_state, duration
+            except StaleElementReferenceException:
+                self._audio_elements = {}  # Thẻ audio bị thay: quét lại một lần
+        return 0, 0.0
+
+    def fetch_as_data_url(self, url: str, timeout: float = 60) -> dict:
+        return self.driver.execute_async_script(BLOB_DOWNLOAD_SCRIPT, url, int(timeout * 1000))
+
+    def quota_signal(self) -> str | None:
+        return self.driver.execute_script(QUOTA_SIGNAL_SCRIPT)
+
+    def prune_audio(self, keep_src: str | None = None) -> int:
+        self._audio_elements = {}
+        return self.driver.execute_script(PRUNE_AUDIO_SCRIPT, keep_src)
+
+    def browser_pid(self) -> int | None:
+        service = getattr(self.driver, "service", None)
+        process = getattr(service, "process", None)
+        return process.pid if process else None  # chromedriver, Chrome là process con
+
+    def quit(self):
+        self.driver.quit()
+
+
+class CdpError(RuntimeError):
+    pass
+
+
+# LOCATE_SCRIPT qua Runtime.evaluate: không trả được DOM node, nên focus luôn trong page
+_CDP_LOCATE = """
+(() => {
+    const [el, position] = (function () {%s}).apply(null, %s);
+    if (el) {
+        el.focus();
+        if (el.select) el.select();
+    }
+    return [!!el, position];
+})()
+"""
+
+_CDP_CLEAR_TEXTAREA = """
+(() => {
+    const el = document.activeElement;
+    const setter = Object.getOwnPropertyDescriptor(HTMLTextAreaElement.prototype, 'value').set;
+    setter.call(el, '');
+    el.dispatchEvent(new Event('input', {bubbles: true}));
+})()
+"""
+
+_CDP_AUDIO_STATE = """
+(() => {
+    const audio = Array.from(document.querySelectorAll('audio')).find(a => a.src === %s);
+    return audio ? [audio.readyState, audio.duration || 0] : [0, 0];
+})()
+"""
+
+_CDP_FETCH_DATA_URL = """
+(async () => {
+    const controller = new AbortController();
+    const timer = setTimeout(() => controller.abort(), %d);
+    try {
+        const response = await fetch(%s, {signal: controller.signal});
+        if (!response.ok) return {success: false, error: 'HTTP ' + response.status};
+        const blob = await response.blob();
+        const data = await new Promise((resolve, reject) => {
+            const reader = new FileReader();
+            reader.onloadend = () => resolve(reader.result);
+            reader.onerror = () => reject(new Error('FileReader error'));
+            reader.readAsDataURL(blob);
+        });
+        return {success: true, data: data};
+    } catch (e) {
+        return {success: false, error: e.name === 'AbortError' ? 'Timeout' : String(e)};
+    } finally {
+        clearTimeout(timer);
+    }
+})()
+"""
+
+
+def find_chrome_binary() -> str | None:
+    """Tìm chrome.exe / google-chrome; biến môi trường CHROME_BINARY được ưu tiên"""
+    import shutil
+
+    override = os.environ.get("CHROME_BINARY")
+    if override:
+        return override
+    for name in ("chrome", "google-chrome", "google-chrome-stable", "chromium", "chromium-browser"):
+        found = shutil.which(name)
+        if found:
+            return found
+    for base in (os.environ.get("PROGRAMFILES"), os.environ.get("PROGRAMFILES(X86)"), os.environ.get("LOCALAPPDATA")):
+        if base:
+            candidate = Path(base) / "Google" / "Chrome" / "Application" / "chrome.exe"
+            if candidate.exists():
+                return str(candidate)
+    return None
+
+
+class CdpBackend(BrowserBackend):
+    """Nói chuyện trực tiếp với Chrome qua DevTools Protocol (websocket).
+
+    Không có chromedriver ở giữa: mỗi bước là một ``Runtime.evaluate`` trên cùng
+    một kết nối, dữ liệu lớn (data URL) chỉ đi qua socket một lần.
+    Cần: pip install websocket-client
+    """
+
+    name = "cdp"
+
+    def __init__(
+        self,
+        profile_path: Path,
+        chrome_binary: str | None = None,
+        startup_timeout: float = 30,
+        headless: bool = False,
+    ):
+        try:
+            import websocket
+        except ImportError:
+            raise CdpError("Backend CDP cần thư viện 'websocket-client': pip install websocket-client")
+
+        binary = chrome_binary or find_chrome_binary()
+        if not binary:
+            raise CdpError("Không tìm thấy Chrome (đặt biến môi trường CHROME_BINARY)")
+
+        self.profile_path = Path(profile_path)
+        port_file = self.profile_path / "DevToolsActivePort"
+        if port_file.exists():
+            port_file.unlink()
+
+        args = [
+            binary,
+            f"--user-data-dir={self.profile_path}",
+            "--remote-debugging-port=0",
+            "--window-size=1920,1080",
+            "--no-first-run",
+            "--no-default-browser-check",
+            "--disable-dev-shm-usage",
+            "--disable-blink-features=AutomationControlled",
+        ]
+        if headless:
+            args.append("--headless=new")
+        self.process = subprocess.Popen(
+            [*args, "about:blank"],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        self._next_id = 0
+        try:
+            port = self._wait_for_port(port_file, startup_timeout)
+            ws_url = self._page_websocket_url(port, startup_timeout)
+            self._ws = websocket.create_connection(ws_url, timeout=startup_timeout, suppress_origin=True)
+        except Exception:
+            self.process.kill()
+            raise
+
+    @property
+    def pid(self) -> int:
+        return self.process.pid
+
+    def _wait_for_port(self, port_file: Path, timeout: float) -> int:
+        end = time.time() + timeout
+        while time.time() < end:
+            if self.process.poll() is not None:
+                raise CdpError(f"Chrome thoát ngay khi khởi động (code {self.process.returncode})")
+            try:
+                return int(port_file.read_text().splitlines()[0])
+            except (OSError, ValueError, IndexError):
+                time.sleep(0.1)
+        raise CdpError("Chrome không mở cổng DevTools")
+
+    def _page_websocket_url(self, port: int, timeout: float) -> str:
+        import json
+        import urllib.request
+
+        end = time.time() + timeout
+        while time.time() < end:
+            if self.process.poll() is not None:
+                raise CdpError(f"Chrome thoát khi đang khởi động (code {self.process.returncode})")
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/json/list", timeout=5) as response:
+                    targets = json.loads(response.read())
+            except (OSError, ValueError):
+                # Cổng đã ghi ra file nhưng DevTools HTTP chưa sẵn sàng (connection refused / reset)
+                time.sleep(0.1)
+                continue
+            for target in targets:
+                if target.get("type") == "page" and target.get("webSocketDebuggerUrl"):
+                    return target["webSocketDebuggerUrl"]
+            time.sleep(0.1)
+        raise CdpError("Không tìm thấy tab để điều khiển")
+
+    def call(self, method: str, params: dict | None = None, timeout: float = 30) -> dict:
+        import json
+
+        self._next_id += 1
+        message_id = self._next_id
+        self._ws.settimeout(timeout)
+        self._ws.send(json.dumps({"id": message_id, "method": method, "params": params or {}}))
+        while True:
+            message = json.loads(self._ws.recv())
+            if message.get("id") != message_id:
+                continue  # Bỏ qua event
+            if "error" in message:
+                raise CdpError(f"{method}: {message['error'].get('message')}")
+            return message.get("result", {})
+
+    def evaluate(self, expression: str, await_promise: bool = False, timeout: float = 30):
+        result = self.call(
+            "Runtime.evaluate",
+            {"expression": expression, "returnByValue": True, "awaitPromise": await_promise},
+            timeout=timeout,
+        )
+        if "exceptionDetails" in result:
+            details = result["exceptionDetails"]
+            raise CdpError(details.get("exception", {}).get("description") or details.get("text"))
+        return result.get("result", {}).get("value")
+
+    def _wait_loaded(self, timeout: float = 60):
+        end = time.time() + timeout
+        while time.time() < end:
+            try:
+                if self.evaluate("document.readyState") == "complete":
+                    return
+            except CdpError:
+                pass  # Page đang chuyển trang
+            time.sleep(0.2)
+        raise CdpError("Page không load xong")
+
+    def open(self, url: str):
+        import json
+
+        self.evaluate(f"window.location.href = {json.dumps(url)}")
+        time.sleep(0.2)
+        self._wait_loaded()
+
+    def refresh(self):
+        self.call("Page.reload", {"ignoreCache": False})
+        time.sleep(0.2)
+        self._wait_loaded()
+
+    def audio_sources(self) -> list[str]:
+        return self.evaluate("Array.from(document.querySelectorAll('audio'), a => a.src || '')") or []
+
+    def fill_text(self, text: str, timeout: float = 30) -> bool:
+        import json
+
+        end = time.time() + timeout
+        while True:
+            cache_key, ranked = TEXT_INPUT_LOCATOR.script_args()
+            started = time.perf_counter()
+            found, position = self.evaluate(
+                _CDP_LOCATE % (LOCATE_SCRIPT, json.dumps([cache_key, [s[1:] for s in ranked]]))
+            )
+            if found:
+                TEXT_INPUT_LOCATOR.record(ranked, position, time.perf_counter() - started)
+                break
+            if time.time() >= end:
+                return False
+            time.sleep(0.2)
+        self.evaluate(_CDP_CLEAR_TEXTAREA)
+        # insertText đi qua pipeline nhập liệu thật -> framework nhận event input
+        self.call("Input.insertText", {"text": text})
+        return True
+
+    def submit(self):
+        key = {"key": "Enter", "code": "Enter", "windowsVirtualKeyCode": 13, "modifiers": 2}
+        self.call("Input.dispatchKeyEvent", {"type": "rawKeyDown", **key})
+        self.call("Input.dispatchKeyEvent", {"type": "keyUp", **key})
+
+    def audio_state(self, src: str) -> tuple[int, float]:
+        import json
+
+        ready_state, duration = self.evaluate(_CDP_AUDIO_STATE % json.dumps(src))
+        return ready_state, duration
+
+    def fetch_as_data_url(self, url: str, timeout: float = 60) -> dict:
+        import json
+
+        script = _CDP_FETCH_DATA_URL % (int(timeout * 1000), json.dumps(url))
+        return self.evaluate(script, await_promise=True, timeout=timeout + 5)
+
+    def quota_signal(self) -> str | None:
+        return self.evaluate(f"(() => {{{QUOTA_SIGNAL_SCRIPT}}})()")
+
+    def prune_audio(self, keep_src: str | None = None) -> int:
+        import json
+
+        return self.evaluate(f"(function () {{{PRUNE_AUDIO_SCRIPT}}})({json.dumps(keep_src)})")
+
+    def browser_pid(self) -> int | None:
+        return self.process.pid
+
+    def quit(self):
+        try:
+            self.call("Browser.close", timeout=5)
+        except Exception:
+            pass
+        try:
+            self._ws.close()
+        except Exception:
+            pass
+        try:
+            self.process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+
+
+class DryRunBackend(BrowserBackend):
+    """Backend giả: không mở trình duyệt, trả về WAV im lặng dài theo số ký tự.
+
+    Dùng để chạy thử batch / hàng đợi / lập lịch trên máy local mà không tốn quota.
+    """
+
+    name = "dry-run"
+
+    def __init__(self, latency: float = 0.5, chars_per_second: float = 15.0, framerate: int = 24000):
+        self.latency = latency
+        self.chars_per_second = chars_per_second
+        self.format = PcmFormat(1, 2, framerate)
+        self._text = ""
+        self._sources: list[str] = []
+        self._counter = itertools.count(1)
+
+    def open(self, url: str):
+        pass
+
+    def refresh(self):
+        pass
+
+    def audio_sources(self) -> list[str]:
+        return list(self._sources)
+
+    def fill_text(self, text: str, timeout: float = 30) -> bool:
+        self._text = text
+        return True
+
+    def submit(self):
+        time.sleep(self.latency)
+        frames = max(1, int(len(self._text) / self.chars_per_second * self.format.framerate))
+        samples = bytearray(frames * self.format.sampwidth)
+        # Đánh dấu vài sample đầu để fingerprint mỗi lần generate đều khác nhau
+        samples[:8] = next(self._counter).to_bytes(8, "little")[:len(samples)]
+        data = wav_header(self.format, len(samples)) + bytes(samples)
+        self._sources = ["data:audio/wav;base64," + base64.b64encode(data).decode("ascii")]
+
+    def audio_state(self, src: str) -> tuple[int, float]:
+        return 4, 1.0
+
+    def fetch_as_data_url(self, url: str, timeout: float = 60) -> dict:
+        return {"success": True, "data": url}
+
+    def quit(self):
+        pass
+
+
+# Xóa <audio> cũ tích tụ sau hàng trăm lần generate (kèm data URL vài MB mỗi thẻ).
+# Luôn giữ thẻ cuối cùng để lần generate sau còn src cũ mà so sánh.
+PRUNE_AUDIO_SCRIPT = """
+const keep = arguments[0];
+const audios = Array.from(document.querySelectorAll('audio'));
+let removed = 0;
+audios.slice(0, -1).forEach(audio => {
+    if (keep && audio.src === keep) return;
+    if (audio.src && audio.src.startsWith('blob:')) URL.revokeObjectURL(audio.src);
+    audio.removeAttribute('src');
+    audio.load();
+    audio.remove();
+    removed += 1;
+});
+return removed;
+"""
+
+BACKENDS = ("selenium", "cdp", "dry-run")
+BROWSERLESS_BACKENDS = ("dry-run",)
+
+# Quét text hiển thị trong page để nhận biết thông báo hết quota / rate limit
+QUOTA_SIGNAL_SCRIPT = """
+const text = (document.body && document.body.innerText || '').toLowerCase();
+if (/quota exceeded|exceeded your (current )?quota|resource has been exhausted|reached your daily limit/.test(text)) return 'quota';
+if (/rate limit|too many requests|\\b429\\b/.test(text)) return 'rate';
+return null;
+"""
+
+
+_SNAPSHOTS: dict[Path, ProfileSnapshot] = {}
+
+
+def snapshot_for(profile_path: Path) -> ProfileSnapshot:
+    key = Path(profile_path).resolve()
+    if key not in _SNAPSHOTS:
+        _SNAPSHOTS[key] = ProfileSnapshot(key)
+    return _SNAPSHOTS[key]
+
+
+def build_backend(
+    kind: str,
+    download_dir: Path,
+    interactive: bool = True,
+    profile_path: Path | None = None,
+    snapshot: bool = False,
+) -> BrowserBackend:
+    """Khởi động trình duyệt theo backend được chọn
+
+    ``snapshot``: chạy trên clone tmpfs của profile thay vì profile gốc.
+    """
+    if snapshot and kind not in BROWSERLESS_BACKENDS:
+        source = setup_chrome_profile(interactive=interactive, profile_path=profile_path)
+        clone = snapshot_for(source).clone()
+        try:
+            if kind == "selenium":
+                backend = SeleniumBackend(build_driver(download_dir, profile_path=clone, isolated=True))
+            elif kind == "cdp":
+                backend = CdpBackend(clone)
+            else:
+                raise ValueError(f"Backend không hỗ trợ: {kind} (chọn một trong {BACKENDS})")
+        except BaseException:
+            discard_profile_clone(clone)
+            raise
+        backend.profile_clone = clone
+        return backend
+    if kind == "selenium":
+        return SeleniumBackend(build_driver(download_dir, interactive=interactive, profile_path=profile_path))
+    if kind == "cdp":
+        profile_path = setup_chrome_profile(interactive=interactive, profile_path=profile_path)
+        kill_chrome_processes(profile_path)
+        unlock_profile_directory(profile_path)
+        return CdpBackend(profile_path)
+    if kind == "dry-run":
+        return DryRunBackend()
+    raise ValueError(f"Backend không hỗ trợ: {kind} (chọn một trong {BACKENDS})")
+
+
+def as_backend(driver: BrowserBackend | webdriver.Chrome) -> BrowserBackend:
+    return driver if isinstance(driver, BrowserBackend) else SeleniumBackend(driver)
+
+
+def audio_fingerprint(src: str) -> str | None:
+    """100 ký tự base64 đầu tiên của data URL - so sánh nhanh hơn cả chuỗi"""
+    match = re.search(r'base64,(.{100})', src)
+    return match.group(1) if match else None
+
+
+def is_same_audio(current_src: str, old_src: str | None, old_fingerprint: str | None) -> bool:
+    if not old_src or len(current_src) != len(old_src):
+        return False
+    if current_src.startswith("data:audio"):
+        return old_fingerprint is not None and audio_fingerprint(current_src) == old_fingerprint
+    return current_src == old_src
+
+
+def raise_if_quota_limited(backend: BrowserBackend):
+    try:
+        signal = backend.quota_signal()
+    except Exception:
+        return  # Không đọc được page thì để luồng chính xử lý
+    if signal:
+        raise QuotaExceededError(signal)
+
+
+def simple_interaction_flow(
+    driver: BrowserBackend | webdriver.Chrome,
+    text: str,
+    download_dir: Path,
+    latency: LatencyTracker | None = None,
+    cancel: Callable[[], bool] | None = None,
+) -> Path | None:
+    """
+    Luồng tương tác tối ưu - hỗ trợ cả data URL và blob URL
+    Xóa audio cũ TRƯỚC để tránh download nhầm
+
+    ``driver`` có thể là BrowserBackend bất kỳ hoặc webdriver.Chrome (bọc bằng SeleniumBackend).
+    ``latency`` đo từng bước và đặt timeout theo percentile thay cho 120s / 90s / 60s cố
+    định. ``cancel`` được hỏi mỗi giây lúc chờ; trả True thì ném ChunkCancelledError.
+    """
+    backend = as_backend(driver)
+    latency = latency or LatencyTracker()
+    try:
+        # === BƯỚC 1: LƯU SRC CŨ ĐỂ SO SÁNH ===
+        print("📝 Lưu src audio cũ (nếu có)...")
+        old_audio_src = None
+        old_fingerprint = None
+        try:
+            old_sources = backend.audio_sources()
+            if old_sources:
+                print(f"   Tìm thấy {len(old_sources)} audio cũ")
+                for src in old_sources:
+                    if src:
+                        old_audio_src = src
+                        # Lưu hash của base64 để so sánh nhanh hơn
+                        if src.startswith("data:audio"):
+                            old_fingerprint = audio_fingerprint(src)
+                            if old_fingerprint:
+                                print(f"   Fingerprint cũ: {old_fingerprint[:50]}...")
+                        print(f"   Src cũ length: {len(src)} chars")
+                        break
+                print("   ✓ Đã lưu src cũ")
+            else:
+                print("   Không có audio cũ")
+        except Exception as e:
+            print(f"   ⚠ Không thể lưu src cũ: {e}")
+            old_audio_src = None
+            old_fingerprint = None
+
+        # === BƯỚC 2: ĐIỀN TEXT ===
+        print("🔍 Tìm ô nhập text...")
+        if not backend.fill_text(text, timeout=30):
+            print("❌ Không tìm thấy ô Text")
+            return None
+        print("✓ Đã điền text chunk")
+
+        # === BƯỚC 3: NHẤN CTRL+ENTER ĐỂ GENERATE ===
+        print("⚡ Nhấn Ctrl+Enter để generate...")
+        backend.submit()
+        print("✓ Đã nhấn Ctrl+Enter")
+
+        # === BƯỚC 4: TÌM AUDIO ELEMENT MỚI (KHÁC SRC CŨ) ===
+        print("⏳ Chờ audio MỚI generation...")
+        
+        audio_src = None
+        
+        audio_timeout = latency.timeout("audio")
+        submitted_at = time.time()
+        max_attempts = int(audio_timeout / 0.2)
+        for attempt in range(max_attempts):
+            try:
+                for current_src in backend.audio_sources():
+                    # Bỏ qua nếu chưa có src hoặc trùng audio cũ
+                    if not current_src or is_same_audio(current_src, old_audio_src, old_fingerprint):
+                        continue
+                    
+                    # Đây là audio MỚI!
+                    audio_src = current_src
+                    print(f"✓ Tìm thấy audio MỚI sau {attempt * 0.2:.1f}s")
+                    print(f"   Src mới length: {len(current_src)} chars")
+                    break
+            except Exception:
+                pass
+
+            if audio_src:
+                break
+            
+            # Log mỗi 5 giây, đồng thời xem page có báo hết quota không
+            if attempt > 0 and attempt % 25 == 0:
+                print(f"   ... đang chờ audio mới ({attempt * 0.2:.0f}s)")
+                raise_if_quota_limited(backend)
+            if attempt % 5 == 4:
+                poll_cancel(cancel)
+            
+            time.sleep(0.2)
+        
+        if not audio_src:
+            print(f"❌ KHÔNG TÌM THẤY audio MỚI sau {audio_timeout:.0f}s")
+            raise_if_quota_limited(backend)
+            latency.timed_out("audio", audio_timeout)
+            return None
+        latency.observe("audio", time.time() - submitted_at)
+        
+        print("✓ Audio element MỚI đã xuất hiện")
+        if old_audio_src:
+            print(f"   Src cũ length: {len(old_audio_src)} chars")
+            print(f"   Khác biệt: {abs(len(audio_src) - len(old_audio_src))} chars")
+        
+        # === BƯỚC 5: CHỜ AUDIO SRC SẴN SÀNG ===
+        print("⏳ Chờ audio sẵn sàng...")
+        max_wait = latency.timeout("ready")
+        start_time = time.time()
+        
+        poll_interval = 0.2
+        last_log_time = start_time
+        polls = 0
+        
+        # Nếu là data URL thì đã sẵn sàng luôn
+        if audio_src.startswith("data:audio"):
+            print("✓ Data URL đã sẵn sàng!")
+        # Nếu là blob URL thì chờ ready
+        elif audio_src.startswith("blob:"):
+            while time.time() - start_time < max_wait:
+                try:
+                    ready_state, duration = backend.audio_state(audio_src)
+                    
+                    current_time = time.time()
+                    if current_time - last_log_time >= 5:
+                        print(f"   ... đang chờ ({int(current_time - start_time)}s)")
+                        last_log_time = current_time
+                    
+                    if ready_state >= 2 and duration > 0 and not (duration == float('inf') or duration != duration):
+                        print(f"✓ Audio sẵn sàng (blob URL, duration: {duration:.2f}s)")
+                        latency.observe("ready", time.time() - start_time)
+                        break
+                    elif ready_state >= 1:
+                        print(f"   Audio đang load... (readyState: {ready_state})")
+                    
+                except Exception:
+                    pass
+                
+                polls += 1
+                if polls % 5 == 0:
+                    poll_cancel(cancel)
+                time.sleep(poll_interval)
+            else:
+                latency.timed_out("ready", max_wait)  # Vẫn thử download như trước
+        else:
+            print("❌ Không tìm thấy URL audio hợp lệ.")
+            return None
+        
+        print(f"✓ Đã lấy audio URL (type: {'data URL' if audio_src.startswith('data:') else 'blob URL'})")
+        
+        # === BƯỚC 6: DOWNLOAD AUDIO ===
+        temp_filename = f"temp_{uuid.uuid4().hex}.wav"
+        temp_path = download_dir / temp_filename
+        
+        # XỬ LÝ DATA URL (BASE64) - NHANH
+        if audio_src.startswith("data:audio"):
+            print("⏳ Decode base64 từ data URL...")
+            try:
+                base64_match = re.search(r'base64,(.+)', audio_src)
+                if base64_match:
+                    base64_str = base64_match.group(1)
+                    audio_data = base64.b64decode(base64_str)
+                    temp_path.write_bytes(audio_data)
+                    print(f"✓ Decode thành công: {temp_path.name} ({len(audio_data)} bytes)")
+                    return temp_path
+                else:
+                    print("❌ Không tìm thấy base64 data trong src")
+                    return None
+            except Exception as e:
+                print(f"❌ Lỗi khi decode base64: {e}")
+                return None
+        
+        # XỬ LÝ BLOB URL - CẦN DOWNLOAD
+        if audio_src.startswith("blob:"):
+            print("⏳ Đang download audio từ blob URL...")
+            
+            max_download_retries = 3
+            for retry in range(max_download_retries):
+                try:
+                    if retry > 0:
+                        print(f"🔄 Thử lại lần {retry + 1}...")
+                    
+                    fetch_timeout = latency.timeout("fetch")
+                    fetch_started = time.time()
+                    result = backend.fetch_as_data_url(audio_src, timeout=fetch_timeout)
+                    if result and result.get('success'):
+                        latency.observe("fetch", time.time() - fetch_started)
+                    elif time.time() - fetch_started >= fetch_timeout * 0.95:
+                        latency.timed_out("fetch", fetch_timeout)
+                    
+                    if not result or not result.get('success'):
+                        error_msg = result.get('error', 'Unknown error') if result else 'No response'
+                        print(f"⚠ Lỗi download: {error_msg}")
+                        if retry < max_download_retries - 1:
+                            time.sleep(2)
+                            continue
+                        else:
+                            print("❌ Đã thử tối đa số lần cho phép")
+                            return None
+                    
+                    base64_data = result.get('data')
+                    if not base64_data:
+                        print("⚠ Không có dữ liệu")
+                        if retry < max_download_retries - 1:
+                            time.sleep(2)
+                            continue
+                        else:
+                            return None
+                    
+                    base64_match = re.search(r'base64,(.+)', base64_data)
+                    if base64_match:
+                        audio_data = base64.b64decode(base64_match.group(1))
+                        temp_path.write_bytes(audio_data)
+                        print(f"✓ Download thành công: {temp_path.name} ({len(audio_data)} bytes)")
+                        return temp_path
+                    else:
+                        print("❌ Không thể decode base64 data")
+                        if retry < max_download_retries - 1:
+                            time.sleep(2)
+                            continue
+                        else:
+                            return None
+                        
+                except Exception as e:
+                    print(f"⚠ Exception khi download (lần {retry + 1}): {e}")
+                    if retry < max_download_retries - 1:
+                        time.sleep(2)
+                        continue
+                    else:
+                        print("❌ Lỗi khi download sau nhiều lần thử")
+                        return None
+            
+            return None
+        
+        # URL không hợp lệ
+        print(f"❌ URL không hợp lệ: {audio_src[:100]}")
+        return None
+
+    except (QuotaExceededError, ChunkCancelledError):
+        raise
+    except TimeoutException as e:
+        print(f"❌ Hết thời gian chờ: {e}")
+        return None
+    except Exception as e:
+        print(f"❌ Lỗi trong luồng tương tác: {e}")
+        import traceback
+        traceback.print_exc()
+        return None
+
+
+# ---------------------------------------------------------------------------
+# Timeout theo latency thực tế của từng bước + hedged request
+# ---------------------------------------------------------------------------
+
+# Các timeout cố định trước đây, giờ là trần; sàn giữ cho timeout không co quá mức
+STAGE_LIMITS = {"audio": 120.0, "ready": 90.0, "fetch": 60.0}
+STAGE_FLOORS = {"audio": 20.0, "ready": 10.0, "fetch": 10.0}
+
+
+class LatencyTracker:
+    """Cửa sổ latency gần nhất của từng bước trong simple_interaction_flow.
+
+    ``timeout(stage)`` = percentile ``quantile`` x ``headroom``, kẹp trong [sàn, trần];
+    chưa đủ ``min_samples`` mẫu thì dùng trần (hành vi cũ). Lần chờ hết giờ được ghi
+    như một mẫu bằng đúng timeout: nếu AI Studio chậm đi đồng loạt, timeout tự
+    nới ra thay vì làm hỏng mọi chunk. Bước "chunk" (cả lần thử) dùng cho hedging.
+    """
+
+    def __init__(
+        self,
+        window: int = 200,
+        min_samples: int = 10,
+        quantile: float = 0.99,
+        headroom: float = 1.5,
+    ):
+        self.window = window
+        self.min_samples = min_samples
+        self.quantile = quantile
+        self.headroom = headroom
+        self._samples: dict[str, deque[float]] = {}
+
+    def observe(self, stage: str, seconds: float):
+        self._samples.setdefault(stage, deque(maxlen=self.window)).append(seconds)
+
+    def timed_out(self, stage: str, limit: float):
+        print(f"⏱ Bước {stage} quá {limit:.0f}s")
+        self.observe(stage, limit)
+
+    def percentile(self, stage: str, q: float) -> float | None:
+        samples = self._samples.get(stage)
+        if not samples or len(samples) < self.min_samples:
+            return None
+        ordered = sorted(samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def timeout(self, stage: str) -> float:
+        limit = STAGE_LIMITS[stage]
+        observed = self.percentile(stage, self.quantile)
+        if observed is None:
+            return limit
+        return min(limit, max(STAGE_FLOORS[stage], observed * self.headroom))
+
+
+def poll_cancel(cancel: Callable[[], bool] | None):
+    if cancel is not None and cancel():
+        raise ChunkCancelledError("Chunk đã xong ở worker khác")
+
+
+# ---------------------------------------------------------------------------
+# Khóa file liên process (nhiều worker trên cùng máy dùng chung file trạng thái)
+# ---------------------------------------------------------------------------
+
+def _try_lock_fd(fd: int) -> bool:
+    try:
+        if os.name == "nt":
+            import msvcrt
+
+            msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+        else:
+            import fcntl
+
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        return True
+    except OSError:
+        return False
+
+
+class FileLock:
+    """Khóa độc quyền qua file ``path`` (flock / msvcrt.locking).
+
+    Kernel tự nhả khóa khi process chết, nên crash hay bị kill không để lại khóa
+    kẹt. File khóa được xóa khi nhả; người giữ khóa luôn là người mở đúng file
+    đang có trên đĩa.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._fd: int | None = None
+
+    def acquire(self, timeout: float | None = None) -> bool:
+        """Chờ tối đa ``timeout`` giây (None: chờ mãi, 0: không chờ); False nếu không lấy được"""
+        end = None if timeout is None else time.time() + timeout
+        while True:
+            fd = os.open(self.path, os.O_CREAT | os.O_RDWR)
+            if _try_lock_fd(fd):
+                try:
+                    same_file = os.path.samestat(os.fstat(fd), os.stat(self.path))
+                except FileNotFoundError:
+                    same_file = False  # Người giữ trước vừa nhả và xóa file
+                if same_file:
+                    self._fd = fd
+                    return True
+            os.close(fd)
+            if end is not None and time.time() >= end:
+                return False
+            time.sleep(0.05)
+
+    def release(self):
+        if self._fd is None:
+            return
+        try:
+            self.path.unlink()  # Xóa trước khi nhả: người chờ sau sẽ mở file mới
+        except OSError:
+            pass  # Windows không xóa được file đang mở - để lại file rỗng, vô hại
+        os.close(self._fd)
+        self._fd = None
+
+    def __enter__(self) -> FileLock:
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+# ---------------------------------------------------------------------------
+# Snapshot profile - bản sao gọn trên tmpfs cho từng trình duyệt
+# ---------------------------------------------------------------------------
+
+SNAPSHOT_DIR = SCRIPT_DIR / "profile_snapshots"
+CLONE_PREFIX = "tts-profile-"
+
+# Chỉ giữ những gì cần cho phiên đăng nhập + voice đã chọn; cache, GPU cache,
+# Service Worker... bị bỏ nên snapshot chỉ vài MB và copy gần như tức thì.
+SNAPSHOT_KEEP = (
+    "Local State",  # Chứa khóa giải mã cookie (Windows)
+    "Default/Preferences",
+    "Default/Secure Preferences",
+    "Default/Cookies",
+    "Default/Cookies-journal",
+    "Default/Network/Cookies",
+    "Default/Network/Cookies-journal",
+    "Default/Local Storage",
+)
+
+
+def tmpfs_root() -> Path | None:
+    """/dev/shm nếu có và ghi được (Linux), None = thư mục tạm mặc định"""
+    shm = Path("/dev/shm")
+    if shm.is_dir() and os.access(shm, os.W_OK):
+        return shm
+    return None
+
+
+def purge_orphan_clones(root: Path | None = None):
+    """Xóa các bản clone mà process tạo ra nó đã chết (bị kill, mất điện...)"""
+    import psutil
+
+    root = root or tmpfs_root() or Path(tempfile.gettempdir())
+    for clone in root.glob(f"{CLONE_PREFIX}*"):
+        try:
+            pid = int(clone.name[len(CLONE_PREFIX):].split("-", 1)[0])
+        except ValueError:
+            continue
+        if not psutil.pid_exists(pid):
+            shutil.rmtree(clone, ignore_errors=True)
+
+
+class ProfileSnapshot:
+    """Bản vàng (golden copy) rút gọn của một profile đã đăng nhập.
+
+    Mỗi trình duyệt chạy trên một clone riêng trong tmpfs nên nhiều driver dùng
+    chung một tài khoản mà không tranh lock, không cần kill Chrome hay xóa
+    SingletonLock của profile gốc. Snapshot tự dựng lại khi cookie của profile
+    gốc mới hơn (ví dụ sau khi đăng nhập lại). Dựng lại và copy ra clone đều giữ
+    khóa file cạnh snapshot, nên nhiều worker không bao giờ thấy snapshot dở dang.
+    """
+
+    def __init__(self, source: Path, snapshot_dir: Path | None = None):
+        self.source = Path(source)
+        self.path = Path(snapshot_dir) if snapshot_dir else SNAPSHOT_DIR / self.source.name
+        self._lock = threading.Lock()
+
+    def _source_mtime(self) -> float:
+        mtimes = [
+            (self.source / name).stat().st_mtime
+            for name in SNAPSHOT_KEEP
+            if (self.source / name).exists()
+        ]
+        return max(mtimes, default=0.0)
+
+    def is_stale(self) -> bool:
+        stamp = self.path / ".snapshot"
+        if not stamp.exists():
+            return True
+        return self._source_mtime() > stamp.stat().st_mtime
+
+    def build(self):
+        """Copy các file cần giữ sang thư mục snapshot (thay thế nguyên tử)"""
+        staging = self.path.with_name(f"{self.path.name}.{os.getpid()}.part")
+        shutil.rmtree(staging, ignore_errors=True)
+        staging.mkdir(parents=True)
+        for name in SNAPSHOT_KEEP:
+            src = self.source / name
+            dst = staging / name
+            if src.is_dir():
+                shutil.copytree(src, dst, ignore=shutil.ignore_patterns("LOCK"))
+            elif src.is_file():
+                dst.parent.mkdir(parents=True, exist_ok=True)
+                shutil.copy2(src, dst)
+        (staging / ".snapshot").write_text(self.source.name)
+
+        old = self.path.with_name(f"{self.path.name}.{os.getpid()}.old")
+        if self.path.exists():
+            self.path.rename(old)
+        staging.rename(self.path)
+        shutil.rmtree(old, ignore_errors=True)
+        print(f"📸 Đã tạo snapshot profile {self.source.name}")
+
+    def _file_lock(self) -> FileLock:
+        # threading.Lock chỉ chặn thread cùng process; worker khác cần khóa file
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        return FileLock(self.path.with_name(f"{self.path.name}.lock"))
+
+    def ensure(self):
+        with self._lock, self._file_lock():
+            if self.is_stale():
+                self.build()
+
+    def clone(self) -> Path:
+        """Copy snapshot vào tmpfs, trả về user-data-dir dùng một lần"""
+        root = tmpfs_root()
+        if root is not None:
+            purge_orphan_clones(root)
+        clone = Path(tempfile.mkdtemp(prefix=f"{CLONE_PREFIX}{os.getpid()}-", dir=root))
+        try:
+            # Copy trong cùng khóa với build: worker khác không thể đổi snapshot giữa chừng
+            with self._lock, self._file_lock():
+                if self.is_stale():
+                    self.build()
+                shutil.copytree(self.path, clone, dirs_exist_ok=True)
+        except BaseException:
+            discard_profile_clone(clone)
+            raise
+        return clone
+
+
+def discard_profile_clone(clone: Path | None):
+    if clone is not None:
+        shutil.rmtree(clone, ignore_errors=True)
+
+
+# ---------------------------------------------------------------------------
+# Watchdog bộ nhớ / độ trễ - tải lại tab hoặc thay trình duyệt chủ động
+# ---------------------------------------------------------------------------
+
+@dataclass
+class WatchdogConfig:
+    enabled: bool = True
+    max_rss_mb: float = 3000.0  # RSS cả cây process Chrome vượt mức này -> khởi động lại
+    reload_rss_ratio: float = 0.75  # Vượt max_rss_mb * tỉ lệ này -> tải lại tab trước
+    max_latency_drift: float = 1.8  # Latency (EWMA) / latency lúc mới khởi động
+    baseline_chunks: int = 5  # Số chunk đầu dùng làm mốc latency
+    ewma_alpha: float = 0.3
+    prune_audio: bool = True  # Xóa <audio> cũ sau mỗi chunk
+    recycle_every: int = 0  # Khởi động lại sau N chunk bất kể chỉ số (0 = tắt)
+
+
+def process_tree_rss(pid: int) -> int:
+    """Tổng RSS (byte) của process và toàn bộ process con"""
+    import psutil
+
+    try:
+        root = psutil.Process(pid)
+        processes = [root, *root.children(recursive=True)]
+    except psutil.NoSuchProcess:
+        return 0
+    total = 0
+    for proc in processes:
+        try:
+            total += proc.memory_info().rss
+        except (psutil.NoSuchProcess, psutil.AccessDenied):
+            pass
+    return total
+
+
+class BrowserWatchdog:
+    """Theo dõi RSS và latency giữa các chunk, quyết định prune / reload / recycle.
+
+    Tab chạy hàng trăm lần generate tích tụ thẻ <audio> và data URL lớn nên RSS và
+    thời gian ``find_elements`` tăng dần; watchdog xử lý trước khi nó thành lỗi.
+    """
+
+    def __init__(self, config: WatchdogConfig | None = None):
+        self.config = config or WatchdogConfig()
+        self.reset()
+
+    def reset(self):
+        """Gọi khi trình duyệt vừa khởi động (lại)"""
+        self.chunks_since_start = 0
+        self.reset_latency()
+        self.reloaded_since_start = False
+
+    def reset_latency(self):
+        self._baseline_samples: list[float] = []
+        self.baseline: float | None = None
+        self.ewma: float | None = None
+
+    def observe_latency(self, latency: float):
+        if self.baseline is None:
+            self._baseline_samples.append(latency)
+            if len(self._baseline_samples) >= self.config.baseline_chunks:
+                self.baseline = statistics.median(self._baseline_samples)
+                self.ewma = self.baseline
+            return
+        if self.ewma is None:
+            self.ewma = latency
+            return
+        alpha = self.config.ewma_alpha
+        self.ewma = alpha * latency + (1 - alpha) * self.ewma
+
+    def latency_drift(self) -> float:
+        if not self.baseline or self.ewma is None:
+            return 1.0
+        return self.ewma / self.baseline
+
+    def after_chunk(self, backend: BrowserBackend, latency: float, keep_src: str | None = None) -> str:
+        """Trả về "none", "reload" hoặc "recycle" cho trình duyệt hiện tại"""
+        config = self.config
+        self.chunks_since_start += 1
+        self.observe_latency(latency)
+
+        if config.prune_audio:
+            try:
+                removed = backend.prune_audio(keep_src)
+                if removed:
+                    print(f"🧹 Đã xóa {removed} thẻ audio cũ trong page")
+            except Exception as e:
+                print(f"⚠ Không xóa được audio cũ: {e}")
+
+        if config.recycle_every and self.chunks_since_start >= config.recycle_every:
+            print(f"♻ Đã chạy {self.chunks_since_start} chunk, khởi động lại trình duyệt theo lịch")
+            return "recycle"
+
+        rss_mb = 0.0
+        pid = backend.browser_pid()
+        if pid:
+            try:
+                rss_mb = process_tree_rss(pid) / (1024 * 1024)
+            except Exception:
+                rss_mb = 0.0  # Không có psutil thì chỉ dựa vào latency
+
+        drift = self.latency_drift()
+        if rss_mb > config.max_rss_mb:
+            print(f"♻ RSS Chrome {rss_mb:.0f} MB > {config.max_rss_mb:.0f} MB, khởi động lại trình duyệt")
+            return "recycle"
+        if drift > config.max_latency_drift:
+            if self.reloaded_since_start:
+                print(f"♻ Latency vẫn gấp {drift:.1f}x sau khi tải lại tab, khởi động lại trình duyệt")
+                return "recycle"
+            print(f"🔄 Latency tăng {drift:.1f}x so với lúc đầu, tải lại tab")
+            return "reload"
+        if rss_mb > config.max_rss_mb * config.reload_rss_ratio and not self.reloaded_since_start:
+            print(f"🔄 RSS Chrome {rss_mb:.0f} MB, tải lại tab để giải phóng bộ nhớ")
+            return "reload"
+        return "none"
+
+    def reloaded(self):
+        # Giữ mốc latency cũ: nếu tải lại tab không giúp gì thì lần sau sẽ recycle
+        self.reloaded_since_start = True
+        self.ewma = None
+
+
+# ---------------------------------------------------------------------------
+# Profiling / theo dõi rò rỉ bộ nhớ (opt-in) cho các job chạy nhiều giờ
+# ---------------------------------------------------------------------------
+
+PROFILERS = ("cprofile", "pyinstrument")
+LARGE_OBJECT_BYTES = 1024 * 1024  # str / bytes lớn hơn mức này được đếm riêng (data URL, PCM)
+
+
+@dataclass
+class ProfilingConfig:
+    output_dir: Path | None = None  # Mặc định: <download_dir>/profile
+    snapshot_every: int = 20  # Chụp tracemalloc và so sánh sau mỗi N chunk (0 = tắt)
+    traceback_frames: int = 10
+    top: int = 25  # Số dòng in trong mỗi báo cáo
+    profiler: str | None = None  # "cprofile" / "pyinstrument" bọc từng chunk, None = tắt
+
+
+class ChunkProfiler:
+    """Ghi CPU / bộ nhớ của từng chunk và diff tracemalloc định kỳ ra đĩa.
+
+    ``chunks.jsonl``: mỗi lần thử một dòng (wall, CPU, bộ nhớ Python hiện tại / đỉnh, RSS).
+    ``snapshot_XXXX.txt``: chỗ cấp phát tăng nhiều nhất so với lần chụp trước và so
+    với lúc bắt đầu, kèm số object theo kiểu và các str / bytes lớn còn sống.
+    ``chunk_XXXX.prof`` / ``.html``: profile của từng chunk khi bật ``profiler``.
+    """
+
+    def __init__(self, config: ProfilingConfig, output_dir: Path):
+        self.config = config
+        self.output_dir = Path(config.output_dir or output_dir)
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        self._baseline = None
+        self._previous = None
+        self._completed = 0
+        self._current: dict | None = None
+        self._profiler = None
+        self._started_tracing = False
+
+    def start(self):
+        import tracemalloc
+
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.config.traceback_frames)
+            self._started_tracing = True
+        self._baseline = self._previous = self._snapshot()
+        print(f"🔬 Profiling bật, báo cáo ghi vào {self.output_dir}")
+
+    def stop(self):
+        import tracemalloc
+
+        self.write_snapshot("final")
+        if self._started_tracing:  # Tracing do người khác bật (vd. python -X tracemalloc) thì để nguyên
+            tracemalloc.stop()
+            self._started_tracing = False
+
+    @staticmethod
+    def _snapshot():
+        import tracemalloc
+
+        return tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+            tracemalloc.Filter(False, "<unknown>"),
+            tracemalloc.Filter(False, "*/cProfile.py"),  # Chính profiler của chunk
+        ))
+
+    def begin(self, index: int):
+        import tracemalloc
+
+        tracemalloc.reset_peak()
+        self._current = {"index": index, "wall": time.perf_counter(), "cpu": time.process_time()}
+        if self.config.profiler == "cprofile":
+            import cProfile
+
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+        elif self.config.profiler == "pyinstrument":
+            try:
+                from pyinstrument import Profiler
+            except ImportError:
+                print("⚠ Chưa cài pyinstrument (pip install pyinstrument), dùng cprofile")
+                self.config.profiler = "cprofile"
+                return self.begin(index)
+            self._profiler = Profiler(interval=0.005)
+            self._profiler.start()
+
+    def end(self, outcome: str):
+        import tracemalloc
+
+        if self._current is None:
+            return
+        current = self._current
+        self._current = None
+        index = current["index"]
+        profiler, self._profiler = self._profiler, None
+        if profiler is not None:
+            stem = self.output_dir / f"chunk_{index:04d}"
+            if self.config.profiler == "cprofile":
+                profiler.disable()
+                profiler.dump_stats(f"{stem}.prof")
+            else:
+                profiler.stop()
+                Path(f"{stem}.html").write_text(profiler.output_html(), encoding="utf-8")
+
+        allocated, peak = tracemalloc.get_traced_memory()
+        record = {
+            "index": index,
+            "outcome": outcome,
+            "wall_s": round(time.perf_counter() - current["wall"], 3),
+            "cpu_s": round(time.process_time() - current["cpu"], 3),
+            "python_mb": round(allocated / 2**20, 2),
+            "python_peak_mb": round(peak / 2**20, 2),
+            "rss_mb": self._rss_mb(),
+        }
+        with open(self.output_dir / "chunks.jsonl", "a", encoding="utf-8") as f:
+            f.write(json.dumps(record) + "\n")
+
+        self._completed += 1
+        if self.config.snapshot_every and self._completed % self.config.snapshot_every == 0:
+            self.write_snapshot(f"{self._completed:04d}")
+
+    @staticmethod
+    def _rss_mb() -> float | None:
+        try:
+            import psutil
+
+            return round(psutil.Process().memory_info().rss / 2**20, 1)
+        except Exception:
+            return None
+
+    def write_snapshot(self, label: str):
+        import gc
+        from collections import Counter
+
+        snapshot = self._snapshot()
+        top = self.config.top
+        lines = [f"# Snapshot {label} sau {self._completed} chunk, RSS {self._rss_mb()} MB", ""]
+        for title, reference in (("So với lần chụp trước", self._previous), ("So với lúc bắt đầu", self._baseline)):
+            lines.append(f"## {title}")
+            for stat in snapshot.compare_to(reference, "lineno")[:top]:
+                lines.append(str(stat))
+            lines.append("")
+
+        objects = gc.get_objects()
+        counts = Counter(type(obj).__qualname__ for obj in objects)
+        lines.append("## Số object theo kiểu")
+        lines.extend(f"{count:>10} {name}" for name, count in counts.most_common(top))
+        large = [obj for obj in objects if isinstance(obj, (str, bytes, bytearray)) and len(obj) > LARGE_OBJECT_BYTES]
+        lines.append("")
+        lines.append(f"## str / bytes > {LARGE_OBJECT_BYTES // 2**20} MB còn sống: {len(large)}")
+        for obj in sorted(large, key=len, reverse=True)[:top]:
+            lines.append(f"{len(obj) / 2**20:>8.1f} MB {type(obj).__name__} {obj[:60]!r}")
+        del objects, large
+
+        (self.output_dir / f"snapshot_{label}.txt").write_text("\n".join(lines) + "\n", encoding="utf-8")
+        self._previous = snapshot
+
+
+# ---------------------------------------------------------------------------
+# Nhiều tài khoản: registry profile + theo dõi quota
+# ---------------------------------------------------------------------------
+
+PROFILE_REGISTRY_FILE = SCRIPT_DIR / "profiles.json"
+RATE_LIMIT_COOLDOWN = 15 * 60  # Giây nghỉ khi bị rate limit
+
+
+class NoProfileAvailableError(RuntimeError):
+    pass
+
+
+def _today() -> str:
+    return datetime.date.today().isoformat()
+
+
+def _next_midnight() -> float:
+    tomorrow = datetime.date.today() + datetime.timedelta(days=1)
+    return datetime.datetime.combine(tomorrow, datetime.time()).timestamp()
+
+
+@dataclass
+class ProfileState:
+    name: str
+    path: str
+    daily_quota: int = 0  # 0 = không giới hạn (chỉ đổi khi page báo hết quota)
+    used_today: int = 0
+    day: str = field(default_factory=_today)
+    total_used: int = 0
+    cooldown_until: float = 0.0
+    last_signal: str | None = None
+
+    @property
+    def profile_path(self) -> Path:
+        path = Path(self.path)
+        return path if path.is_absolute() else SCRIPT_DIR / path
+
+    def roll_day(self):
+        today = _today()
+        if self.day != today:
+            self.day = today
+            self.used_today = 0
+
+    def headroom(self) -> float:
+        """Số chunk còn chạy được hôm nay (vô hạn nếu không đặt quota)"""
+        self.roll_day()
+        if self.daily_quota <= 0:
+            return float("inf")
+        return max(self.daily_quota - self.used_today, 0)
+
+    def is_available(self, now: float | None = None) -> bool:
+        now = time.time() if now is None else now
+        return self.cooldown_until <= now and self.headroom() > 0
+
+
+class ProfileRegistry:
+    """Danh sách profile Chrome đã đăng nhập, lưu ở profiles.json cạnh script.
+
+    Tự nhận các profile dự phòng ``SeleniumProfileData_XXXX`` đã được tạo trước đó
+    để chúng không bị bỏ quên.
+    """
+
+    def __init__(self, path: Path = PROFILE_REGISTRY_FILE):
+        self.path = Path(path)
+        self.profiles: dict[str, ProfileState] = {}
+        self.reload()
+        self.discover()
+
+    def _read(self) -> dict[str, ProfileState]:
+        if not self.path.exists():
+            return {}
+        data = json.loads(self.path.read_text(encoding="utf-8"))
+        return {entry["name"]: ProfileState(**entry) for entry in data.get("profiles", [])}
+
+    def reload(self):
+        """Nạp lại quota / cooldown mà worker khác đã ghi (giữ nguyên object đang dùng)"""
+        for name, state in self._read().items():
+            if name in self.profiles:
+                vars(self.profiles[name]).update(vars(state))
+            else:
+                self.profiles[name] = state
+
+    def _update(self, name: str, change: Callable[[ProfileState], None]):
+        """Đọc lại file, sửa đúng một profile rồi ghi lại - dưới khóa file, để
+        các worker dùng chung registry không ghi đè số liệu của nhau"""
+        with FileLock(self.path.with_name(self.path.name + ".lock")):
+            self.reload()
+            change(self.profiles[name])
+            self.save()
+
+    def discover(self):
+        for candidate in sorted(SCRIPT_DIR.glob(f"{DEFAULT_PROFILE_NAME}*")):
+            if candidate.is_dir() and candidate.name not in self.profiles:
+                self.profiles[candidate.name] = ProfileState(candidate.name, candidate.name)
+
+    def save(self):
+        payload = {"profiles": [asdict(p) for p in self.profiles.values()]}
+        tmp = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+        tmp.write_text(json.dumps(payload, indent=2, ensure_ascii=False), encoding="utf-8")
+        tmp.replace(self.path)
+
+    def add(self, name: str, daily_quota: int = 0) -> ProfileState:
+        self.profiles.setdefault(name, ProfileState(name, name))
+
+        def change(state: ProfileState):
+            state.daily_quota = daily_quota
+
+        self._update(name, change)
+        return self.profiles[name]
+
+    def pick(self, exclude: Iterable[str] = ()) -> ProfileState:
+        """Profile còn nhiều headroom nhất; ưu tiên profile ít dùng hôm nay"""
+        excluded = set(exclude)
+        self.reload()
+        now = time.time()
+        candidates = [
+            p for p in self.profiles.values()
+            if p.name not in excluded and p.profile_path.exists() and p.is_available(now)
+        ]
+        if not candidates:
+            waits = [p.cooldown_until - now for p in self.profiles.values() if p.cooldown_until > now]
+            hint = f" (profile sớm nhất rảnh sau {min(waits) / 60:.0f} phút)" if waits else ""
+            raise NoProfileAvailableError(f"Không còn profile nào còn quota{hint}")
+        return max(candidates, key=lambda p: (p.headroom(), -p.used_today))
+
+    def record_use(self, name: str):
+        def change(state: ProfileState):
+            state.roll_day()
+            state.used_today += 1
+            state.total_used += 1
+
+        self._update(name, change)
+
+    def mark_limited(self, name: str, kind: str):
+        """Hết quota: nghỉ tới hết ngày. Rate limit: nghỉ RATE_LIMIT_COOLDOWN giây"""
+        def change(state: ProfileState):
+            state.last_signal = kind
+            state.cooldown_until = _next_midnight() if kind == "quota" else time.time() + RATE_LIMIT_COOLDOWN
+
+        self._update(name, change)
+
+    def reset(self, name: str):
+        """Bỏ cooldown của profile (người dùng xác nhận profile đã dùng lại được)"""
+        def change(state: ProfileState):
+            state.cooldown_until = 0.0
+            state.last_signal = None
+
+        self._update(name, change)
+
+
+# ---------------------------------------------------------------------------
+# Hàng đợi chunk dùng chung (SQLite) - nhiều máy / process cùng làm một job
+# ---------------------------------------------------------------------------
+
+DEFAULT_LEASE_SECONDS = 300.0  # Một chunk chậm nhất ~4 phút (120s chờ + 90s + download)
+
+
+def default_worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+class ChunkQueue:
+    """Hàng đợi chunk theo lease, lưu trong một file SQLite trên ổ dùng chung.
+
+    - ``claim`` lấy chunk đang chờ hoặc chunk có lease đã hết hạn (worker chết).
+    - ``heartbeat`` gia hạn lease khi chunk còn đang chạy.
+    - ``complete`` idempotent: chunk đã xong thì gọi lại cũng không sao.
+    Mọi thao tác ghi đều chạy trong ``BEGIN IMMEDIATE`` nên hai worker không thể
+    cùng claim một chunk.
+    """
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS chunks (
+        job TEXT NOT NULL,
+        idx INTEGER NOT NULL,
+        text TEXT NOT NULL,
+        text_hash TEXT NOT NULL,
+        state TEXT NOT NULL DEFAULT 'pending',
+        owner TEXT,
+        lease_until REAL NOT NULL DEFAULT 0,
+        attempts INTEGER NOT NULL DEFAULT 0,
+        result TEXT,
+        updated_at REAL NOT NULL DEFAULT 0,
+        claimed_at REAL NOT NULL DEFAULT 0,
+        hedge_owner TEXT,
+        PRIMARY KEY (job, idx)
+    )
+    """
+    # Cột thêm sau: file hàng đợi tạo từ bản cũ được bổ sung khi mở
+    ADDED_COLUMNS = (("claimed_at", "REAL NOT NULL DEFAULT 0"), ("hedge_owner", "TEXT"))
+
+    # Cấu hình lập lịch của job (xem JobScheduler); job không có dòng ở đây dùng mặc định
+    JOBS_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS jobs (
+        job TEXT PRIMARY KEY,
+        priority INTEGER NOT NULL DEFAULT 0,
+        weight REAL NOT NULL DEFAULT 1,
+        deadline REAL,
+        download_dir TEXT,
+        vtime REAL NOT NULL DEFAULT 0
+    )
+    """
+    JOB_SETTINGS = ("priority", "weight", "deadline", "download_dir")
+
+    def __init__(self, path: Path, max_attempts: int = 5):
+        self.path = Path(path)
+        self.max_attempts = max_attempts
+        # Không dùng WAL: WAL cần shared memory nên không chạy trên ổ mạng
+        self._db = sqlite3.connect(str(self.path), timeout=60, isolation_level=None)
+        self._db.execute("PRAGMA busy_timeout = 60000")
+        self._db.execute(self.SCHEMA)
+        self._db.execute(self.JOBS_SCHEMA)
+        columns = {row[1] for row in self._db.execute("PRAGMA table_info(chunks)")}
+        for name, declaration in self.ADDED_COLUMNS:
+            if name not in columns:
+                try:
+                    self._db.execute(f"ALTER TABLE chunks ADD COLUMN {name} {declaration}")
+                except sqlite3.OperationalError:
+                    pass  # Worker khác vừa thêm cùng lúc
+
+    def close(self):
+        self._db.close()
+
+    def _write(self, sql: str, params: tuple = ()) -> sqlite3.Cursor:
+        self._db.execute("BEGIN IMMEDIATE")
+        try:
+            cursor = self._db.execute(sql, params)
+            self._db.execute("COMMIT")
+            return cursor
+        except Exception:
+            self._db.execute("ROLLBACK")
+            raise
+
+    def enqueue(self, job: str, chunks: list[str]) -> int:
+        """Thêm chunk của job (gọi lại nhiều lần vẫn an toàn); chunk đổi text thì chạy lại"""
+        now = time.time()
+        self._db.execute("BEGIN IMMEDIATE")
+        try:
+            self._register_job(job)
+            for index, chunk in enumerate(chunks, start=1):
+                self._db.execute(
+                    """
+                    INSERT INTO chunks (job, idx, text, text_hash, updated_at) VALUES (?, ?, ?, ?, ?)
+                    ON CONFLICT (job, idx) DO UPDATE SET
+                        text = excluded.text, text_hash = excluded.text_hash,
+                        state = 'pending', owner = NULL, lease_until = 0, attempts = 0,
+                        result = NULL, updated_at = excluded.updated_at
+                    WHERE chunks.text_hash != excluded.text_hash
+                    """,
+                    (job, index, chunk, text_hash(chunk), now),
+                )
+            self._db.execute("DELETE FROM chunks WHERE job = ? AND idx > ?", (job, len(chunks)))
+            self._db.execute("COMMIT")
+        except Exception:
+            self._db.execute("ROLLBACK")
+            raise
+        return len(chunks)
+
+    def _register_job(self, job: str):
+        """Tạo dòng ``jobs`` cho job (trong transaction đang mở).
+
+        vtime của job mới - hoặc job quay lại sau khi đã hết việc - bắt đầu từ vtime
+        nhỏ nhất của các job đang chạy, như CFS: nếu bắt đầu từ 0 nó sẽ chiếm hết
+        worker cho tới khi "đuổi kịp" phần các job cũ đã nhận.
+        """
+        min_vtime = self._db.execute(
+            """
+            SELECT COALESCE(MIN(vtime), 0) FROM jobs
+            WHERE job != ? AND job IN (SELECT job FROM chunks WHERE state IN ('pending', 'leased'))
+            """,
+            (job,),
+        ).fetchone()[0]
+        self._db.execute(
+            """
+            INSERT INTO jobs (job, vtime) VALUES (?, ?)
+            ON CONFLICT (job) DO UPDATE SET vtime = MAX(vtime, excluded.vtime)
+            WHERE NOT EXISTS (SELECT 1 FROM chunks WHERE job = excluded.job AND state IN ('pending', 'leased'))
+            """,
+            (job, min_vtime),
+        )
+
+    def configure_job(self, job: str, **settings):
+        """Đặt priority / weight / deadline (epoch) / download_dir; setting không truyền giữ nguyên"""
+        unknown = set(settings) - set(self.JOB_SETTINGS)
+        if unknown:
+            raise TypeError(f"Không có setting job: {', '.join(sorted(unknown))}")
+        if settings.get("weight") is not None and settings["weight"] <= 0:
+            raise ValueError("weight phải > 0")
+        self._db.execute("BEGIN IMMEDIATE")
+        try:
+            self._register_job(job)
+            for name, value in settings.items():
+                self._db.execute(f"UPDATE jobs SET {name} = ? WHERE job = ?", (value, job))
+            self._db.execute("COMMIT")
+        except Exception:
+            self._db.execute("ROLLBACK")
+            raise
+
+    def job_settings(self, job: str) -> dict:
+        row = self._db.execute(
+            "SELECT priority, weight, deadline, download_dir FROM jobs WHERE job = ?", (job,)
+        ).fetchone()
+        return dict(zip(self.JOB_SETTINGS, row or (0, 1.0, None, None)))
+
+    def job_stats(self, now: float | None = None) -> list[JobStats]:
+        """Các job còn chunk chưa xong, kèm cấu hình lập lịch"""
+        now = time.time() if now is None else now
+        rows = self._db.execute(
+            """
+            SELECT c.job, COALESCE(j.priority, 0), COALESCE(j.weight, 1), j.deadline, COALESCE(j.vtime, 0),
+                SUM(c.state = 'pending' OR (c.state = 'leased' AND c.lease_until < ?)),
+                SUM(c.state IN ('pending', 'leased')),
+                SUM(CASE WHEN c.state IN ('pending', 'leased') THEN LENGTH(c.text) ELSE 0 END)
+            FROM chunks c LEFT JOIN jobs j ON j.job = c.job
+            GROUP BY c.job
+            HAVING SUM(c.state IN ('pending', 'leased')) > 0
+            """,
+            (now,),
+        )
+        return [JobStats(*row) for row in rows]
+
+    def active_workers(self, now: float | None = None) -> int:
+        now = time.time() if now is None else now
+        row = self._db.execute(
+            "SELECT COUNT(DISTINCT owner) FROM chunks WHERE state = 'leased' AND lease_until >= ?", (now,)
+        ).fetchone()
+        return row[0]
+
+    def done_indices(self, job: str) -> set[int]:
+        rows = self._db.execute("SELECT idx FROM chunks WHERE job = ? AND state = 'done'", (job,))
+        return {row[0] for row in rows}
+
+    def job_chunks(self, job: str) -> list[str]:
+        rows = self._db.execute("SELECT text FROM chunks WHERE job = ? ORDER BY idx", (job,)).fetchall()
+        return [row[0] for row in rows]
+
+    def claim(self, job: str, worker: str, lease_seconds: float = DEFAULT_LEASE_SECONDS) -> tuple[int, str] | None:
+        """Nhận chunk tiếp theo; None nếu không còn chunk nào để làm"""
+        now = time.time()
+        self._db.execute("BEGIN IMMEDIATE")
+        try:
+            row = self._db.execute(
+                """
+                SELECT idx, text, state, owner FROM chunks
+                WHERE job = ? AND (state = 'pending' OR (state = 'leased' AND lease_until < ?))
+                ORDER BY idx LIMIT 1
+                """,
+                (job, now),
+            ).fetchone()
+            if row is None:
+                self._db.execute("COMMIT")
+                return None
+            index, chunk, state, previous_owner = row
+            self._db.execute(
+                """
+                UPDATE chunks SET state = 'leased', owner = ?, lease_until = ?, attempts = attempts + 1,
+                    updated_at = ?, claimed_at = ?, hedge_owner = NULL
+                WHERE job = ? AND idx = ?
+                """,
+                (worker, now + lease_seconds, now, now, job, index),
+            )
+            # Fair share: job "trả" số ký tự vừa nhận, chia cho weight
+            self._register_job(job)  # Job enqueue từ bản cũ chưa có dòng trong ``jobs``
+            self._db.execute("UPDATE jobs SET vtime = vtime + ? / weight WHERE job = ?", (len(chunk), job))
+            self._db.execute("COMMIT")
+        except Exception:
+            self._db.execute("ROLLBACK")
+            raise
+        if state == "leased":
+            print(f"♻ Lấy lại chunk {index} từ worker {previous_owner} (lease hết hạn)")
+        return index, chunk
+
+    def claim_hedge(self, job: str, worker: str, min_age: float) -> tuple[int, str] | None:
+        """Nhận bản chạy song song (hedged) của chunk worker khác đã giữ quá ``min_age`` giây.
+
+        Owner và lease không đổi; mỗi chunk chỉ có một bản hedge. Bản nào ``complete``
+        trước thắng, bản kia thấy ``is_done`` và tự hủy.
+        """
+        now = time.time()
+        self._db.execute("BEGIN IMMEDIATE")
+        try:
+            row = self._db.execute(
+                """
+                SELECT idx, text FROM chunks
+                WHERE job = ? AND state = 'leased' AND lease_until >= ? AND owner != ?
+                    AND hedge_owner IS NULL AND claimed_at > 0 AND claimed_at < ?
+                ORDER BY claimed_at LIMIT 1
+                """,
+                (job, now, worker, now - min_age),
+            ).fetchone()
+            if row is not None:
+                self._db.execute(
+                    "UPDATE chunks SET hedge_owner = ?, updated_at = ? WHERE job = ? AND idx = ?",
+                    (worker, now, job, row[0]),
+                )
+            self._db.execute("COMMIT")
+        except Exception:
+            self._db.execute("ROLLBACK")
+            raise
+        return None if row is None else (row[0], row[1])
+
+    def is_done(self, job: str, index: int) -> bool:
+        row = self._db.execute("SELECT state FROM chunks WHERE job = ? AND idx = ?", (job, index)).fetchone()
+        return row is not None and row[0] == "done"
+
+    def heartbeat(self, job: str, index: int, worker: str, lease_seconds: float = DEFAULT_LEASE_SECONDS) -> bool:
+        """Gia hạn lease; False nếu lease đã mất (worker khác đã lấy chunk)"""
+        now = time.time()
+        cursor = self._write(
+            """
+            UPDATE chunks SET lease_until = ?, updated_at = ?
+            WHERE job = ? AND idx = ? AND owner = ? AND state = 'leased'
+            """,
+            (now + lease_seconds, now, job, index, worker),
+        )
+        return cursor.rowcount == 1
+
+    def complete(self, job: str, index: int, worker: str, result: Path) -> bool:
+        """Đánh dấu xong; False nếu chunk đã được worker khác hoàn thành trước"""
+        cursor = self._write(
+            """
+            UPDATE chunks SET state = 'done', owner = ?, result = ?, lease_until = 0, hedge_owner = NULL, updated_at = ?
+            WHERE job = ? AND idx = ? AND state != 'done'
+            """,
+            (worker, str(result), time.time(), job, index),
+        )
+        return cursor.rowcount == 1
+
+    def release(self, job: str, index: int, worker: str):
+        """Trả chunk về hàng đợi sau lỗi; quá max_attempts thì đánh dấu failed.
+
+        Worker chỉ giữ bản hedge thì chỉ bỏ bản hedge, chunk vẫn thuộc owner.
+        """
+        self._write(
+            "UPDATE chunks SET hedge_owner = NULL WHERE job = ? AND idx = ? AND hedge_owner = ?",
+            (job, index, worker),
+        )
+        self._write(
+            """
+            UPDATE chunks SET state = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END,
+                owner = NULL, lease_until = 0, updated_at = ?
+            WHERE job = ? AND idx = ? AND owner = ? AND state = 'leased'
+            """,
+            (self.max_attempts, time.time(), job, index, worker),
+        )
+
+    def retry_failed(self, job: str) -> int:
+        cursor = self._write(
+            "UPDATE chunks SET state = 'pending', attempts = 0, updated_at = ? WHERE job = ? AND state = 'failed'",
+            (time.time(), job),
+        )
+        return cursor.rowcount
+
+    def progress(self, job: str) -> dict[str, int]:
+        rows = self._db.execute("SELECT state, COUNT(*) FROM chunks WHERE job = ? GROUP BY state", (job,))
+        return dict(rows.fetchall())
+
+    def jobs(self) -> list[str]:
+        return [row[0] for row in self._db.execute("SELECT DISTINCT job FROM chunks ORDER BY job")]
+
+
+class LeaseKeeper:
+    """Thread gia hạn lease định kỳ trong lúc chunk đang được xử lý"""
+
+    def __init__(self, queue_path: Path, job: str, index: int, worker: str, lease_seconds: float):
+        self.queue_path = queue_path
+        self.job = job
+        self.index = index
+        self.worker = worker
+        self.lease_seconds = lease_seconds
+        self.lost = False
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        queue = ChunkQueue(self.queue_path)  # Kết nối SQLite riêng cho thread này
+        try:
+            while not self._stop.wait(self.lease_seconds / 3):
+                if not queue.heartbeat(self.job, self.index, self.worker, self.lease_seconds):
+                    self.lost = True
+                    print(f"⚠ Mất lease chunk {self.index} - worker khác sẽ làm lại")
+                    return
+        except sqlite3.Error as e:
+            print(f"⚠ Không gia hạn được lease chunk {self.index}: {e}")
+        finally:
+            queue.close()
+
+    def start(self) -> "LeaseKeeper":
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def __enter__(self) -> "LeaseKeeper":
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+
+# ---------------------------------------------------------------------------
+# Lập lịch nhiều job trên cùng hàng đợi: priority, deadline, chia theo weight
+# ---------------------------------------------------------------------------
+
+DEFAULT_CHUNK_SECONDS = 60.0  # Ước lượng khi cost model chưa đủ dữ liệu
+DURATION_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+
+
+@dataclass
+class JobStats:
+    job: str
+    priority: int
+    weight: float
+    deadline: float | None  # Epoch giây
+    vtime: float  # Ký tự đã nhận / weight, tính từ lúc job vào hàng đợi
+    runnable: int  # Chunk nhận được ngay (pending hoặc lease hết hạn)
+    remaining: int  # Chunk chưa xong (gồm cả chunk worker khác đang giữ)
+    remaining_chars: int
+
+
+class JobScheduler:
+    """Chọn job mà worker nên làm chunk tiếp theo khi hàng đợi có nhiều job.
+
+    Thứ tự ưu tiên:
+    1. Job có deadline đang có nguy cơ trễ (thời gian còn lại ước lượng bằng
+       ChunkCostModel, chia cho số worker đang chạy, nhân ``deadline_margin``),
+       deadline sớm nhất trước.
+    2. Priority cao hơn.
+    3. Cùng priority: vtime nhỏ nhất (ký tự đã nhận / weight) - job lớn không bị
+       bỏ đói, job weight 2 nhận gấp đôi job weight 1.
+
+    Worker chỉ đổi job giữa hai chunk nên không mất tiến độ: job bị lớp cao hơn
+    vượt thì nhường ngay sau chunk đang chạy, còn chia đều trong cùng lớp thì
+    nhường sau ``quantum`` chunk (đổi job có chi phí quét lại thư mục chunk).
+    """
+
+    def __init__(
+        self,
+        model: ChunkCostModel | None = None,
+        delay: float = 10.0,
+        deadline_margin: float = 1.25,
+        quantum: int = 5,
+    ):
+        self.model = model
+        self.delay = delay
+        self.deadline_margin = deadline_margin
+        self.quantum = quantum
+
+    def remaining_seconds(self, stats: JobStats, workers: int = 1) -> float:
+        if not stats.remaining:
+            return 0.0
+        if self.model is not None and self.model.is_ready():
+            per_chunk = self.model.expected_chunk_time(stats.remaining_chars // stats.remaining, self.delay)
+        else:
+            per_chunk = DEFAULT_CHUNK_SECONDS + self.delay
+        return stats.remaining * per_chunk / max(workers, 1)
+
+    def at_risk(self, stats: JobStats, now: float, workers: int = 1) -> bool:
+        if stats.deadline is None:
+            return False
+        return now + self.remaining_seconds(stats, workers) * self.deadline_margin >= stats.deadline
+
+    def _class(self, stats: JobStats, now: float, workers: int) -> tuple:
+        if self.at_risk(stats, now, workers):
+            return (0, stats.deadline, 0)
+        return (1, 0.0, -stats.priority)
+
+    def rank(self, jobs: Iterable[JobStats], now: float | None = None, workers: int = 1) -> list[JobStats]:
+        """Job có chunk nhận được ngay, job nên chạy trước đứng đầu"""
+        now = time.time() if now is None else now
+        runnable = [stats for stats in jobs if stats.runnable]
+        return sorted(runnable, key=lambda s: (*self._class(s, now, workers), s.vtime, s.job))
+
+    def _ranked(self, queue: ChunkQueue) -> tuple[list[JobStats], float, int]:
+        now = time.time()
+        workers = max(queue.active_workers(now), 1)
+        return self.rank(queue.job_stats(now), now, workers), now, workers
+
+    def next_job(self, queue: ChunkQueue) -> str | None:
+        """Job nên chạy tiếp; None nếu không job nào có chunk nhận được ngay"""
+        ranked, _, _ = self._ranked(queue)
+        return ranked[0].job if ranked else None
+
+    def preempted_by(self, queue: ChunkQueue, current: str, served: int) -> str | None:
+        """Job nên chạy thay ``current`` (đã làm ``served`` chunk liền); None nếu làm tiếp
+        ``current`` - kể cả khi nó đã hết chunk, để caller tự kết thúc như bình thường"""
+        ranked, now, workers = self._ranked(queue)
+        mine = next((stats for stats in ranked if stats.job == current), None)
+        if mine is None or ranked[0] is mine:
+            return None
+        best = ranked[0]
+        if self._class(best, now, workers) < self._class(mine, now, workers) or served >= self.quantum:
+            return best.job
+        return None
+
+
+def parse_deadline(value: str) -> float:
+    """Thời lượng tính từ bây giờ ("90m", "2h", "1d") hoặc thời điểm ISO ("2026-10-20 08:00")"""
+    match = re.fullmatch(r"(\d+(?:\.\d+)?)([smhd])", value.strip())
+    if match:
+        return time.time() + float(match.group(1)) * DURATION_UNITS[match.group(2)]
+    try:
+        return datetime.datetime.fromisoformat(value).timestamp()
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Deadline không hợp lệ: {value!r} (ví dụ: 90m, 2h, 2026-10-20 08:00)")
+
+
+AI_STUDIO_URL = "https://aistudio.google.com/"
+
+
+class BrowserSession:
+    """Giữ một trình duyệt dùng chung cho nhiều chunk và nhiều file input.
+
+    Chi phí khởi động Chrome + chờ trang load chỉ phải trả một lần cho cả batch.
+    Có ``profiles`` thì mỗi lần khởi động chọn profile còn quota, và tự đổi
+    profile khi profile hiện tại hết headroom hoặc bị giới hạn.
+    """
+
+    def __init__(
+        self,
+        download_dir: Path,
+        interactive: bool = True,
+        page_load_wait: float = 20.0,
+        backend: str = "selenium",
+        profiles: ProfileRegistry | None = None,
+        watchdog: WatchdogConfig | None = None,
+        snapshot: bool = False,
+    ):
+        self.download_dir = Path(download_dir)
+        self.interactive = interactive
+        self.page_load_wait = page_load_wait
+        self.backend_kind = backend
+        self.backend: BrowserBackend | None = None
+        self.profiles = profiles
+        self.profile: ProfileState | None = None
+        self.snapshot = snapshot
+        watchdog = watchdog or WatchdogConfig()
+        self.watchdog = BrowserWatchdog(watchdog) if watchdog.enabled else None
+        self.latency = LatencyTracker()  # Dùng chung cho mọi job chạy trên session này
+
+    def ensure(self) -> BrowserBackend:
+        """Trả về backend đang chạy, khởi động mới nếu cần"""
+        if self.backend is not None and self.profile is not None and not self.profile.is_available():
+            print(f"🔁 Profile {self.profile.name} đã dùng hết quota hôm nay, đổi profile...")
+            self.discard()
+
+        if self.backend is None:
+            profile_path = None
+            if self.profiles is not None:
+                self.profile = self.profiles.pick()
+                profile_path = self.profile.profile_path
+                print(f"👤 Dùng profile {self.profile.name} (còn {self.profile.headroom():g} chunk hôm nay)")
+            print(f"🚀 Khởi động Chrome (backend: {self.backend_kind})...")
+            if self.watchdog:
+                self.watchdog.reset()
+            self.backend = build_backend(
+                self.backend_kind,
+                self.download_dir,
+                interactive=self.interactive,
+                profile_path=profile_path,
+                snapshot=self.snapshot,
+            )
+            print("🌐 Đang tải trang Google AI Studio...")
+            self.backend.open(AI_STUDIO_URL)
+            if self.backend_kind not in BROWSERLESS_BACKENDS:
+                print(f"⏳ Chờ {self.page_load_wait:g} giây để trang load và đăng nhập...")
+                time.sleep(self.page_load_wait)  # Chờ trang load và đăng nhập
+            print("✓ Đã tải trang thành công")
+        return self.backend
+
+    def record_success(self):
+        if self.profiles is not None and self.profile is not None:
+            self.profiles.record_use(self.profile.name)
+
+    def maintain(self, latency: float):
+        """Giữa hai chunk: để watchdog dọn page, tải lại tab hoặc thay trình duyệt"""
+        if self.watchdog is None or self.backend is None:
+            return
+        action = self.watchdog.after_chunk(self.backend, latency)
+        if action == "reload":
+            self.backend.refresh()
+            time.sleep(3)
+            self.watchdog.reloaded()
+        elif action == "recycle":
+            self.discard()  # Chunk sau sẽ khởi động trình duyệt mới
+
+    def rotate(self, kind: str) -> bool:
+        """Đánh dấu profile hiện tại bị giới hạn; False nếu không có profile để đổi"""
+        if self.profiles is None or self.profile is None:
+            return False
+        print(f"🔁 Profile {self.profile.name} bị giới hạn ({kind}), chuyển profile khác...")
+        self.profiles.mark_limited(self.profile.name, kind)
+        self.profile = None
+        self.discard()
+        return True
+
+    def discard(self):
+        """Bỏ trình duyệt hiện tại (sau lỗi) để lần sau khởi động lại"""
+        if self.backend:
+            # Chỉ cây process của session này: Chrome khác có thể là worker khác trên cùng máy
+            processes = browser_process_tree(self.backend.browser_pid())
+            try:
+                self.backend.quit()
+            except:
+                pass
+            kill_process_tree(processes)  # Chrome treo không thoát sau quit
+            discard_profile_clone(self.backend.profile_clone)
+            self.backend = None
+
+    def close(self):
+        if self.backend:
+            processes = browser_process_tree(self.backend.browser_pid())
+            try:
+                self.backend.quit()
+                print("🔚 Đã đóng trình duyệt")
+            except:
+                pass
+            kill_process_tree(processes)
+            discard_profile_clone(self.backend.profile_clone)
+            self.backend = None
+
+
+def collect_chunk_results(
+    download_path: Path,
+    filename_template: str,
+    total_chunks: int,
+    report_missing: bool = True,
+    keys: list[str] | None = None,
+) -> list[DownloadResult]:
+    """Liệt kê các chunk đã có trên đĩa theo thứ tự index (``keys``: chunk_key của từng chunk)"""
+    all_results = []
+    for i in range(1, total_chunks + 1):
+        expected_file = find_existing_chunk(download_path, filename_template, i, keys[i - 1] if keys else None)
+        if expected_file:
+            all_results.append(DownloadResult(i, expected_file, expected_file))
+        elif report_missing:
+            print(f"⚠ Thiếu file chunk {i} để merge")
+    return all_results
+
+
+def automate_google_ai_simple(
+    text_chunks: Iterable[str],
+    download_dir: os.PathLike[str] | str,
+    filename_template: str = "audio_chunk_{index:02d}.wav",
+    delay_between_downloads: float = 10.0,
+    session: BrowserSession | None = None,
+    backend: str = "selenium",
+    chunk_format: str = "wav",
+    profiles: ProfileRegistry | None = None,
+    record_traces: bool = True,
+    queue: ChunkQueue | None = None,
+    job: str | None = None,
+    worker_id: str | None = None,
+    lease_seconds: float = DEFAULT_LEASE_SECONDS,
+    rate_model: SpeakingRateModel | None = None,
+    profiling: ProfilingConfig | None = None,
+    scheduler: JobScheduler | None = None,
+    hedge_quantile: float | None = None,
+    progressive: ProgressiveConfig | None = None,
+) -> list[DownloadResult]:
+    """Phiên bản đơn giản - dễ debug
+
+    Truyền ``session`` để dùng chung một trình duyệt cho nhiều lần gọi (chế độ batch);
+    khi đó trình duyệt không bị đóng lúc hàm kết thúc. ``backend`` chọn cách điều
+    khiển Chrome khi hàm tự tạo session ("selenium" hoặc "cdp"). ``chunk_format="flac"``
+    nén mỗi chunk sau khi kiểm tra (cần ffmpeg); resume nhận cả file .wav lẫn .flac.
+    ``profiles`` bật xoay vòng nhiều tài khoản: chunk gặp giới hạn quota được chạy
+    lại trên profile khác thay vì làm hỏng job. Mỗi lần thử một chunk được ghi vào
+    ``chunk_traces.jsonl`` (tắt bằng ``record_traces=False``) để dùng cho ``simulate``.
+
+    Có ``queue`` thì chunk được nhận qua lease từ ChunkQueue (``job`` mặc định là tên
+    thư mục download), nên nhiều process / máy có thể cùng chạy một job mà không
+    làm trùng chunk của nhau.
+
+    ``filename_template`` có thể dùng ``{key}`` (hash nội dung chunk, xem content_split)
+    thay cho ``{index}``: khi đó audio đi theo text chứ không theo vị trí, sửa
+    text rồi chạy lại chỉ phải tạo các chunk có nội dung mới.
+
+    ``rate_model`` so thời lượng audio với số ký tự của chunk; chunk bị cắt cụt
+    được chạy lại ngay (tối đa ``max_implausible`` lần rồi chấp nhận). Mặc định
+    dùng model chung trong ``speaking_rate.json``.
+
+    ``profiling`` (opt-in) ghi CPU / bộ nhớ của từng chunk và diff tracemalloc sau
+    mỗi N chunk vào ``<download_dir>/profile`` để tìm rò rỉ trong các job dài.
+
+    Có ``scheduler`` (chế độ queue) thì trước mỗi chunk hỏi JobScheduler; nếu job
+    khác nên chạy trước, hàm trả về sớm để worker chuyển job - chunk đã xong vẫn
+    nằm trong hàng đợi, lần gọi sau làm tiếp.
+
+    ``hedge_quantile`` (chế độ queue): khi hết chunk để nhận mà chunk của worker
+    khác đã chạy lâu hơn percentile này của latency chunk, chạy song song chính
+    chunk đó; bản xong trước thắng, bản kia bị hủy (ChunkCancelledError).
+
+    ``progressive`` ghi các chunk đầu đã xong (theo thứ tự) ra ``<final>.live.wav``
+    ngay khi từng chunk hợp lệ, để nghe trong lúc job còn chạy; đủ chunk thì file
+    đó thành output cuối cùng (xem ProgressiveOutput).
+    """
+
+    download_path = Path(download_dir)
+    download_path.mkdir(parents=True, exist_ok=True)
+    
+    chunks_list = list(text_chunks)
+    keys = [chunk_key(chunk) for chunk in chunks_list]
+    results: list[DownloadResult] = []
+    chunks_to_process: list[tuple[int, str]] = []
+    
+    print(f"📦 Tổng chunk: {len(chunks_list)}")
+
+    if queue is not None:
+        job = job or download_path.name
+        worker_id = worker_id or default_worker_id()
+        queue.enqueue(job, chunks_list)
+
+    keyed_names = "{key" in filename_template
+    queued_keys: set[str] = set()
+    # Chunk hàng đợi đã ghi nhận xong thì khỏi ghi lại (worker theo lịch quay lại job nhiều lần)
+    done_in_queue = queue.done_indices(job) if queue is not None else set()
+    for index, chunk in enumerate(chunks_list, start=1):
+        key = keys[index - 1]
+        existing = find_existing_chunk(download_path, filename_template, index, key)
+        if existing:
+            if index not in done_in_queue:
+                print(f"✓ Bỏ qua chunk {index}")
+                if queue is not None:
+                    queue.complete(job, index, worker_id, existing)
+        elif keyed_names and key in queued_keys and queue is None:
+            pass  # Cùng nội dung với chunk trước: dùng chung file audio
+        else:
+            queued_keys.add(key)
+            chunks_to_process.append((index, chunk))
+
+    if not chunks_to_process:
+        print("🎉 Tất cả file đã tồn tại!")
+        return collect_chunk_results(download_path, filename_template, len(chunks_list), report_missing=False, keys=keys)
+
+    print(f"🔨 Cần xử lý: {len(chunks_to_process)} chunk")
+    live = ProgressiveOutput(download_path, filename_template, keys, progressive).start() if progressive else None
+    
+    owns_session = session is None
+    if owns_session:
+        session = BrowserSession(download_path, backend=backend, profiles=profiles)
+    retry_count = 0
+    max_retries = 3
+    max_implausible = 2
+    implausible_counts: dict[int, int] = {}
+    # Dry-run không được làm lệch model học từ audio / latency thật
+    simulated = session.backend_kind in BROWSERLESS_BACKENDS
+    if rate_model is None:
+        rate_model = SpeakingRateModel(None if simulated else SPEAKING_RATE_FILE)
+    pending = deque(chunks_to_process)
+    recorder = TraceRecorder(download_path / TRACE_FILENAME) if record_traces else None
+    profiler = ChunkProfiler(profiling, download_path / "profile") if profiling else None
+    if profiler is not None:
+        profiler.start()
+
+    def record_trace(index: int, chunk: str, outcome: str, started: float, restart_cost: float, error: str | None = None):
+        if recorder is None:
+            return
+        recorder.record(ChunkTrace(
+            index=index,
+            chars=len(chunk),
+            attempt=recorder.next_attempt(index),
+            outcome=outcome,
+            latency=time.time() - started,
+            restart_cost=restart_cost,
+            started_at=started,
+            profile=session.profile.name if session.profile else None,
+            backend=session.backend_kind,
+            error=error,
+        ))
+    
+    served = 0
+    yielded = False
+    hedged: set[int] = set()
+
+    def next_chunk() -> tuple[int, str] | None:
+        nonlocal served, yielded
+        if queue is None:
+            return pending.popleft() if pending else None
+        while True:
+            if scheduler is not None:
+                preferred = scheduler.preempted_by(queue, job, served)
+                if preferred is not None:
+                    print(f"⏸ Nhường worker cho job {preferred} (job {job} làm tiếp sau)")
+                    yielded = True
+                    return None
+            claimed = queue.claim(job, worker_id, lease_seconds)
+            served += claimed is not None
+            if claimed is not None or not queue.progress(job).get("leased"):
+                return claimed
+            if scheduler is not None and scheduler.next_job(queue) is not None:
+                # Phần còn lại của job này do worker khác giữ, trong khi job khác có việc ngay
+                yielded = True
+                return None
+            hedge_after = session.latency.percentile("chunk", hedge_quantile) if hedge_quantile else None
+            if hedge_after is not None:
+                claimed = queue.claim_hedge(job, worker_id, hedge_after)
+                if claimed is not None:
+                    print(f"🪞 Chunk {claimed[0]} đã chạy quá {hedge_after:.0f}s ở worker khác, chạy song song")
+                    hedged.add(claimed[0])
+                    return claimed
+            # Chunk còn lại đang do worker khác giữ: chờ, nếu worker đó chết thì lấy lại
+            time.sleep(min(lease_seconds / 4, 15))
+
+    def requeue(index: int, chunk: str):
+        if queue is None:
+            pending.appendleft((index, chunk))  # Chạy lại chunk này ngay
+        else:
+            queue.release(job, index, worker_id)
+
+    try:
+        while True:
+            item = next_chunk()
+            if item is None:
+                break
+            index, chunk = item
+            attempt_started = time.time()
+            restart_cost = 0.0
+            completed = False
+            if profiler is not None:
+                profiler.begin(index)
+            cancel = (lambda: queue.is_done(job, index)) if queue is not None else None
+            # Bản hedge không giữ lease: lease vẫn thuộc worker đang chạy chunk này
+            keeper = None
+            if queue is not None and index not in hedged:
+                keeper = LeaseKeeper(queue.path, job, index, worker_id, lease_seconds).start()
+            try:
+                if session.backend is None:
+                    session.ensure()
+                    restart_cost = time.time() - attempt_started
+                    retry_count = 0  # Reset retry count khi khởi động thành công
+                browser = session.backend
+                attempt_started = time.time()
+
+                print(f"\n🎯 Xử lý chunk {index}...")
+                
+                existing_files = set(download_path.iterdir())
+                
+                result = simple_interaction_flow(browser, chunk, download_path, session.latency, cancel)
+                
+                if not result:
+                    print("🔄 Tương tác thất bại, thử tải lại trang...")
+                    browser.refresh()
+                    time.sleep(3)
+                    existing_files = set(download_path.iterdir())
+                    result = simple_interaction_flow(browser, chunk, download_path, session.latency, cancel)
+                    if not result:
+                        raise Exception("Tương tác thất bại lần 2")
+
+                print("⏳ Chờ file download...")
+                # Dùng đúng file flow vừa ghi: thư mục có thể được worker khác ghi cùng lúc
+                downloaded_file = result if result.is_file() else wait_for_new_file(download_path, existing_files)
+                print(f"✓ Download: {downloaded_file.name}")
+
+                try:
+                    layout = validate_wav_chunk(downloaded_file)
+                    print("✓ File hợp lệ")
+                except WavFormatError as e:
+                    print(f"❌ File hỏng: {e}")
+                    downloaded_file.unlink()
+                    raise DownloadTimeoutError("File corrupt")
+
+                try:
+                    rate_model.check(chunk, layout.duration)
+                except ImplausibleAudioError as e:
+                    implausible_counts[index] = implausible_counts.get(index, 0) + 1
+                    if implausible_counts[index] <= max_implausible:
+                        raise
+                    print(f"⚠ {e} - đã thử {implausible_counts[index]} lần, vẫn chấp nhận")
+                else:
+                    rate_model.observe(chunk, layout.duration)
+                    rate_model.save()
+
+                record_trace(index, chunk, "ok", attempt_started, restart_cost)
+
+                key = keys[index - 1]
+                if queue is not None and find_existing_chunk(download_path, filename_template, index, key):
+                    print(f"ℹ Chunk {index} đã được worker khác hoàn thành, bỏ bản này")
+                    downloaded_file.unlink()
+                    queue.complete(job, index, worker_id, find_existing_chunk(download_path, filename_template, index, key))
+                    continue
+
+                target_name = build_target_name(filename_template, index, downloaded_file, key)
+                if queue is None:
+                    final_path = rename_downloaded_file(downloaded_file, target_name)
+                    print(f"✓ Đổi tên: {final_path.name}")
+                    final_path = store_chunk_format(final_path, chunk_format)
+                else:
+                    final_path = publish_queue_chunk(
+                        queue, job, index, worker_id, downloaded_file, target_name, chunk_format
+                    )
+                    if final_path is None:
+                        continue  # Hai worker xong cùng lúc: bản kia đã được ghi nhận trước
+
+                results.append(DownloadResult(index, downloaded_file, final_path))
+                session.record_success()
+                print(f"✅ Hoàn thành chunk {index}")
+                completed = True
+                session.latency.observe("chunk", time.time() - attempt_started)
+                session.maintain(time.time() - attempt_started)
+                if live is not None:
+                    live.advance()
+
+                if delay_between_downloads > 0:
+                    print(f"⏳ Chờ {delay_between_downloads}s...")
+                    time.sleep(delay_between_downloads)
+
+                retry_count = 0  # Reset retry count khi thành công
+
+            except QuotaExceededError as e:
+                print(f"❌ Chunk {index}: {e}")
+                record_trace(index, chunk, "quota", attempt_started, restart_cost, e.kind)
+                requeue(index, chunk)  # Chạy lại chunk này trên profile mới
+                if not session.rotate(e.kind):
+                    print("❌ Không có profile khác để đổi, dừng lại...")
+                    break
+                continue
+
+            except ChunkCancelledError as e:
+                print(f"🏁 Chunk {index}: {e}, hủy lượt này")
+                record_trace(index, chunk, "cancelled", attempt_started, restart_cost)
+                # Lượt generate dở vẫn có thể trả audio về page: tải lại để chunk sau không nhận nhầm
+                try:
+                    session.backend.refresh()
+                except Exception:
+                    session.discard()
+                continue
+
+            except ImplausibleAudioError as e:
+                # Trình duyệt vẫn ổn, chỉ lần generate này hỏng: chạy lại ngay
+                print(f"❌ Chunk {index}: {e}")
+                record_trace(index, chunk, "implausible", attempt_started, restart_cost, str(e)[:200])
+                downloaded_file.unlink(missing_ok=True)
+                requeue(index, chunk)
+                continue
+
+            except NoProfileAvailableError as e:
+                print(f"❌ {e}")
+                if queue is not None:
+                    queue.release(job, index, worker_id)
+                break
+
+            except SessionNotCreatedException as e:
+                print(f"❌ Lỗi session Chrome: {e}")
+                record_trace(index, chunk, "fail", attempt_started, restart_cost, "session")
+                retry_count += 1
+                if queue is not None:
+                    queue.release(job, index, worker_id)
+                if retry_count >= max_retries:
+                    print("❌ Đã thử quá số lần cho phép, dừng lại...")
+                    break
+                    
+                session.discard()
+                
+                print(f"🔄 Khởi động lại trình duyệt (lần {retry_count})...")
+                continue
+                
+            except Exception as e:
+                print(f"❌ Lỗi chunk {index}: {e}")
+                outcome = "corrupt" if isinstance(e, DownloadTimeoutError) else "fail"
+                record_trace(index, chunk, outcome, attempt_started, restart_cost, str(e)[:200])
+                if queue is not None:
+                    queue.release(job, index, worker_id)  # Để worker khác (hoặc lượt sau) làm lại
+                session.discard()
+                
+                print("🔄 Khởi động lại trình duyệt...")
+                continue
+
+            finally:
+                if keeper is not None:
+                    keeper.stop()
+                # Lượt hedge chỉ có một lần: lần sau nhận lại chunk này là claim thường, cần LeaseKeeper
+                hedged.discard(index)
+                if profiler is not None:
+                    profiler.end("ok" if completed else "retry")
+
+    finally:
+        if owns_session:
+            session.close()
+        if profiler is not None:
+            profiler.stop()
+        if live is not None:
+            live.close()
+        if recorder is not None and recorder.path.exists() and not simulated:
+            try:
+                update_cost_model(recorder.path)
+            except (OSError, ValueError, TypeError) as e:
+                print(f"⚠ Không cập nhật được cost model: {e}")
+
+    return collect_chunk_results(
+        download_path, filename_template, len(chunks_list), report_missing=not yielded, keys=keys
+    )
+
+# ---------------------------------------------------------------------------
+# Chunk I/O bằng mmap - đọc header / frame WAV không copy vào RAM Python
+# ---------------------------------------------------------------------------
+
+class PcmFormat(NamedTuple):
+    nchannels: int
+    sampwidth: int
+    framerate: int
+
+
+class WavFormatError(ValueError):
+    pass
+
+
+WAV_HEADER_SIZE = 44  # Header PCM chuẩn: RIFF + fmt (16 byte) + data
+_WAVE_FORMAT_PCM = 1
+_WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+_UNKNOWN_DATA_SIZE = (0, 0xFFFFFFFF)  # Một số encoder stream để size = 0 hoặc -1
+
+
+@dataclass
+class WavLayout:
+    format: PcmFormat
+    data_offset: int
+    data_size: int
+
+    @property
+    def frame_size(self) -> int:
+        return self.format.nchannels * self.format.sampwidth
+
+    @property
+    def nframes(self) -> int:
+        return self.data_size // self.frame_size
+
+    @property
+    def duration(self) -> float:
+        return self.nframes / self.format.framerate
+
+
+def parse_wav_header(buf) -> WavLayout:
+    """Đọc layout RIFF/WAVE từ buffer (bytes, mmap, memoryview) mà không copy phần data"""
+    total = len(buf)
+    if total < 12 or bytes(buf[0:4]) != b"RIFF" or bytes(buf[8:12]) != b"WAVE":
+        raise WavFormatError("Không phải file RIFF/WAVE")
+
+    fmt: PcmFormat | None = None
+    pos = 12
+    while pos + 8 <= total:
+        chunk_id = bytes(buf[pos:pos + 4])
+        (chunk_size,) = struct.unpack_from("<I", buf, pos + 4)
+        body = pos + 8
+        if chunk_id == b"fmt ":
+            if chunk_size < 16 or body + 16 > total:
+                raise WavFormatError("Chunk 'fmt ' không hợp lệ")
+            audio_format, channels, rate, _, _, bits = struct.unpack_from("<HHIIHH", buf, body)
+            if audio_format not in (_WAVE_FORMAT_PCM, _WAVE_FORMAT_EXTENSIBLE):
+                raise WavFormatError(f"Không hỗ trợ WAV format {audio_format:#x}")
+            if channels == 0 or rate == 0 or bits % 8:
+                raise WavFormatError("Thông số fmt không hợp lệ")
+            fmt = PcmFormat(channels, bits // 8, rate)
+        elif chunk_id == b"data":
+            if fmt is None:
+                raise WavFormatError("Chunk 'data' nằm trước 'fmt '")
+            available = total - body
+            if chunk_size in _UNKNOWN_DATA_SIZE:
+                chunk_size = available
+            elif chunk_size > available:
+                raise WavFormatError(f"File bị cắt cụt ({available}/{chunk_size} byte data)")
+            frame_size = fmt.nchannels * fmt.sampwidth
+            return WavLayout(fmt, body, chunk_size - chunk_size % frame_size)
+        pos = body + chunk_size + (chunk_size & 1)
+    raise WavFormatError("Không tìm thấy chunk 'data'")
+
+
+class MappedWav:
+    """Mở một chunk WAV bằng mmap; ``frames`` là memoryview zero-copy trên phần data.
+
+    Dùng như context manager và không giữ ``frames`` sau khi thoát khối ``with``.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.layout: WavLayout | None = None
+        self.frames: memoryview | None = None
+        self._file = None
+        self._map: mmap.mmap | None = None
+        self._view: memoryview | None = None
+
+    def __enter__(self) -> "MappedWav":
+        self._file = open(self.path, "rb")
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self._file.close()
+            raise WavFormatError(f"{self.path.name} rỗng")
+        try:
+            self._view = memoryview(self._map)
+            self.layout = parse_wav_header(self._view)
+            start = self.layout.data_offset
+            self.frames = self._view[start:start + self.layout.data_size]
+        except Exception:
+            self.__exit__(None, None, None)
+            raise
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        for view in (self.frames, self._view):
+            if view is not None:
+                view.release()
+        self.frames = self._view = None
+        if self._map is not None:
+            try:
+                self._map.close()
+            except BufferError:
+                # Còn view NumPy / memoryview (vd. giữ trong traceback) trỏ vào mapping:
+                # để GC đóng khi view được giải phóng, lỗi gốc vẫn được ném ra
+                pass
+            self._map = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def read_wav_layout(path: Path) -> WavLayout:
+    """Chỉ đọc header (vài trăm byte đầu) - đủ cho kiểm tra format / duration"""
+    with MappedWav(path) as chunk:
+        return chunk.layout
+
+
+def validate_wav_chunk(path: Path) -> WavLayout:
+    """Kiểm tra chunk tải về: header hợp lệ, data đầy đủ và không rỗng"""
+    layout = read_wav_layout(path)
+    if layout.nframes == 0:
+        raise WavFormatError(f"{path.name} không có audio")
+    return layout
+
+
+SPEAKING_RATE_FILE = SCRIPT_DIR / "speaking_rate.json"
+
+
+class ImplausibleAudioError(WavFormatError):
+    """Chunk decode được nhưng độ dài không khớp với lượng text (bị cắt / gần như im lặng)"""
+
+
+class SpeakingRateModel:
+    """Số giây audio trên mỗi ký tự, hiệu chỉnh từ các chunk đã được chấp nhận.
+
+    Kiểm tra chỉ dùng ``WavLayout.duration`` (đọc từ header) nên gần như miễn phí;
+    chunk có tỉ lệ thời lượng thực / kỳ vọng ngoài [low, high] bị coi là lỗi.
+    Dùng median của ``window`` mẫu gần nhất để vài chunk lỗi lọt qua không kéo lệch model.
+    """
+
+    def __init__(
+        self,
+        path: Path | None = SPEAKING_RATE_FILE,
+        min_samples: int = 8,
+        min_chars: int = 80,
+        low: float = 0.55,
+        high: float = 1.8,
+        window: int = 200,
+    ):
+        self.path = Path(path) if path else None
+        self.min_samples = min_samples
+        self.min_chars = min_chars
+        self.low = low
+        self.high = high
+        self.samples: deque[float] = deque(maxlen=window)
+        self._rate: float | None = None
+        if self.path and self.path.exists():
+            try:
+                data = json.loads(self.path.read_text(encoding="utf-8"))
+                self.samples.extend(float(x) for x in data.get("seconds_per_char", []))
+            except (OSError, ValueError):
+                pass  # File hỏng: hiệu chỉnh lại từ đầu
+
+    @property
+    def seconds_per_char(self) -> float | None:
+        if self._rate is None and len(self.samples) >= self.min_samples:
+            self._rate = statistics.median(self.samples)
+        return self._rate
+
+    def expected_duration(self, chars: int) -> float | None:
+        rate = self.seconds_per_char
+        return None if rate is None else rate * chars
+
+    def check(self, text: str, duration: float):
+        """Raise ImplausibleAudioError nếu ``duration`` không hợp lý với ``text``"""
+        chars = len(text.strip())
+        if chars < self.min_chars:
+            return  # Chunk quá ngắn, tốc độ nói dao động mạnh
+        expected = self.expected_duration(chars)
+        if expected is None:
+            return  # Chưa đủ mẫu để hiệu chỉnh
+        ratio = duration / expected
+        if ratio < self.low:
+            raise ImplausibleAudioError(f"Audio {duration:.1f}s quá ngắn so với kỳ vọng {expected:.1f}s (bị cắt?)")
+        if ratio > self.high:
+            raise ImplausibleAudioError(f"Audio {duration:.1f}s quá dài so với kỳ vọng {expected:.1f}s")
+
+    def observe(self, text: str, duration: float):
+        chars = len(text.strip())
+        if chars < self.min_chars or duration <= 0:
+            return
+        self.samples.append(duration / chars)
+        self._rate = None
+
+    def save(self):
+        if self.path is None:
+            return
+        payload = {"seconds_per_char": [round(x, 6) for x in self.samples]}
+        tmp = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+        tmp.write_text(json.dumps(payload), encoding="utf-8")
+        tmp.replace(self.path)
+
+
+def wav_header(fmt: PcmFormat, data_size: int) -> bytes:
+    block_align = fmt.nchannels * fmt.sampwidth
+    return struct.pack(
+        "<4sI4s4sIHHIIHH4sI",
+        b"RIFF", 36 + data_size, b"WAVE",
+        b"fmt ", 16, _WAVE_FORMAT_PCM, fmt.nchannels, fmt.framerate,
+        fmt.framerate * block_align, block_align, fmt.sampwidth * 8,
+        b"data", data_size,
+    )
+
+
+class AudioOutputWriter:
+    """Đích nhận PCM khi merge. Kế thừa để ghi ra nơi khác (pipe, socket, ...)"""
+
+    def open(self, fmt: PcmFormat):
+        raise NotImplementedError
+
+    def write(self, data) -> int:
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+    def abort(self):
+        """Merge lỗi giữa chừng: dọn dẹp thay vì công bố output dở dang"""
+        self.close()
+
+
+class WavFileWriter(AudioOutputWriter):
+    """Ghi WAV PCM chuẩn 44 byte header, size được vá lại khi close().
+
+    Ghi vào file tạm rồi ``os.replace`` nên người đọc (hoặc worker khác cùng merge)
+    không bao giờ thấy file dở dang.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.format: PcmFormat | None = None
+        self.data_size = 0
+        self._file = None
+        self._partial = self.path.with_name(f"{self.path.name}.{os.getpid()}.part")
+
+    def open(self, fmt: PcmFormat):
+        self.format = fmt
+        self.data_size = 0
+        self._file = open(self._partial, "wb")
+        self._file.write(wav_header(fmt, 0))
+
+    def write(self, data) -> int:
+        written = self._file.write(data)
+        self.data_size += written
+        return written
+
+    def close(self):
+        if self._file is None:
+            return
+        self._file.seek(0)
+        self._file.write(wav_header(self.format, self.data_size))
+        self._file.close()
+        self._file = None
+        os.replace(self._partial, self.path)
+
+    def abort(self):
+        """Bỏ file tạm khi merge lỗi giữa chừng"""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        self._partial.unlink(missing_ok=True)
+
+
+# ---------------------------------------------------------------------------
+# Lưu chunk dạng FLAC (lossless) - giảm dung lượng downloads/ khoảng một nửa
+# ---------------------------------------------------------------------------
+
+CHUNK_FORMATS = ("wav", "flac")
+FFMPEG_BINARY = "ffmpeg"  # configure_ffmpeg() trỏ tới ffmpeg.exe cạnh script
+
+_FLAC_RAW_CODECS = {1: "u8", 2: "s16le", 3: "s24le", 4: "s32le"}
+
+
+@dataclass
+class FlacInfo:
+    format: PcmFormat
+    total_frames: int
+
+
+def read_flac_info(path: Path) -> FlacInfo:
+    """Đọc block STREAMINFO (42 byte đầu file) - không cần decode"""
+    with open(path, "rb") as f:
+        head = f.read(42)
+    if len(head) < 42 or head[:4] != b"fLaC" or head[4] & 0x7F != 0:
+        raise WavFormatError(f"{Path(path).name} không phải FLAC hợp lệ")
+    (packed,) = struct.unpack_from(">Q", head, 8 + 10)
+    rate = packed >> 44
+    channels = ((packed >> 41) & 0x7) + 1
+    bits = ((packed >> 36) & 0x1F) + 1
+    if bits % 8 or rate == 0:
+        raise WavFormatError(f"{Path(path).name}: FLAC {bits} bit / {rate} Hz không hỗ trợ")
+    return FlacInfo(PcmFormat(channels, bits // 8, rate), packed & 0xFFFFFFFFF)
+
+
+def encode_chunk_flac(wav_path: Path) -> Path:
+    """Nén chunk WAV đã kiểm tra sang FLAC rồi xóa WAV.
+
+    Ghi ra file tạm rồi mới đổi tên, nên lúc resume không bao giờ thấy FLAC dở dang.
+    """
+    layout = validate_wav_chunk(wav_path)
+    flac_path = wav_path.with_suffix(".flac")
+    partial = flac_path.with_name(f"{flac_path.name}.{os.getpid()}.part")
+    subprocess.run(
+        [FFMPEG_BINARY, "-v", "error", "-y", "-i", str(wav_path), "-c:a", "flac", "-f", "flac", str(partial)],
+        check=True,
+        stdin=subprocess.DEVNULL,
+    )
+    info = read_flac_info(partial)
+    if info.format != layout.format or info.total_frames != layout.nframes:
+        partial.unlink()
+        raise WavFormatError(f"FLAC của {wav_path.name} không khớp WAV gốc")
+    partial.replace(flac_path)
+    wav_path.unlink()
+    return flac_path
+
+
+def decode_flac_pcm(path: Path, fmt: PcmFormat) -> bytes:
+    """Decode FLAC ra PCM thô (cùng layout với phần data của WAV) qua ffmpeg"""
+    codec = _FLAC_RAW_CODECS[fmt.sampwidth]
+    completed = subprocess.run(
+        [FFMPEG_BINARY, "-v", "error", "-i", str(path), "-f", codec, "-acodec", f"pcm_{codec}", "-"],
+        check=True,
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.PIPE,
+    )
+    return completed.stdout
+
+
+def chunk_pcm_format(path: Path) -> PcmFormat:
+    if path.suffix.lower() == ".flac":
+        return read_flac_info(path).format
+    return read_wav_layout(path).format
+
+
+def store_chunk_format(path: Path, chunk_format: str) -> Path:
+    """Nén chunk sang FLAC nếu được yêu cầu; lỗi thì giữ nguyên WAV"""
+    if chunk_format != "flac":
+        return path
+    try:
+        path = encode_chunk_flac(path)
+        print(f"✓ Nén FLAC: {path.name}")
+    except (OSError, subprocess.CalledProcessError, WavFormatError) as e:
+        # Giữ lại WAV - vẫn merge được, chỉ tốn đĩa hơn
+        print(f"⚠ Không nén được FLAC, giữ WAV: {e}")
+    return path
+
+
+def worker_private_name(target_name: str, worker_id: str) -> str:
+    """Tên riêng của worker cho chunk chưa được hàng đợi công nhận (không khớp template)"""
+    target = Path(target_name)
+    return f"{target.stem}.{re.sub(r'[^A-Za-z0-9_-]', '_', worker_id)}.part{target.suffix}"
+
+
+def publish_queue_chunk(
+    queue: ChunkQueue,
+    job: str,
+    index: int,
+    worker_id: str,
+    downloaded_file: Path,
+    target_name: str,
+    chunk_format: str = "wav",
+) -> Path | None:
+    """Đổi tên / nén chunk dưới tên riêng của worker, rồi mới ``complete``.
+
+    Chỉ bản được hàng đợi công nhận mới được đổi sang tên chuẩn; bản thua chỉ xóa
+    file riêng của nó, nên không bao giờ đụng vào chunk của worker thắng.
+    Trả về None nếu worker khác đã hoàn thành chunk trước.
+    """
+    private = rename_downloaded_file(downloaded_file, worker_private_name(target_name, worker_id))
+    private = store_chunk_format(private, chunk_format)
+    destination = private.with_name(Path(target_name).with_suffix(private.suffix).name)
+    if not queue.complete(job, index, worker_id, destination):
+        private.unlink()
+        return None
+    final_path = private.replace(destination)
+    print(f"✓ Đổi tên: {final_path.name}")
+    return final_path
+
+
+def find_existing_chunk(download_path: Path, filename_template: str, index: int, key: str | None = None) -> Path | None:
+    """Chunk đã có trên đĩa: đúng tên template, hoặc bản FLAC / WAV tương ứng"""
+    expected_file = download_path / filename_template.format(index=index, key=key)
+    if expected_file.exists():
+        return expected_file
+    for suffix in (".flac", ".wav"):
+        candidate = expected_file.with_suffix(suffix)
+        if candidate != expected_file and candidate.exists():
+            return candidate
+    return None
+
+
+# ---------------------------------------------------------------------------
+# Audio post-processing (NumPy) - trim silence, normalize, gap
+# ---------------------------------------------------------------------------
+
+@dataclass
+class PostProcessConfig:
+    trim_silence: bool = True
+    silence_threshold_db: float = -50.0  # dBFS, dưới mức này coi là im lặng
+    keep_silence_ms: int = 30  # Giữ lại một chút ở biên để không cắt mất phụ âm
+    normalize: str | None = "rms"  # "rms", "peak" hoặc None
+    target_db: float = -20.0  # dBFS mục tiêu sau normalize
+    max_gain_db: float = 20.0  # Không khuếch đại quá mức (tránh kéo noise lên)
+    gap_ms: int = 300  # Khoảng lặng chèn giữa các chunk
+
+
+# Chỉ hỗ trợ PCM signed little-endian 16/32 bit (định dạng AI Studio trả về là 16 bit)
+_PCM_DTYPES = {2: "<i2", 4: "<i4"}
+
+
+def pcm_view(data, sampwidth: int, channels: int):
+    """View NumPy (frames, channels) trên buffer PCM - không copy dữ liệu"""
+    dtype = _PCM_DTYPES.get(sampwidth)
+    if not _load_numpy() or dtype is None:
+        return None
+    usable = len(data) - len(data) % (sampwidth * channels)
+    return np.frombuffer(data, dtype=dtype, count=usable // sampwidth).reshape(-1, channels)
+
+
+def voiced_bounds(samples, threshold_db: float, keep_frames: int) -> tuple[int, int]:
+    """Tìm [start, end) của đoạn có tiếng, vectorized trên toàn bộ chunk"""
+    full_scale = float(np.iinfo(samples.dtype).max)
+    threshold = full_scale * 10 ** (threshold_db / 20)
+    loud = np.flatnonzero(np.abs(samples).max(axis=1) > threshold)
+    if loud.size == 0:
+        return 0, 0
+    start = max(int(loud[0]) - keep_frames, 0)
+    end = min(int(loud[-1]) + 1 + keep_frames, samples.shape[0])
+    return start, end
+
+
+def normalization_gain(samples, mode: str, target_db: float, max_gain_db: float) -> float:
+    full_scale = float(np.iinfo(samples.dtype).max)
+    if mode == "peak":
+        level = float(np.abs(samples).max()) / full_scale
+    elif mode == "rms":
+        as_float = samples.astype(np.float64) if samples.dtype.itemsize > 2 else samples.astype(np.float32)
+        level = float(np.sqrt(np.mean(np.square(as_float)))) / full_scale
+    else:
+        raise ValueError(f"Kiểu normalize không hỗ trợ: {mode}")
+    if level <= 0:
+        return 1.0
+    gain_db = min(target_db - 20 * np.log10(level), max_gain_db)
+    return float(10 ** (gain_db / 20))
+
+
+def postprocess_pcm(data, params: PcmFormat, config: PostProcessConfig):
+    """Trim + normalize một chunk PCM.
+
+    Trả về slice của view gốc khi chỉ trim (không copy), chỉ tạo buffer mới khi
+    thực sự phải đổi biên độ.
+    """
+    samples = pcm_view(data, params.sampwidth, params.nchannels)
+    if samples is None:
+        return data
+
+    if config.trim_silence:
+        keep_frames = params.framerate * config.keep_silence_ms // 1000
+        start, end = voiced_bounds(samples, config.silence_threshold_db, keep_frames)
+        samples = samples[start:end]
+        if not samples.size:
+            return b""  # Cả chunk dưới ngưỡng im lặng: memoryview rỗng 2 chiều không cast được
+
+    if config.normalize and samples.size:
+        gain = normalization_gain(samples, config.normalize, config.target_db, config.max_gain_db)
+        if abs(gain - 1.0) > 1e-3:
+            info = np.iinfo(samples.dtype)
+            scaled = np.multiply(samples, gain, dtype=np.float64 if info.bits > 16 else np.float32)
+            np.clip(scaled, info.min, info.max, out=scaled)
+            samples = np.rint(scaled, out=scaled).astype(samples.dtype)
+
+    return memoryview(samples).cast("B")
+
+
+def silence_bytes(params: PcmFormat, duration_ms: int) -> bytes:
+    frames = params.framerate * duration_ms // 1000
+    return bytes(frames * params.sampwidth * params.nchannels)
+
+
+def chunk_formats_match(paths: list[Path]) -> bool:
+    """So sánh format của tất cả chunk chỉ bằng header (mmap / STREAMINFO, không decode)"""
+    formats = {chunk_pcm_format(path) for path in paths}
+    return len(formats) <= 1
+
+
+def merge_gap(params: PcmFormat, postprocess: PostProcessConfig | None) -> bytes:
+    return silence_bytes(params, postprocess.gap_ms) if postprocess and postprocess.gap_ms > 0 else b""
+
+
+def feed_chunk_pcm(
+    path: Path,
+    params: PcmFormat,
+    postprocess: PostProcessConfig | None,
+    sink: Callable[[bytes | memoryview], object],
+) -> tuple[int, int]:
+    """Đưa PCM (đã post-process) của một chunk cho ``sink``; trả về (số byte, crc32)"""
+    if path.suffix.lower() == ".flac":
+        if chunk_pcm_format(path) != params:
+            raise WavFormatError(f"{path.name} khác định dạng với chunk đầu tiên")
+        data = decode_flac_pcm(path, params)
+        if postprocess:
+            data = postprocess_pcm(data, params, postprocess)
+        sink(data)
+        return memoryview(data).nbytes, zlib.crc32(data)
+    with MappedWav(path) as chunk:
+        if chunk.layout.format != params:
+            raise WavFormatError(f"{path.name} khác định dạng ({chunk.layout.format} != {params})")
+        data = chunk.frames
+        if postprocess:
+            data = postprocess_pcm(data, params, postprocess)
+        sink(data)
+        size, crc = memoryview(data).nbytes, zlib.crc32(data)
+        del data  # Nhả view trước khi đóng mmap
+    return size, crc
+
+
+def merge_wav_streaming(
+    paths: list[Path],
+    output: Path | AudioOutputWriter,
+    postprocess: PostProcessConfig | None = None,
+) -> list[ChunkSpan]:
+    """Ghi nối tiếp frame của từng chunk (memoryview trên mmap) ra writer.
+
+    Không giữ toàn bộ audio trong RAM; ``output`` là đường dẫn WAV hoặc một
+    AudioOutputWriter bất kỳ. Chunk FLAC được decode từng file một khi tới lượt.
+    Trả về vị trí của từng chunk trong phần data của output (xem MergeIndex).
+    """
+    if postprocess and (postprocess.trim_silence or postprocess.normalize) and not _load_numpy():
+        print("⚠ Không có numpy (pip install numpy) - bỏ qua trim/normalize")
+
+    writer = output if isinstance(output, AudioOutputWriter) else WavFileWriter(output)
+    params = chunk_pcm_format(paths[0])
+    gap = merge_gap(params, postprocess)
+
+    spans: list[ChunkSpan] = []
+    offset = 0
+    writer.open(params)
+    try:
+        for position, path in enumerate(paths):
+            if position and gap:
+                writer.write(gap)
+                offset += len(gap)
+            size, crc = feed_chunk_pcm(path, params, postprocess, writer.write)
+            spans.append(ChunkSpan.for_source(path, offset, size, crc))
+            offset += size
+    except BaseException:
+        writer.abort()
+        raise
+    writer.close()
+    return spans
+
+
+# ---------------------------------------------------------------------------
+# Index vị trí chunk trong file merge - vá tại chỗ khi chỉ vài chunk thay đổi
+# ---------------------------------------------------------------------------
+
+MERGE_INDEX_SUFFIX = ".index.json"
+MAX_TAIL_PAD_MS = 500  # Chunk mới ngắn hơn tối đa chừng này thì đệm im lặng thay vì ghi lại đuôi file
+
+
+@dataclass
+class ChunkSpan:
+    name: str
+    source_size: int
+    source_mtime_ns: int
+    offset: int  # Byte, tính từ đầu phần data của output
+    size: int  # Số byte PCM của chunk (không gồm gap / phần đệm)
+    crc32: int
+
+    @classmethod
+    def for_source(cls, path: Path, offset: int, size: int, crc: int) -> "ChunkSpan":
+        stat = path.stat()
+        return cls(path.name, stat.st_size, stat.st_mtime_ns, offset, size, crc)
+
+    def source_changed(self, path: Path) -> bool:
+        try:
+            stat = path.stat()
+        except OSError:
+            return True
+        return path.name != self.name or (stat.st_size, stat.st_mtime_ns) != (self.source_size, self.source_mtime_ns)
+
+
+@dataclass
+class MergeIndex:
+    """Sidecar ``<output>.index.json``: vị trí, độ dài và crc32 của từng chunk trong output"""
+
+    format: PcmFormat
+    gap_size: int
+    postprocess: dict | None
+    data_offset: int
+    data_size: int
+    output_size: int
+    output_mtime_ns: int
+    chunks: list[ChunkSpan]
+
+    @staticmethod
+    def path_for(output_path: Path) -> Path:
+        return output_path.with_name(output_path.name + MERGE_INDEX_SUFFIX)
+
+    @classmethod
+    def load(cls, output_path: Path) -> "MergeIndex | None":
+        try:
+            raw = json.loads(cls.path_for(output_path).read_text(encoding="utf-8"))
+            raw["format"] = PcmFormat(*raw["format"])
+            raw["chunks"] = [ChunkSpan(**span) for span in raw["chunks"]]
+            return cls(**raw)
+        except (OSError, ValueError, TypeError, KeyError):
+            return None
+
+    @classmethod
+    def build(
+        cls,
+        output_path: Path,
+        params: PcmFormat,
+        gap_size: int,
+        postprocess: PostProcessConfig | None,
+        spans: list[ChunkSpan],
+    ) -> "MergeIndex":
+        stat = output_path.stat()
+        return cls(
+            format=params,
+            gap_size=gap_size,
+            postprocess=asdict(postprocess) if postprocess else None,
+            data_offset=WAV_HEADER_SIZE,
+            data_size=stat.st_size - WAV_HEADER_SIZE,
+            output_size=stat.st_size,
+            output_mtime_ns=stat.st_mtime_ns,
+            chunks=spans,
+        )
+
+    def save(self, output_path: Path):
+        payload = asdict(self)
+        payload["format"] = list(self.format)
+        tmp = self.path_for(output_path).with_name(f"{self.path_for(output_path).name}.{os.getpid()}.tmp")
+        tmp.write_text(json.dumps(payload), encoding="utf-8")
+        tmp.replace(self.path_for(output_path))
+
+    @classmethod
+    def discard(cls, output_path: Path):
+        cls.path_for(output_path).unlink(missing_ok=True)
+
+    def matches(self, output_path: Path, paths: list[Path], postprocess: PostProcessConfig | None) -> bool:
+        """Index còn mô tả đúng output hiện tại và cùng cấu hình merge"""
+        try:
+            stat = output_path.stat()
+        except OSError:
+            return False
+        return (
+            (stat.st_size, stat.st_mtime_ns) == (self.output_size, self.output_mtime_ns)
+            and len(paths) == len(self.chunks)
+            and self.postprocess == (asdict(postprocess) if postprocess else None)
+            and chunk_pcm_format(paths[0]) == self.format
+        )
+
+    def span_end(self, position: int) -> int:
+        """Byte cuối (không tính) mà chunk ``position`` được phép chiếm: tới đầu gap kế tiếp"""
+        if position + 1 < len(self.chunks):
+            return self.chunks[position + 1].offset - self.gap_size
+        return self.data_size
+
+
+def patch_merged_output(
+    output_path: Path,
+    paths: list[Path],
+    postprocess: PostProcessConfig | None = None,
+    max_pad_ms: int = MAX_TAIL_PAD_MS,
+) -> bool | None:
+    """Cập nhật output đã merge chỉ với các chunk đã đổi kể từ lần merge trước.
+
+    Chunk mới cùng độ dài (hoặc ngắn hơn tối đa ``max_pad_ms``, phần thiếu đệm
+    im lặng) được ghi đè tại chỗ; nếu không, output được cắt tại chunk đổi đầu
+    tiên và ghi lại từ đó tới hết. Trả về None nếu không dùng được index (cần
+    merge đầy đủ), False nếu không có gì thay đổi, True nếu đã vá.
+    """
+    index = MergeIndex.load(output_path)
+    if index is None or not index.matches(output_path, paths, postprocess):
+        return None
+    changed = [pos for pos, (span, path) in enumerate(zip(index.chunks, paths)) if span.source_changed(path)]
+    if not changed:
+        return False
+
+    params = index.format
+    pad_limit = params.framerate * max_pad_ms // 1000 * params.sampwidth * params.nchannels
+    # Khóa do kernel giữ: process vá bị kill thì khóa tự nhả, không kẹt ở merge đầy đủ mãi
+    lock = FileLock(output_path.with_name(output_path.name + ".lock"))
+    if not lock.acquire(timeout=0):
+        return None  # Process khác đang vá: merge đầy đủ (thay file nguyên tử) cho an toàn
+    try:
+        MergeIndex.discard(output_path)  # Lỗi giữa chừng thì lần sau merge lại từ đầu
+        rebuild_from: int | None = None
+        with open(output_path, "r+b") as out:
+            for position in changed:
+                span = index.chunks[position]
+                slot = index.span_end(position) - span.offset
+                patched: list[ChunkSpan] = []
+
+                def write_in_place(data, span=span, slot=slot, patched=patched):
+                    size = memoryview(data).nbytes
+                    if size > slot or slot - size > pad_limit:
+                        return
+                    out.seek(index.data_offset + span.offset)
+                    out.write(data)
+                    out.write(bytes(slot - size))
+                    patched.append(span)
+
+                size, crc = feed_chunk_pcm(paths[position], params, postprocess, write_in_place)
+                if not patched:
+                    rebuild_from = position
+                    break
+                index.chunks[position] = ChunkSpan.for_source(paths[position], span.offset, size, crc)
+                print(f"🩹 Vá tại chỗ {paths[position].name}")
+
+            if rebuild_from is not None:
+                print(f"🔧 Ghi lại output từ {paths[rebuild_from].name} ({len(paths) - rebuild_from} chunk)")
+                offset = index.chunks[rebuild_from].offset
+                out.seek(index.data_offset + offset)
+                out.truncate()
+                gap = bytes(index.gap_size)
+                for position in range(rebuild_from, len(paths)):
+                    if position > rebuild_from and gap:
+                        out.write(gap)
+                        offset += len(gap)
+                    size, crc = feed_chunk_pcm(paths[position], params, postprocess, out.write)
+                    index.chunks[position] = ChunkSpan.for_source(paths[position], offset, size, crc)
+                    offset += size
+                index.data_size = offset
+                out.seek(0)
+                out.write(wav_header(params, index.data_size))
+
+        stat = output_path.stat()
+        index.output_size, index.output_mtime_ns = stat.st_size, stat.st_mtime_ns
+        index.save(output_path)
+        return True
+    finally:
+        lock.release()
+
+
+def merge_audio_files(
+    download_dir: Path,
+    results: list[DownloadResult],
+    total_chunks: int,
+    final_filename: str,
+    postprocess: PostProcessConfig | None = None,
+) -> Path | None:
+    """Merge audio files, trả về đường dẫn file kết quả (None nếu không merge được)
+
+    Các chunk cùng format được ghi thẳng từ mmap ra file output (``postprocess``
+    trim/normalize trên view NumPy). Chỉ khi format khác nhau mới dùng pydub để
+    chuyển đổi. Output đã có index (lần merge trước) thì chỉ vá các chunk đã đổi.
+    """
+    print("\n🎧 Bắt đầu merge audio...")
+    
+    results.sort(key=lambda r: r.index)
+    
+    if len(results) != total_chunks:
+        print(f"⚠ Không merge: Chỉ có {len(results)}/{total_chunks} file hoàn chỉnh.")
+        return None
+    
+    try:
+        output_path = download_dir / final_filename
+        paths = [r.final_path for r in results]
+        if chunk_formats_match(paths):
+            patched = None
+            if output_path.exists():
+                try:
+                    patched = patch_merged_output(output_path, paths, postprocess)
+                except Exception as e:
+                    print(f"⚠ Không vá được output, merge lại toàn bộ: {e}")
+            if patched is False:
+                print("ℹ Không có chunk nào thay đổi kể từ lần merge trước")
+            elif patched is None:
+                spans = merge_wav_streaming(paths, output_path, postprocess)
+                params = chunk_pcm_format(paths[0])
+                gap_size = len(merge_gap(params, postprocess))
+                MergeIndex.build(output_path, params, gap_size, postprocess, spans).save(output_path)
+        else:
+            print("⚠ Các chunk khác format - dùng pydub để chuyển đổi (chậm hơn)")
+            if postprocess:
+                print("⚠ Bỏ qua post-processing cho lần merge này")
+            AudioSegment = _load_pydub()
+            combined = AudioSegment.empty()
+            for result in results:
+                segment = AudioSegment.from_file(result.final_path)
+                combined += segment
+
+            combined.export(output_path, format="wav")
+            MergeIndex.discard(output_path)
+        print(f"✅ Merge thành công: {output_path}")
+        return output_path
+    except Exception as e:
+        print(f"❌ Lỗi merge: {e}")
+        return None
+
+# ---------------------------------------------------------------------------
+# Output nghe dần trong lúc generate: file WAV lớn dần, HTTP chunked, named pipe
+# ---------------------------------------------------------------------------
+
+LIVE_SUFFIX = ".live.wav"
+LIVE_READ_SIZE = 64 * 1024
+
+
+def streaming_wav_header(fmt: PcmFormat) -> bytes:
+    """Header WAV chưa biết độ dài: RIFF / data size = 0xFFFFFFFF (quy ước của ffmpeg khi stream)"""
+    header = bytearray(wav_header(fmt, 0))
+    header[4:8] = header[40:44] = b"\xff\xff\xff\xff"
+    return bytes(header)
+
+
+@dataclass
+class ProgressiveConfig:
+    final_filename: str  # Output cuối cùng, giống hệt bản merge_audio_files với cùng postprocess
+    postprocess: PostProcessConfig | None = None
+    stream: LiveStream | None = None
+
+
+class ProgressiveOutput:
+    """Ghi phần đầu liên tục (theo thứ tự) của các chunk đã xong ra ``<final>.live.wav``.
+
+    Mỗi lần ``advance`` đưa thêm các chunk kế tiếp đã có trên đĩa vào file - cùng
+    gap / post-process / feed_chunk_pcm như merge_wav_streaming. Khi đủ chunk,
+    header được vá độ dài thật và file được đổi tên thành output cuối cùng kèm
+    MergeIndex, nên bước merge sau đó thấy "không có chunk nào thay đổi". Chunk
+    khác format (cần pydub) thì bỏ chế độ này, merge làm như cũ.
+
+    Luồng khác đọc qua ``follow`` (HTTP, named pipe); mọi thao tác trên
+    file nằm trong ``_lock`` nên đổi tên lúc kết thúc cũng chạy được trên Windows.
+    """
+
+    def __init__(
+        self,
+        download_path: Path,
+        filename_template: str,
+        keys: list[str],
+        config: ProgressiveConfig,
+    ):
+        self.download_path = download_path
+        self.filename_template = filename_template
+        self.keys = keys
+        self.config = config
+        self.final_path = download_path / config.final_filename
+        self.path = download_path / (Path(config.final_filename).stem + LIVE_SUFFIX)
+        self.position = 0  # Số chunk đầu tiên đã ghi
+        self.finished = False
+        self._params: PcmFormat | None = None
+        self._gap = b""
+        self._file = None
+        self._offset = 0
+        self._spans: list[ChunkSpan] = []
+        self._failed: tuple[str, str] | None = None  # Lỗi đã báo, không in lại mỗi lần advance
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+
+    def start(self) -> "ProgressiveOutput":
+        with self._lock:
+            self._file = open(self.path, "w+b")
+        print(f"🎧 Nghe dần tại {self.path}")
+        if self.config.stream is not None:
+            self.config.stream.publish(self)
+        return self.advance()
+
+    def advance(self) -> "ProgressiveOutput":
+        """Ghi thêm mọi chunk kế tiếp đã có; xong chunk cuối thì công bố output.
+
+        Chunk lỗi (đọc / post-process) được báo tên và chặn stream tại đó, phần đã
+        phát vẫn giữ nguyên; lần ``advance`` sau thử lại chunk đó. Chỉ khi chunk
+        khác format (merge sẽ phải dùng pydub) mới bỏ hẳn output nghe dần.
+        """
+        while not self.finished and self.position < len(self.keys):
+            path = find_existing_chunk(
+                self.download_path, self.filename_template, self.position + 1, self.keys[self.position]
+            )
+            if path is None:
+                return self
+            try:
+                if self._params is not None and chunk_pcm_format(path) != self._params:
+                    print(f"⚠ {path.name} khác format chunk đầu - bỏ output nghe dần, merge sẽ chuyển đổi")
+                    self._abort()
+                    return self
+                self._append(path)
+            except Exception as e:  # Chỉ là tính năng phụ: lỗi gì cũng không được làm hỏng job
+                if self._failed != (path.name, str(e)):
+                    print(f"⚠ Output nghe dần dừng ở chunk {self.position + 1} ({path.name}): {e}")
+                    self._failed = (path.name, str(e))
+                return self
+        if not self.finished and self.position == len(self.keys):
+            try:
+                self._publish()
+            except OSError as e:
+                print(f"⚠ Không công bố được {self.final_path.name} từ output nghe dần, merge sẽ ghi lại: {e}")
+                self.close()
+        return self
+
+    def _append(self, path: Path):
+        """Ghi gap + PCM của chunk chỉ khi chunk đã đọc / post-process xong: lỗi giữa
+        chừng không để lại gap thừa, thử lại sau vẫn ra đúng byte như merge"""
+        params = self._params or chunk_pcm_format(path)
+        gap = merge_gap(params, self.config.postprocess)
+        pending: list[bytes] = []
+        if self._params is None:
+            pending.append(streaming_wav_header(params))
+        elif gap:
+            pending.append(gap)
+
+        def sink(data):
+            self._write(b"".join(pending), data)
+
+        size, crc = feed_chunk_pcm(path, params, self.config.postprocess, sink)
+        if self._params is None:
+            self._params, self._gap = params, gap
+        elif gap:
+            self._offset += len(gap)
+        self._spans.append(ChunkSpan.for_source(path, self._offset, size, crc))
+        self._offset += size
+        self.position += 1
+        self._failed = None
+
+    def _write(self, *parts):
+        with self._changed:
+            self._file.seek(0, os.SEEK_END)
+            for data in parts:
+                self._file.write(data)
+            self._file.flush()
+            self._changed.notify_all()
+
+    def _publish(self):
+        with self._changed:
+            self._file.seek(0)
+            self._file.write(wav_header(self._params, self._offset))
+            self._file.close()
+            self._file = None
+            os.replace(self.path, self.final_path)
+            self.path = self.final_path
+            self.finished = True
+            self._changed.notify_all()
+        MergeIndex.build(self.final_path, self._params, len(self._gap), self.config.postprocess, self._spans).save(
+            self.final_path
+        )
+        print(f"✅ Output nghe dần đã đủ chunk: {self.final_path}")
+
+    def _abort(self):
+        with self._changed:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            self.path.unlink(missing_ok=True)
+            self.finished = True
+            self._changed.notify_all()
+
+    def close(self):
+        """Job dừng khi chưa đủ chunk: vá header thành WAV hợp lệ của phần đã có"""
+        with self._changed:
+            if self._file is not None:
+                if self._params is not None:
+                    self._file.seek(0)
+                    self._file.write(wav_header(self._params, self._offset))
+                self._file.close()
+                self._file = None
+                print(f"🎧 {self.path.name}: {self.position}/{len(self.keys)} chunk đầu")
+            self.finished = True
+            self._changed.notify_all()
+
+    def _read(self, offset: int) -> bytes:
+        # Mở lại mỗi lần đọc: không giữ handle nào khi _publish đổi tên file
+        try:
+            with open(self.path, "rb") as f:
+                f.seek(offset)
+                return f.read(LIVE_READ_SIZE)
+        except FileNotFoundError:
+            return b""
+
+    def follow(self) -> Iterator[bytes]:
+        """Byte của output từ đầu, chờ thêm dữ liệu cho tới khi job kết thúc"""
+        offset = 0
+        while True:
+            with self._changed:
+                data = self._read(offset)
+                if not data:
+                    if self.finished:
+                        return
+                    self._changed.wait(1.0)
+                    continue
+            offset += len(data)
+            yield data
+
+
+class LiveStream:
+    """Phát output nghe dần ra HTTP chunked (``http://127.0.0.1:<port>/``) và / hoặc named pipe.
+
+    Một LiveStream dùng cho cả lần chạy (batch nhiều file): HTTP luôn phát job
+    mới nhất từ đầu; named pipe phát lần lượt từng job, mỗi job một lần mở pipe.
+    """
+
+    def __init__(self, http_port: int | None = None, fifo: Path | None = None):
+        self._outputs: list[ProgressiveOutput] = []
+        self._published = threading.Condition()
+        self._active = 0
+        self._closed = False
+        self._server = None
+        self._fifo = fifo
+        self._fifo_created = False
+        if http_port is not None:
+            self._start_http(http_port)
+        if fifo is not None:
+            self._start_fifo(fifo)
+
+    def publish(self, output: ProgressiveOutput):
+        with self._published:
+            self._outputs.append(output)
+            self._published.notify_all()
+
+    def _wait_output(self, index: int) -> ProgressiveOutput | None:
+        with self._published:
+            while len(self._outputs) <= index and not self._closed:
+                self._published.wait(1.0)
+            return self._outputs[index] if len(self._outputs) > index else None
+
+    def _stream(self, output: ProgressiveOutput, emit: Callable[[bytes], object]):
+        with self._published:
+            self._active += 1
+        try:
+            for data in output.follow():
+                emit(data)
+        except (BrokenPipeError, ConnectionResetError, ConnectionAbortedError):
+            pass  # Người nghe đã tắt player
+        finally:
+            with self._published:
+                self._active -= 1
+
+    def _start_http(self, port: int):
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        stream = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # Cần cho Transfer-Encoding: chunked
+
+            def do_GET(self):
+                output = stream._outputs[-1] if stream._outputs else stream._wait_output(0)
+                if self.path != "/" or output is None:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", "audio/wav")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.send_header("Cache-Control", "no-store")
+                self.end_headers()
+
+                def emit(data: bytes):
+                    self.wfile.write(b"%X\r\n%s\r\n" % (len(data), data))
+
+                stream._stream(output, emit)
+                try:
+                    self.wfile.write(b"0\r\n\r\n")
+                except OSError:
+                    pass
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        print(f"📡 Nghe trực tiếp: http://127.0.0.1:{self._server.server_address[1]}/")
+
+    def _start_fifo(self, fifo: Path):
+        if not hasattr(os, "mkfifo"):
+            raise OSError("Named pipe (--live-fifo) chỉ hỗ trợ Linux / macOS")
+        if not fifo.exists():
+            os.mkfifo(fifo)
+            self._fifo_created = True
+        threading.Thread(target=self._serve_fifo, daemon=True).start()
+        print(f"📡 Nghe trực tiếp qua pipe: {fifo}")
+
+    def _serve_fifo(self):
+        index = 0
+        while (output := self._wait_output(index)) is not None:
+            # Mở non-blocking để không treo khi chưa có ai đọc (và vẫn dừng được lúc close)
+            while not self._closed:
+                try:
+                    fd = os.open(self._fifo, os.O_WRONLY | os.O_NONBLOCK)
+                    break
+                except OSError:
+                    time.sleep(0.5)
+            else:
+                return
+            os.set_blocking(fd, True)
+            with os.fdopen(fd, "wb") as pipe:
+                self._stream(output, pipe.write)
+            index += 1
+
+    def close(self):
+        """Chờ người đang nghe phát hết (Ctrl+C để bỏ), rồi dừng server"""
+        try:
+            if self._active:
+                print(f"🎧 Còn {self._active} người đang nghe - chờ phát hết (Ctrl+C để thoát)")
+            while self._active:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            pass
+        with self._published:
+            self._closed = True
+            self._published.notify_all()
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+        if self._fifo_created:
+            self._fifo.unlink(missing_ok=True)
+
+
+# ---------------------------------------------------------------------------
+# Trace từng chunk + mô phỏng lập lịch (capacity planning)
+# ---------------------------------------------------------------------------
+
+TRACE_FILENAME = "chunk_traces.jsonl"
+
+
+@dataclass
+class ChunkTrace:
+    index: int
+    chars: int
+    attempt: int
+    outcome: str  # "ok", "fail", "corrupt", "implausible", "quota", "cancelled" (hedge thua)
+    latency: float  # Giây từ lúc gửi text tới khi có file hợp lệ (hoặc tới khi lỗi)
+    restart_cost: float = 0.0  # Giây khởi động trình duyệt ngay trước lần thử này
+    started_at: float = 0.0
+    profile: str | None = None
+    backend: str | None = None
+    error: str | None = None
+
+
+class TraceRecorder:
+    """Ghi mỗi lần thử một chunk thành một dòng JSON (append, an toàn khi dừng giữa chừng)"""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._attempts: dict[int, int] = {}
+
+    def next_attempt(self, index: int) -> int:
+        self._attempts[index] = self._attempts.get(index, 0) + 1
+        return self._attempts[index]
+
+    def record(self, trace: ChunkTrace):
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(asdict(trace), ensure_ascii=False) + "\n")
+
+
+def load_traces(paths: Iterable[Path]) -> list[ChunkTrace]:
+    traces: list[ChunkTrace] = []
+    for path in paths:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    traces.append(ChunkTrace(**json.loads(line)))
+    return traces
+
+
+@dataclass
+class SimulationConfig:
+    workers: int = 1  # Số trình duyệt chạy song song
+    tabs_per_browser: int = 1
+    delay_between_downloads: float = 10.0
+    max_retries: int = 3  # Số lần thử lại một chunk trước khi bỏ
+    timeout: float = 120.0  # Quá thời gian này coi như lỗi
+    runs: int = 200  # Số lần Monte Carlo
+    seed: int = 0
+
+
+@dataclass
+class SimulationResult:
+    config: SimulationConfig
+    chunks: int
+    wall_clock_mean: float
+    wall_clock_p90: float
+    failure_rate: float  # Tỉ lệ chunk bỏ cuộc sau max_retries
+    attempts_per_chunk: float
+
+
+class TraceModel:
+    """Phân phối thực nghiệm (bootstrap) lấy từ trace đã ghi"""
+
+    def __init__(self, traces: list[ChunkTrace]):
+        attempts = [t for t in traces if t.outcome not in ("quota", "cancelled")]
+        if not attempts:
+            raise ValueError("Không có trace nào để mô phỏng")
+        self.ok_latency = [t.latency for t in attempts if t.outcome == "ok"] or [60.0]
+        self.fail_latency = [t.latency for t in attempts if t.outcome != "ok"] or [self.ok_latency[0]]
+        self.failure_rate = sum(t.outcome != "ok" for t in attempts) / len(attempts)
+        self.restart_cost = [t.restart_cost for t in traces if t.restart_cost > 0] or [25.0]
+        self.mean_chars = statistics.fmean(t.chars for t in attempts)
+
+
+def simulate_schedule(model: TraceModel, chunks: int, config: SimulationConfig) -> SimulationResult:
+    """Mô phỏng sự kiện rời rạc: mỗi tab là một slot lấy chunk từ hàng đợi chung.
+
+    Lỗi ở một tab làm khởi động lại cả trình duyệt chứa nó (giống vòng lặp thật),
+    nên mọi tab của trình duyệt đó phải chờ restart.
+    """
+    rng = random.Random(config.seed)
+    slots = config.workers * config.tabs_per_browser
+    walls: list[float] = []
+    failed_total = 0
+    attempts_total = 0
+
+    for _ in range(config.runs):
+        queue = deque((i, 0) for i in range(chunks))
+        browser_ready = [rng.choice(model.restart_cost) for _ in range(config.workers)]
+        events = [(browser_ready[slot // config.tabs_per_browser], slot) for slot in range(slots)]
+        heapq.heapify(events)
+        finished_at = 0.0
+
+        while queue and events:
+            now, slot = heapq.heappop(events)
+            browser = slot // config.tabs_per_browser
+            if now < browser_ready[browser]:
+                heapq.heappush(events, (browser_ready[browser], slot))
+                continue
+
+            index, tries = queue.popleft()
+            attempts_total += 1
+            failed = rng.random() < model.failure_rate
+            latency = rng.choice(model.fail_latency if failed else model.ok_latency)
+            if latency > config.timeout:
+                failed, latency = True, config.timeout
+            done = now + latency
+            finished_at = max(finished_at, done)
+
+            if failed:
+                browser_ready[browser] = max(browser_ready[browser], done + rng.choice(model.restart_cost))
+                if tries + 1 <= config.max_retries:
+                    queue.append((index, tries + 1))
+                else:
+                    failed_total += 1
+                heapq.heappush(events, (browser_ready[browser], slot))
+            else:
+                heapq.heappush(events, (done + config.delay_between_downloads, slot))
+
+        walls.append(finished_at)
+
+    walls.sort()
+    return SimulationResult(
+        config=config,
+        chunks=chunks,
+        wall_clock_mean=statistics.fmean(walls),
+        wall_clock_p90=walls[min(len(walls) - 1, int(len(walls) * 0.9))],
+        failure_rate=failed_total / (chunks * config.runs) if chunks else 0.0,
+        attempts_per_chunk=attempts_total / (chunks * config.runs) if chunks else 0.0,
+    )
+
+
+def format_duration(seconds: float) -> str:
+    hours, rest = divmod(int(seconds), 3600)
+    minutes, secs = divmod(rest, 60)
+    return f"{hours}h{minutes:02d}m{secs:02d}s" if hours else f"{minutes}m{secs:02d}s"
+
+
+# ---------------------------------------------------------------------------
+# Cost model theo độ dài chunk - chọn max_length tối ưu từ trace thực tế
+# ---------------------------------------------------------------------------
+
+COST_MODEL_FILE = SCRIPT_DIR / "chunk_cost_model.json"
+FAILURE_BIN_CHARS = 50
+PLAN_SAMPLE_CHARS = 100_000  # choose_max_length chỉ chia thử chừng này ký tự, dù sách dài bao nhiêu
+PLAN_SAMPLE_WINDOWS = 8
+
+
+def _sigmoid(z: float) -> float:
+    if z >= 0:
+        return 1 / (1 + math.exp(-z))
+    e = math.exp(z)
+    return e / (1 + e)
+
+
+def _solve_linear(matrix: list[list[float]], rhs: list[float]) -> list[float] | None:
+    """Khử Gauss có chọn pivot cho hệ nhỏ (2x2, 3x3); None nếu suy biến"""
+    n = len(rhs)
+    rows = [list(matrix[i]) + [rhs[i]] for i in range(n)]
+    for col in range(n):
+        pivot = max(range(col, n), key=lambda r: abs(rows[r][col]))
+        if abs(rows[pivot][col]) < 1e-12:
+            return None
+        rows[col], rows[pivot] = rows[pivot], rows[col]
+        for r in range(n):
+            if r != col:
+                factor = rows[r][col] / rows[col][col]
+                rows[r] = [a - factor * b for a, b in zip(rows[r], rows[col])]
+    return [rows[i][n] / rows[i][i] for i in range(n)]
+
+
+@dataclass
+class ChunkCostModel:
+    """Latency và xác suất lỗi theo số ký tự chunk, học từ ``chunk_traces.jsonl``.
+
+    Chỉ lưu thống kê gộp (tổng cho hồi quy bậc hai của latency, số lần thử / lỗi
+    theo từng khoảng 50 ký tự) nên file model nhỏ và cập nhật tăng dần được;
+    ``sources`` nhớ đã đọc tới byte nào của mỗi file trace.
+    """
+
+    latency_sums: list[float] = field(default_factory=lambda: [0.0] * 8)  # n, Σx..Σx⁴, Σy, Σxy, Σx²y
+    failure_bins: dict[str, list[int]] = field(default_factory=dict)  # bin -> [lần thử, lỗi]
+    fail_latency_sum: float = 0.0
+    fail_count: int = 0
+    restart_sum: float = 0.0
+    restart_count: int = 0
+    sources: dict[str, int] = field(default_factory=dict)
+    path: Path | None = field(default=None, repr=False, compare=False)
+    _fit: tuple | None = field(default=None, init=False, repr=False, compare=False)
+
+    @classmethod
+    def load(cls, path: Path = COST_MODEL_FILE) -> "ChunkCostModel":
+        path = Path(path)
+        try:
+            raw = json.loads(path.read_text(encoding="utf-8"))
+            model = cls(**raw)
+        except (OSError, ValueError, TypeError):
+            model = cls()
+        model.path = path
+        return model
+
+    def save(self, path: Path | None = None):
+        path = Path(path or self.path or COST_MODEL_FILE)
+        payload = asdict(self)
+        payload.pop("path")
+        payload.pop("_fit")
+        tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        tmp.write_text(json.dumps(payload, indent=1), encoding="utf-8")
+        tmp.replace(path)
+
+    def observe(self, trace: ChunkTrace):
+        if trace.outcome in ("quota", "cancelled"):
+            return  # Giới hạn tài khoản / bản hedge bị bỏ, không liên quan tới độ dài chunk
+        self._fit = None
+        x = trace.chars / 1000  # Đổi đơn vị cho hệ phương trình khỏi lệch thang
+        bucket = self.failure_bins.setdefault(str(trace.chars // FAILURE_BIN_CHARS), [0, 0])
+        bucket[0] += 1
+        if trace.outcome == "ok":
+            y = trace.latency
+            for i, value in enumerate((1, x, x * x, x ** 3, x ** 4, y, x * y, x * x * y)):
+                self.latency_sums[i] += value
+        else:
+            bucket[1] += 1
+            self.fail_latency_sum += trace.latency
+            self.fail_count += 1
+        if trace.restart_cost > 0:
+            self.restart_sum += trace.restart_cost
+            self.restart_count += 1
+
+    def absorb(self, trace_path: Path) -> int:
+        """Đọc các dòng trace mới (từ lần absorb trước) của một file; trả về số dòng đã đọc"""
+        key = str(Path(trace_path).resolve())
+        offset = self.sources.get(key, 0)
+        try:
+            size = os.path.getsize(trace_path)
+        except OSError:
+            return 0
+        if offset > size:
+            offset = 0  # File bị ghi đè / xóa bớt
+        count = 0
+        with open(trace_path, "rb") as f:
+            f.seek(offset)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break  # Dòng đang ghi dở
+                offset += len(line)
+                if line.strip():
+                    self.observe(ChunkTrace(**json.loads(line)))
+                    count += 1
+        self.sources[key] = offset
+        return count
+
+    @property
+    def samples(self) -> int:
+        return int(self.latency_sums[0])
+
+    def is_ready(self, min_samples: int = 20) -> bool:
+        return self.samples >= min_samples and len(self.failure_bins) >= 3
+
+    def latency_coefficients(self) -> list[float] | None:
+        """[a, b, c] cho latency = a + b·x + c·x² (x = nghìn ký tự); c = 0 nếu không đủ dữ liệu"""
+        n, sx, sx2, sx3, sx4, sy, sxy, sx2y = self.latency_sums
+        if n < 2:
+            return None
+        quadratic = _solve_linear([[n, sx, sx2], [sx, sx2, sx3], [sx2, sx3, sx4]], [sy, sxy, sx2y])
+        if quadratic is not None and quadratic[2] >= 0 and n >= 10:
+            return quadratic
+        linear = _solve_linear([[n, sx], [sx, sx2]], [sy, sxy])
+        return None if linear is None else [linear[0], linear[1], 0.0]
+
+    def failure_coefficients(self, iterations: int = 25, ridge: float = 1e-3) -> tuple[float, float]:
+        """Hồi quy logistic p = σ(α + β·x) trên các bin, bằng Newton-Raphson"""
+        bins = [((int(b) + 0.5) * FAILURE_BIN_CHARS / 1000, n, k) for b, (n, k) in self.failure_bins.items() if n]
+        total = sum(n for _, n, _ in bins)
+        failures = sum(k for _, _, k in bins)
+        rate = (failures + 0.5) / (total + 1)
+        alpha, beta = math.log(rate / (1 - rate)), 0.0
+        for _ in range(iterations):
+            g0 = g1 = h00 = h01 = h11 = 0.0
+            for x, n, k in bins:
+                p = _sigmoid(alpha + beta * x)
+                w = n * p * (1 - p)
+                g0 += k - n * p
+                g1 += (k - n * p) * x
+                h00 += w
+                h01 += w * x
+                h11 += w * x * x
+            g1 -= ridge * beta
+            h11 += ridge
+            step = _solve_linear([[h00, h01], [h01, h11]], [g0, g1])
+            if step is None:
+                break
+            alpha += step[0]
+            beta += step[1]
+            if abs(step[0]) + abs(step[1]) < 1e-9:
+                break
+        return alpha, beta
+
+    def _fitted(self) -> tuple:
+        """(hệ số latency, hệ số logistic) - chỉ fit lại sau khi có trace mới"""
+        if self._fit is None:
+            self._fit = (self.latency_coefficients(), self.failure_coefficients())
+        return self._fit
+
+    def failure_probability(self, chars: int) -> float:
+        alpha, beta = self._fitted()[1]
+        return _sigmoid(alpha + beta * chars / 1000)
+
+    def expected_latency(self, chars: int) -> float:
+        coefficients = self._fitted()[0]
+        if coefficients is None:
+            return 60.0
+        a, b, c = coefficients
+        x = chars / 1000
+        return max(a + b * x + c * x * x, 1.0)
+
+    def expected_chunk_time(self, chars: int, delay: float = 10.0) -> float:
+        """Thời gian kỳ vọng cho một chunk, gồm các lần thử lại (số lần thử ~ phân phối hình học)"""
+        p = min(self.failure_probability(chars), 0.95)
+        fail_cost = self.fail_latency_sum / self.fail_count if self.fail_count else self.expected_latency(chars)
+        restart = self.restart_sum / self.restart_count if self.restart_count else 0.0
+        return self.expected_latency(chars) + delay + p / (1 - p) * (fail_cost + restart + delay)
+
+    def expected_job_time(self, chunks: list[str], delay: float = 10.0) -> float:
+        lengths = Counter(len(chunk) for chunk in chunks)
+        return sum(count * self.expected_chunk_time(chars, delay) for chars, count in lengths.items())
+
+
+def plan_sample(text: str, limit: int = PLAN_SAMPLE_CHARS, windows: int = PLAN_SAMPLE_WINDOWS) -> str:
+    """Mẫu đại diện của ``text`` để chia thử: ``windows`` cụm đoạn văn rải đều, tổng ~``limit`` ký tự.
+
+    Thời gian kỳ vọng là tổng theo từng chunk, nên tỉ lệ giữa các max_length đo trên
+    mẫu cũng đúng cho cả sách.
+    """
+    if len(text) <= limit:
+        return text
+    paragraphs = PARAGRAPH_BREAK_REGEX.split(text)
+    window = limit // windows
+    picked: list[str] = []
+    for start in range(windows):
+        position = start * len(paragraphs) // windows
+        size = 0
+        while position < len(paragraphs) and size < window:
+            picked.append(paragraphs[position][: window - size])
+            size += len(picked[-1])
+            position += 1
+    return "\n\n".join(picked)
+
+
+def estimate_job_time(
+    text: str,
+    model: ChunkCostModel,
+    max_length: int,
+    chunking: str = "greedy",
+    delay: float = 10.0,
+    sample: str | None = None,
+) -> float:
+    """Thời gian kỳ vọng cho cả ``text``, tính trên ``plan_sample`` rồi nhân theo tỉ lệ độ dài"""
+    sample = plan_sample(text) if sample is None else sample
+    if not sample:
+        return 0.0
+    return model.expected_job_time(split_text(sample, max_length, chunking), delay) * len(text) / len(sample)
+
+
+def choose_max_length(
+    text: str,
+    model: ChunkCostModel,
+    cap: int = 999,
+    chunking: str = "greedy",
+    delay: float = 10.0,
+    min_length: int = 200,
+    step: int = 50,
+) -> tuple[int, float]:
+    """Thử chia ``text`` với từng max_length trong [min_length, cap] và chọn giá trị có
+    tổng thời gian kỳ vọng nhỏ nhất; trả về (max_length, giây dự đoán).
+
+    Sách dài chỉ được chia thử trên ``plan_sample`` nên chi phí không tăng theo độ dài sách.
+    """
+    candidates = sorted({*range(min_length, cap, step), cap})
+    sample = plan_sample(text)
+    best: tuple[int, float] | None = None
+    for max_length in candidates:
+        predicted = estimate_job_time(text, model, max_length, chunking, delay, sample)
+        if best is None or predicted < best[1]:
+            best = (max_length, predicted)
+    return best
+
+
+CHUNK_PLAN_FILENAME = "chunk_plan.json"
+
+
+def read_chunk_plan(plan_dir: Path, chunking: str) -> int | None:
+    """max_length đã chọn cho thư mục output này (None nếu chưa có / khác kiểu chia)"""
+    try:
+        plan = json.loads((Path(plan_dir) / CHUNK_PLAN_FILENAME).read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+    return plan.get("max_length") if plan.get("chunking") == chunking else None
+
+
+def plan_max_length(
+    text: str,
+    cap: int = 999,
+    chunking: str = "greedy",
+    delay: float = 10.0,
+    plan_dir: Path | None = None,
+    model: ChunkCostModel | None = None,
+) -> int:
+    """max_length do cost model chọn (tối đa ``cap``).
+
+    Có ``plan_dir`` thì lựa chọn được ghi vào ``chunk_plan.json`` và dùng lại khi
+    resume: model được cập nhật sau mỗi lần chạy, chọn lại sẽ làm lệch ranh giới
+    chunk so với audio đã có.
+    """
+    if plan_dir is not None:
+        planned = read_chunk_plan(plan_dir, chunking)
+        if planned is not None and planned <= cap:
+            print(f"ℹ Dùng lại max_length={planned} đã chọn cho {Path(plan_dir).name}")
+            return planned
+
+    model = model or ChunkCostModel.load()
+    if model.is_ready():
+        max_length, predicted = choose_max_length(text, model, cap, chunking, delay)
+        baseline = estimate_job_time(text, model, cap, chunking, delay)
+        print(f"📐 Cost model chọn max_length={max_length}: dự đoán {format_duration(predicted)} "
+              f"(max_length={cap}: {format_duration(baseline)})")
+    else:
+        max_length = cap
+        print(f"ℹ Cost model mới có {model.samples} mẫu, dùng max_length={cap}")
+
+    if plan_dir is not None:
+        Path(plan_dir).mkdir(parents=True, exist_ok=True)
+        plan = {"max_length": max_length, "chunking": chunking}
+        (Path(plan_dir) / CHUNK_PLAN_FILENAME).write_text(json.dumps(plan), encoding="utf-8")
+    return max_length
+
+
+def update_cost_model(trace_path: Path, model_path: Path = COST_MODEL_FILE) -> int:
+    model = ChunkCostModel.load(model_path)
+    count = model.absorb(trace_path)
+    if count:
+        model.save()
+    return count
+
+
+# ---------------------------------------------------------------------------
+# Batch CLI - nhiều file input trong một phiên Chrome
+# ---------------------------------------------------------------------------
+
+DEFAULT_FILENAME_TEMPLATE = "audio_chunk_{index:04d}.wav"
+CONTENT_FILENAME_TEMPLATE = "audio_chunk_{key}.wav"  # Mặc định cho --chunking content
+DEFAULT_FINAL_FILENAME = "output_final.wav"
+
+
+@dataclass
+class BatchItem:
+    input_file: Path
+    output_dir: Path
+
+
+@dataclass
+class BatchOutcome:
+    item: BatchItem
+    total_chunks: int
+    completed_chunks: int
+    merged_path: Path | None
+    error: str | None = None
+
+
+def find_ffmpeg() -> Path | None:
+    """ffmpeg.exe cạnh script (bản Windows đóng gói sẵn), không có thì ffmpeg trên PATH"""
+    bundled = SCRIPT_DIR / "ffmpeg.exe"
+    if bundled.exists():
+        return bundled
+    found = shutil.which("ffmpeg")
+    return Path(found) if found else None
+
+
+def configure_ffmpeg(ffmpeg_path: Path | None = None) -> bool:
+    """Trỏ pydub (và bước nén FLAC) tới ffmpeg, trả về False nếu không tìm thấy file
+
+    ``None``: tự tìm qua ``find_ffmpeg``.
+    """
+    global FFMPEG_BINARY
+    if ffmpeg_path is None:
+        ffmpeg_path = find_ffmpeg()
+    if ffmpeg_path is None or not ffmpeg_path.exists():
+        return False
+    FFMPEG_BINARY = str(ffmpeg_path.resolve())
+    if AudioSegment is not None:
+        AudioSegment.converter = FFMPEG_BINARY
+        AudioSegment.ffprobe = FFMPEG_BINARY
+    return True
+
+
+def chunk_name_pattern(filename_template: str) -> re.Pattern:
+    """Regex khớp tên chunk sinh từ template (cả bản .wav lẫn .flac), nhóm 1 là index"""
+    stem = Path(filename_template).stem
+    prefix, _, rest = stem.partition("{")
+    _, _, suffix = rest.partition("}")
+    return re.compile(re.escape(prefix) + r"(\d+)" + re.escape(suffix) + r"\.(?:wav|flac)$", re.IGNORECASE)
+
+
+def count_chunks_on_disk(download_dir: Path, filename_template: str) -> int:
+    """Index chunk lớn nhất có trong thư mục (dùng khi không có file text gốc)"""
+    pattern = chunk_name_pattern(filename_template)
+    indices = [int(m.group(1)) for m in map(pattern.match, os.listdir(download_dir)) if m]
+    return max(indices, default=0)
+
+
+def resolve_batch_inputs(patterns: Iterable[str], pattern: str = "*.txt") -> list[Path]:
+    """Mở rộng danh sách file / glob / thư mục thành danh sách file input (không trùng)"""
+    resolved: list[Path] = []
+    seen: set[Path] = set()
+    for raw in patterns:
+        path = Path(raw)
+        if path.is_dir():
+            candidates = sorted(path.glob(pattern))
+        elif glob.has_magic(raw):
+            candidates = sorted(Path(p) for p in glob.glob(raw, recursive=True))
+        else:
+            candidates = [path]
+        for candidate in candidates:
+            if not candidate.is_file():
+                print(f"⚠ Bỏ qua (không phải file): {candidate}")
+                continue
+            key = candidate.resolve()
+            if key in seen:
+                continue
+            seen.add(key)
+            resolved.append(candidate)
+    return resolved
+
+
+def plan_batch(inputs: Iterable[Path], output_root: Path) -> list[BatchItem]:
+    """Mỗi input có thư mục output riêng: <output_root>/<tên file>"""
+    items: list[BatchItem] = []
+    used: set[str] = set()
+    for input_file in inputs:
+        name = input_file.stem
+        counter = itertools.count(2)
+        while name in used:
+            name = f"{input_file.stem}_{next(counter)}"
+        used.add(name)
+        items.append(BatchItem(input_file, output_root / name))
+    return items
+
+
+def run_batch(
+    items: list[BatchItem],
+    max_length: int = 999,
+    filename_template: str = DEFAULT_FILENAME_TEMPLATE,
+    final_filename: str = DEFAULT_FINAL_FILENAME,
+    delay_between_downloads: float = 10.0,
+    page_load_wait: float = 20.0,
+    postprocess: PostProcessConfig | None = None,
+    backend: str = "selenium",
+    chunk_format: str = "wav",
+    profiles: ProfileRegistry | None = None,
+    watchdog: WatchdogConfig | None = None,
+    snapshot: bool = False,
+    chunking: str = "greedy",
+    adaptive: bool = False,
+    profiling: ProfilingConfig | None = None,
+    progressive: bool = False,
+    live_stream: LiveStream | None = None,
+) -> list[BatchOutcome]:
+    """Chạy tất cả input qua MỘT phiên Chrome, không có prompt tương tác
+
+    ``adaptive``: mỗi input dùng max_length do ChunkCostModel chọn (``max_length`` là giới hạn trên).
+    ``profiling``: báo cáo profile của mỗi input nằm trong ``<output_dir>/profile``.
+    ``progressive``: nghe dần từng input qua ``<final>.live.wav`` (và ``live_stream`` nếu có).
+    """
+    outcomes: list[BatchOutcome] = []
+    if not items:
+        return outcomes
+
+    session = BrowserSession(
+        items[0].output_dir.parent,
+        interactive=False,
+        page_load_wait=page_load_wait,
+        backend=backend,
+        profiles=profiles,
+        watchdog=watchdog,
+        snapshot=snapshot,
+    )
+    try:
+        for position, item in enumerate(items, start=1):
+            print(f"\n📚 [{position}/{len(items)}] {item.input_file} → {item.output_dir}")
+            try:
+                text = item.input_file.read_text(encoding="utf-8")
+                chunk_length = max_length
+                if adaptive:
+                    chunk_length = plan_max_length(text, max_length, chunking, delay_between_downloads, item.output_dir)
+                chunks = split_text(text, chunk_length, chunking)
+                print(f"📄 Đã chia thành {len(chunks)} chunk")
+                results = automate_google_ai_simple(
+                    chunks,
+                    item.output_dir,
+                    filename_template=filename_template,
+                    delay_between_downloads=delay_between_downloads,
+                    session=session,
+                    chunk_format=chunk_format,
+                    profiling=profiling,
+                    progressive=ProgressiveConfig(final_filename, postprocess, live_stream) if progressive else None,
+                )
+                merged = None
+                if results:
+                    merged = merge_audio_files(item.output_dir, results, len(chunks), final_filename, postprocess)
+                outcomes.append(BatchOutcome(item, len(chunks), len(results), merged))
+            except Exception as e:
+                # Một input lỗi không được làm hỏng cả batch
+                print(f"❌ Lỗi với {item.input_file}: {e}")
+                outcomes.append(BatchOutcome(item, 0, 0, None, error=str(e)))
+    finally:
+        session.close()
+
+    print("\n📊 Tổng kết batch:")
+    for outcome in outcomes:
+        if outcome.error:
+            status = f"❌ {outcome.error}"
+        elif outcome.merged_path:
+            status = f"✅ {outcome.merged_path.name}"
+        else:
+            status = "⚠ chưa merge"
+        print(f"   {outcome.item.input_file.name}: {outcome.completed_chunks}/{outcome.total_chunks} chunk - {status}")
+    return outcomes
+
+
+TEMPLATE_HELP = (
+    f"Tên file chunk, dùng {{index}} hoặc {{key}} (hash nội dung). Mặc định: "
+    f"{DEFAULT_FILENAME_TEMPLATE} hoặc {CONTENT_FILENAME_TEMPLATE} với --chunking content"
+)
+
+
+ADAPTIVE_HELP = "Để cost model (chunk_cost_model.json) chọn độ dài chunk, --max-length là giới hạn trên"
+
+
+def add_chunking_argument(parser: argparse.ArgumentParser):
+    parser.add_argument("--chunking", choices=CHUNKING_MODES, default="greedy",
+                        help="greedy: đóng gói câu tối đa; content: ranh giới theo nội dung, "
+                             "sửa text chỉ làm đổi vài chunk")
+
+
+def filename_template_for(args: argparse.Namespace) -> str:
+    if args.template:
+        return args.template
+    return CONTENT_FILENAME_TEMPLATE if args.chunking == "content" else DEFAULT_FILENAME_TEMPLATE
+
+
+def build_arg_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Tự động tạo audio TTS từ Google AI Studio")
+    subparsers = parser.add_subparsers(dest="command")
+
+    batch = subparsers.add_parser("batch", help="Xử lý nhiều file input trong một phiên Chrome")
+    batch.add_argument("inputs", nargs="+", help="File, glob hoặc thư mục chứa file .txt")
+    batch.add_argument("-o", "--output-root", type=Path, default=SCRIPT_DIR / "downloads",
+                       help="Thư mục gốc; mỗi input có thư mục con riêng")
+    batch.add_argument("--pattern", default="*.txt", help="Glob dùng khi input là thư mục")
+    batch.add_argument("--max-length", type=int, default=999)
+    add_chunking_argument(batch)
+    batch.add_argument("--adaptive", action="store_true", help=ADAPTIVE_HELP)
+    batch.add_argument("--template", default=None, help=TEMPLATE_HELP)
+    batch.add_argument("--final-name", default=DEFAULT_FINAL_FILENAME)
+    batch.add_argument("--delay", type=float, default=10.0, help="Số giây chờ giữa các chunk")
+    batch.add_argument("--page-load-wait", type=float, default=20.0)
+    batch.add_argument("--ffmpeg", type=Path, help="Mặc định: ffmpeg.exe cạnh script, rồi ffmpeg trên PATH")
+    batch.add_argument("--backend", choices=BACKENDS, default="selenium",
+                       help="selenium (qua chromedriver) hoặc cdp (DevTools trực tiếp)")
+    batch.add_argument("--chunk-format", choices=CHUNK_FORMATS, default="wav",
+                       help="Lưu chunk trung gian dạng WAV hoặc FLAC (nhỏ hơn ~50%%, cần ffmpeg)")
+    batch.add_argument("--rotate-profiles", action="store_true",
+                       help="Xoay vòng các profile trong profiles.json theo quota")
+    batch.add_argument("--profile-snapshot", action="store_true",
+                       help="Chạy Chrome trên bản sao profile trong tmpfs (không lock profile gốc)")
+    add_postprocess_arguments(batch)
+    add_watchdog_arguments(batch)
+    add_profiling_arguments(batch)
+    add_live_arguments(batch)
+
+    profiles = subparsers.add_parser("profiles", help="Quản lý các profile (tài khoản) Chrome")
+    profiles_sub = profiles.add_subparsers(dest="profiles_command", required=True)
+    profiles_sub.add_parser("list", help="Liệt kê profile và quota đã dùng")
+    add = profiles_sub.add_parser("add", help="Tạo profile mới và đăng nhập")
+    add.add_argument("name")
+    add.add_argument("--quota", type=int, default=0, help="Số chunk tối đa mỗi ngày (0 = không giới hạn)")
+    quota = profiles_sub.add_parser("quota", help="Đặt quota hằng ngày cho profile")
+    quota.add_argument("name")
+    quota.add_argument("quota", type=int)
+    reset = profiles_sub.add_parser("reset", help="Xóa cooldown của profile")
+    reset.add_argument("name")
+
+    split = subparsers.add_parser("split", help="Chỉ chia text thành chunk (không mở trình duyệt)")
+    split.add_argument("input", type=Path)
+    split.add_argument("--max-length", type=int, default=999)
+    add_chunking_argument(split)
+    split.add_argument("--adaptive", action="store_true", help=ADAPTIVE_HELP)
+    split.add_argument("-o", "--out", type=Path, help="Ghi mỗi chunk ra chunk_XXXX.txt trong thư mục này")
+    split.add_argument("--count", action="store_true", help="Chỉ in số chunk")
+
+    merge = subparsers.add_parser("merge", help="Chỉ merge lại các chunk đã có (không mở trình duyệt)")
+    merge.add_argument("download_dir", type=Path)
+    merge.add_argument("--template", default=None, help=TEMPLATE_HELP)
+    merge.add_argument("--final-name", default=DEFAULT_FINAL_FILENAME)
+    merge_size = merge.add_mutually_exclusive_group()
+    merge_size.add_argument("--chunks", type=int, help="Tổng số chunk (mặc định: index lớn nhất tìm thấy)")
+    merge_size.add_argument("--text", type=Path, help="File text gốc để tính tổng số chunk")
+    merge.add_argument("--max-length", type=int, default=999)
+    add_chunking_argument(merge)
+    merge.add_argument("--ffmpeg", type=Path,
+                       help="Chỉ cần cho chunk FLAC hoặc chunk khác format (mặc định: ffmpeg.exe cạnh script / PATH)")
+    add_postprocess_arguments(merge)
+
+    queue = subparsers.add_parser("queue", help="Hàng đợi chunk dùng chung cho nhiều worker")
+    queue_sub = queue.add_subparsers(dest="queue_command", required=True)
+    enqueue = queue_sub.add_parser("enqueue", help="Chia text và đưa chunk vào hàng đợi")
+    enqueue.add_argument("input", type=Path)
+    enqueue.add_argument("--max-length", type=int, default=999)
+    add_chunking_argument(enqueue)
+    enqueue.add_argument("--adaptive", action="store_true", help=ADAPTIVE_HELP)
+    status = queue_sub.add_parser("status", help="Tiến độ các job")
+    retry = queue_sub.add_parser("retry-failed", help="Đưa chunk failed về lại hàng đợi")
+    configure = queue_sub.add_parser("set", help="Đổi priority / weight / deadline của job đang chờ")
+    for sub in (enqueue, status, retry, configure):
+        sub.add_argument("--queue", type=Path, required=True, help="File SQLite trên ổ dùng chung")
+        sub.add_argument("--job", required=sub is configure, help="Tên job (mặc định: tên file input)")
+    for sub in (enqueue, configure):
+        sub.add_argument("--priority", type=int, help="Job priority cao hơn chạy trước (mặc định 0)")
+        sub.add_argument("--weight", type=float, help="Tỉ lệ chia worker giữa các job cùng priority (mặc định 1)")
+        sub.add_argument("--deadline", type=parse_deadline,
+                         help="Hạn xong: thời lượng (90m, 2h) hoặc thời điểm ISO; sắp trễ thì được chạy trước")
+        sub.add_argument("--download-dir", type=Path, help="Thư mục chunk của job cho worker chạy theo lịch")
+    configure.add_argument("--no-deadline", action="store_true", help="Bỏ deadline của job")
+
+    worker = subparsers.add_parser("worker", help="Nhận chunk từ hàng đợi và generate cho tới khi hết")
+    worker.add_argument("--queue", type=Path, required=True)
+    worker.add_argument("--job", help="Chỉ làm job này; bỏ trống thì làm mọi job theo JobScheduler")
+    worker.add_argument("--download-dir", type=Path, required=True,
+                        help="Thư mục chunk dùng chung của job (không có --job: thư mục gốc, mỗi job một thư mục con)")
+    worker.add_argument("--quantum", type=int, default=5,
+                        help="Số chunk làm liền cho một job trước khi chia lượt cho job cùng priority")
+    worker.add_argument("--hedge", action="store_true",
+                        help="Hết chunk để nhận thì chạy song song chunk đang chậm ở worker khác, bản xong trước thắng")
+    worker.add_argument("--hedge-quantile", type=float, default=0.95,
+                        help="Chunk chạy lâu hơn percentile latency này mới được hedge")
+    worker.add_argument("--worker-id", default=None, help="Mặc định: hostname:pid")
+    worker.add_argument("--lease", type=float, default=DEFAULT_LEASE_SECONDS, help="Giây giữ một chunk")
+    worker.add_argument("--template", default=None, help=TEMPLATE_HELP)
+    add_chunking_argument(worker)
+    worker.add_argument("--delay", type=float, default=10.0)
+    worker.add_argument("--backend", choices=BACKENDS, default="selenium")
+    worker.add_argument("--chunk-format", choices=CHUNK_FORMATS, default="wav")
+    worker.add_argument("--rotate-profiles", action="store_true")
+    worker.add_argument("--profile-snapshot", action=argparse.BooleanOptionalAction, default=True,
+                        help="Chạy trên bản sao tmpfs của profile (mặc định bật: nhiều worker trên một "
+                             "máy dùng chung tài khoản; --no-profile-snapshot chỉ khi máy có một worker)")
+    worker.add_argument("--merge", action="store_true", help="Merge khi mọi chunk của job đã xong")
+    worker.add_argument("--final-name", default=DEFAULT_FINAL_FILENAME)
+    worker.add_argument("--ffmpeg", type=Path, help="Mặc định: ffmpeg.exe cạnh script, rồi ffmpeg trên PATH")
+    add_watchdog_arguments(worker)
+    add_profiling_arguments(worker)
+    add_live_arguments(worker)
+
+    simulate = subparsers.add_parser("simulate", help="Dự đoán thời gian job từ trace đã ghi")
+    simulate.add_argument("traces", nargs="+", type=Path, help=f"File {TRACE_FILENAME}")
+    size = simulate.add_mutually_exclusive_group(required=True)
+    size.add_argument("--chunks", type=int, help="Số chunk của sách")
+    size.add_argument("--text", type=Path, help="File text, đếm chunk bằng smart_split")
+    simulate.add_argument("--max-length", type=int, default=999)
+    add_chunking_argument(simulate)
+    simulate.add_argument("--workers", type=int, nargs="+", default=[1])
+    simulate.add_argument("--tabs", type=int, nargs="+", default=[1], help="Số tab mỗi trình duyệt")
+    simulate.add_argument("--delay", type=float, nargs="+", default=[10.0])
+    simulate.add_argument("--retries", type=int, nargs="+", default=[3])
+    simulate.add_argument("--timeout", type=float, default=120.0)
+    simulate.add_argument("--runs", type=int, default=200)
+    simulate.add_argument("--seed", type=int, default=0)
+
+    cost = subparsers.add_parser("cost-model", help="Cost model độ dài chunk (dùng cho --adaptive)")
+    cost_sub = cost.add_subparsers(dest="cost_command", required=True)
+    update = cost_sub.add_parser("update", help="Học thêm từ file trace (chỉ đọc phần mới)")
+    update.add_argument("traces", nargs="+", type=Path, help=f"File {TRACE_FILENAME}")
+    show = cost_sub.add_parser("show", help="In latency / tỉ lệ lỗi / thời gian kỳ vọng theo độ dài chunk")
+    show.add_argument("--delay", type=float, default=10.0)
+    show.add_argument("--text", type=Path, help="Chọn max_length cho file text này")
+    show.add_argument("--max-length", type=int, default=999)
+    add_chunking_argument(show)
+    for sub in (update, show):
+        sub.add_argument("--model", type=Path, default=COST_MODEL_FILE)
+    return parser
+
+
+def add_postprocess_arguments(parser: argparse.ArgumentParser):
+    group = parser.add_argument_group("post-processing khi merge (cần numpy)")
+    group.add_argument("--postprocess", action="store_true", help="Bật trim/normalize/gap khi merge")
+    group.add_argument("--no-trim", action="store_true", help="Không cắt im lặng đầu/cuối chunk")
+    group.add_argument("--silence-db", type=float, default=-50.0)
+    group.add_argument("--normalize", choices=["rms", "peak", "none"], default="rms")
+    group.add_argument("--target-db", type=float, default=-20.0)
+    group.add_argument("--gap-ms", type=int, default=300)
+
+
+def postprocess_from_args(args: argparse.Namespace) -> PostProcessConfig | None:
+    if not args.postprocess:
+        return None
+    return PostProcessConfig(
+        trim_silence=not args.no_trim,
+        silence_threshold_db=args.silence_db,
+        normalize=None if args.normalize == "none" else args.normalize,
+        target_db=args.target_db,
+        gap_ms=args.gap_ms,
+    )
+
+
+def add_watchdog_arguments(parser: argparse.ArgumentParser):
+    group = parser.add_argument_group("watchdog bộ nhớ trình duyệt")
+    group.add_argument("--no-watchdog", action="store_true", help="Không theo dõi RSS / latency của Chrome")
+    group.add_argument("--max-rss-mb", type=float, default=3000.0, help="RSS tối đa của cây process Chrome")
+    group.add_argument("--max-latency-drift", type=float, default=1.8,
+                       help="Latency gấp bao nhiêu lần lúc đầu thì tải lại tab")
+    group.add_argument("--recycle-every", type=int, default=0, help="Khởi động lại Chrome sau N chunk (0 = tắt)")
+
+
+def watchdog_from_args(args: argparse.Namespace) -> WatchdogConfig:
+    return WatchdogConfig(
+        enabled=not args.no_watchdog,
+        max_rss_mb=args.max_rss_mb,
+        max_latency_drift=args.max_latency_drift,
+        recycle_every=args.recycle_every,
+    )
+
+
+def add_profiling_arguments(parser: argparse.ArgumentParser):
+    group = parser.add_argument_group("profiling (opt-in, cho job chạy lâu)")
+    group.add_argument("--profile", action="store_true",
+                       help="Ghi CPU / bộ nhớ từng chunk và diff tracemalloc vào <thư mục output>/profile")
+    group.add_argument("--profile-dir", type=Path, help="Thư mục ghi báo cáo profile thay cho mặc định")
+    group.add_argument("--profile-every", type=int, default=20, help="Chụp tracemalloc sau mỗi N chunk (0 = tắt)")
+    group.add_argument("--profiler", choices=PROFILERS, help="Bọc từng chunk bằng profiler CPU")
+
+
+def add_live_arguments(parser: argparse.ArgumentParser):
+    group = parser.add_argument_group("nghe dần trong lúc generate")
+    group.add_argument("--live", action="store_true",
+                       help="Ghi các chunk đầu đã xong ra <final>.live.wav ngay khi có (mở bằng player bất kỳ)")
+    group.add_argument("--live-http", type=int, metavar="PORT",
+                       help="Phát output nghe dần qua http://127.0.0.1:PORT/ (kéo theo --live)")
+    group.add_argument("--live-fifo", type=Path, metavar="PATH",
+                       help="Phát output nghe dần qua named pipe, Linux / macOS (kéo theo --live)")
+
+
+def live_stream_from_args(args: argparse.Namespace) -> LiveStream | None:
+    if args.live_http is None and args.live_fifo is None:
+        return None
+    return LiveStream(http_port=args.live_http, fifo=args.live_fifo)
+
+
+def live_enabled(args: argparse.Namespace) -> bool:
+    return args.live or args.live_http is not None or args.live_fifo is not None
+
+
+def profiling_from_args(args: argparse.Namespace) -> ProfilingConfig | None:
+    if not (args.profile or args.profile_dir or args.profiler):
+        return None
+    return ProfilingConfig(output_dir=args.profile_dir, snapshot_every=args.profile_every, profiler=args.profiler)
+
+def run_batch_command(args: argparse.Namespace) -> int:
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+
+    if not configure_ffmpeg(args.ffmpeg):
+        print(f"❌ Không tìm thấy ffmpeg: {args.ffmpeg or 'ffmpeg.exe cạnh script hoặc trên PATH'}")
+        return 1
+
+    inputs = resolve_batch_inputs(args.inputs, args.pattern)
+    if not inputs:
+        print("❌ Không có file input nào")
+        return 1
+
+    items = plan_batch(inputs, args.output_root)
+    live_stream = live_stream_from_args(args)
+    try:
+        outcomes = run_batch(
+            items,
+            max_length=args.max_length,
+            filename_template=filename_template_for(args),
+            final_filename=args.final_name,
+            delay_between_downloads=args.delay,
+            page_load_wait=args.page_load_wait,
+            postprocess=postprocess_from_args(args),
+            backend=args.backend,
+            chunk_format=args.chunk_format,
+            profiles=ProfileRegistry() if args.rotate_profiles else None,
+            watchdog=watchdog_from_args(args),
+            snapshot=args.profile_snapshot,
+            chunking=args.chunking,
+            adaptive=args.adaptive,
+            profiling=profiling_from_args(args),
+            progressive=live_enabled(args),
+            live_stream=live_stream,
+        )
+    finally:
+        if live_stream is not None:
+            live_stream.close()
+    return 0 if all(o.merged_path for o in outcomes) else 2
+
+
+def run_profiles_command(args: argparse.Namespace) -> int:
+    registry = ProfileRegistry()
+    if args.profiles_command == "add":
+        setup_chrome_profile(interactive=True, profile_path=SCRIPT_DIR / args.name)
+        registry.add(args.name, daily_quota=args.quota)
+        print(f"✓ Đã thêm profile {args.name}")
+    elif args.profiles_command in ("quota", "reset"):
+        state = registry.profiles.get(args.name)
+        if state is None:
+            print(f"❌ Không có profile {args.name}")
+            return 1
+        if args.profiles_command == "quota":
+            registry.add(args.name, daily_quota=args.quota)
+        else:
+            registry.reset(args.name)
+
+    now = time.time()
+    for state in registry.profiles.values():
+        quota = state.daily_quota or "∞"
+        status = "✓ sẵn sàng" if state.is_available(now) else "⏸ đang nghỉ"
+        if state.cooldown_until > now:
+            status += f" tới {datetime.datetime.fromtimestamp(state.cooldown_until):%H:%M} ({state.last_signal})"
+        print(f"   {state.name}: {state.used_today}/{quota} hôm nay, tổng {state.total_used} - {status}")
+    return 0
+
+
+def run_split_command(args: argparse.Namespace) -> int:
+    max_length = args.max_length
+    if args.adaptive:
+        max_length = plan_max_length(args.input.read_text(encoding="utf-8"), max_length, args.chunking)
+    chunks = split_text_file(args.input, max_length, args.chunking)
+    if args.count:
+        print(len(chunks))
+        return 0
+    if args.out is None:
+        for index, chunk in enumerate(chunks, start=1):
+            record = {"index": index, "key": chunk_key(chunk), "text": chunk}
+            sys.stdout.write(json.dumps(record, ensure_ascii=False) + "\n")
+        return 0
+    args.out.mkdir(parents=True, exist_ok=True)
+    for index, chunk in enumerate(chunks, start=1):
+        (args.out / f"chunk_{index:04d}.txt").write_text(chunk, encoding="utf-8")
+    print(f"✓ {len(chunks)} chunk → {args.out}")
+    return 0
+
+
+def run_merge_command(args: argparse.Namespace) -> int:
+    configure_ffmpeg(args.ffmpeg)  # Không bắt buộc: WAV cùng format merge không cần ffmpeg
+    template = filename_template_for(args)
+    keys = None
+    if args.text is not None:
+        # Chia đúng như lúc tạo: --adaptive đã ghi max_length vào chunk_plan.json
+        max_length = read_chunk_plan(args.download_dir, args.chunking) or args.max_length
+        chunks = split_text_file(args.text, max_length, args.chunking)
+        keys = [chunk_key(chunk) for chunk in chunks]
+        total = len(chunks)
+    elif "{key" in template:
+        print("❌ Template theo nội dung ({key}) cần --text để biết thứ tự chunk")
+        return 1
+    elif args.chunks is not None:
+        total = args.chunks
+    else:
+        total = count_chunks_on_disk(args.download_dir, template)
+    if total == 0:
+        print(f"❌ Không có chunk nào trong {args.download_dir}")
+        return 1
+    results = collect_chunk_results(args.download_dir, template, total, keys=keys)
+    merged = merge_audio_files(args.download_dir, results, total, args.final_name, postprocess_from_args(args))
+    return 0 if merged else 1
+
+
+def run_queue_command(args: argparse.Namespace) -> int:
+    queue = ChunkQueue(args.queue)
+    try:
+        if args.queue_command == "enqueue":
+            job = args.job or args.input.stem
+            max_length = args.max_length
+            if args.adaptive:
+                max_length = plan_max_length(args.input.read_text(encoding="utf-8"), max_length, args.chunking)
+            count = queue.enqueue(job, split_text_file(args.input, max_length, args.chunking))
+            queue.configure_job(job, **job_settings_from_args(args))
+            print(f"✓ Job {job}: {count} chunk trong hàng đợi")
+        elif args.queue_command == "retry-failed":
+            print(f"✓ Đưa {queue.retry_failed(args.job)} chunk về hàng đợi")
+        elif args.queue_command == "set":
+            queue.configure_job(args.job, **job_settings_from_args(args))
+        for job in [args.job] if args.job else queue.jobs():
+            progress = queue.progress(job)
+            total = sum(progress.values())
+            summary = ", ".join(f"{state}: {count}" for state, count in sorted(progress.items()))
+            print(f"   {job}: {progress.get('done', 0)}/{total} xong ({summary}){describe_job_settings(queue.job_settings(job))}")
+    finally:
+        queue.close()
+    return 0
+
+
+def job_settings_from_args(args: argparse.Namespace) -> dict:
+    settings = {name: getattr(args, name) for name in ("priority", "weight", "deadline") if getattr(args, name) is not None}
+    if args.download_dir is not None:
+        settings["download_dir"] = str(args.download_dir.resolve())
+    if getattr(args, "no_deadline", False):
+        settings["deadline"] = None
+    return settings
+
+
+def describe_job_settings(settings: dict) -> str:
+    parts = []
+    if settings["priority"]:
+        parts.append(f"priority {settings['priority']}")
+    if settings["weight"] != 1:
+        parts.append(f"weight {settings['weight']:g}")
+    if settings["deadline"] is not None:
+        deadline = datetime.datetime.fromtimestamp(settings["deadline"])
+        parts.append(f"deadline {deadline:%Y-%m-%d %H:%M}")
+    return f" [{', '.join(parts)}]" if parts else ""
+
+
+def worker_session(args: argparse.Namespace) -> BrowserSession:
+    return BrowserSession(
+        args.download_dir,
+        interactive=False,
+        backend=args.backend,
+        profiles=ProfileRegistry() if args.rotate_profiles else None,
+        watchdog=watchdog_from_args(args),
+        snapshot=args.profile_snapshot,
+    )
+
+
+def merge_queue_job(queue: ChunkQueue, job: str, download_dir: Path, args: argparse.Namespace) -> Path | None:
+    chunks = queue.job_chunks(job)
+    keys = [chunk_key(chunk) for chunk in chunks]
+    results = collect_chunk_results(download_dir, filename_template_for(args), len(chunks), keys=keys)
+    return merge_audio_files(download_dir, results, len(chunks), args.final_name)
+
+
+def run_scheduled_worker(args: argparse.Namespace, queue: ChunkQueue, live_stream: LiveStream | None = None) -> int:
+    """Worker không gắn với một job: mỗi lượt hỏi JobScheduler nên làm job nào.
+
+    Job không có download_dir trong hàng đợi dùng ``<--download-dir>/<job>``.
+    """
+    scheduler = JobScheduler(ChunkCostModel.load(COST_MODEL_FILE), delay=args.delay, quantum=args.quantum)
+    worker_id = args.worker_id or default_worker_id()
+    session = worker_session(args)
+    touched: dict[str, Path] = {}
+    stalled = 0
+    try:
+        while True:
+            job = scheduler.next_job(queue)
+            if job is None:
+                leased = [name for name in queue.jobs() if queue.progress(name).get("leased")]
+                if not leased:
+                    break
+                if not args.hedge:
+                    time.sleep(min(args.lease / 4, 15))  # Chunk còn lại đang do worker khác giữ
+                    continue
+                job = leased[0]  # automate chờ chunk của job này và hedge chunk chậm
+            download_dir = Path(queue.job_settings(job)["download_dir"] or args.download_dir / job)
+            touched[job] = download_dir
+            done_before = len(queue.done_indices(job))
+            print(f"\n📋 Job {job} → {download_dir}")
+            automate_google_ai_simple(
+                queue.job_chunks(job),
+                download_dir,
+                filename_template=filename_template_for(args),
+                delay_between_downloads=args.delay,
+                session=session,
+                chunk_format=args.chunk_format,
+                queue=queue,
+                job=job,
+                worker_id=worker_id,
+                lease_seconds=args.lease,
+                profiling=profiling_from_args(args),
+                scheduler=scheduler,
+                hedge_quantile=args.hedge_quantile if args.hedge else None,
+                progressive=ProgressiveConfig(args.final_name, stream=live_stream) if live_enabled(args) else None,
+            )
+            # automate dừng vì lỗi (hết profile, Chrome hỏng liên tục) thì đừng quay vòng mãi
+            stalled = 0 if len(queue.done_indices(job)) > done_before else stalled + 1
+            if stalled >= 3:
+                print("❌ Nhiều lượt liền không xong chunk nào, dừng worker")
+                break
+    finally:
+        session.close()
+
+    failed = False
+    for job, download_dir in touched.items():
+        progress = queue.progress(job)
+        total = sum(progress.values())
+        print(f"📊 Job {job}: {progress.get('done', 0)}/{total} chunk xong")
+        failed |= bool(progress.get("failed"))
+        if args.merge and progress.get("done", 0) == total:
+            merge_queue_job(queue, job, download_dir, args)
+    return 2 if failed else 0
+
+
+def run_worker_command(args: argparse.Namespace) -> int:
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    configure_ffmpeg(args.ffmpeg)
+    queue = ChunkQueue(args.queue)
+    live_stream = live_stream_from_args(args)
+    try:
+        if args.job is None:
+            return run_scheduled_worker(args, queue, live_stream)
+        chunks = queue.job_chunks(args.job)
+        if not chunks:
+            print(f"❌ Job {args.job} chưa có trong hàng đợi (dùng 'queue enqueue' trước)")
+            return 1
+        session = worker_session(args)
+        try:
+            automate_google_ai_simple(
+                chunks,
+                args.download_dir,
+                filename_template=filename_template_for(args),
+                delay_between_downloads=args.delay,
+                session=session,
+                chunk_format=args.chunk_format,
+                queue=queue,
+                job=args.job,
+                worker_id=args.worker_id,
+                lease_seconds=args.lease,
+                profiling=profiling_from_args(args),
+                hedge_quantile=args.hedge_quantile if args.hedge else None,
+                progressive=ProgressiveConfig(args.final_name, stream=live_stream) if live_enabled(args) else None,
+            )
+        finally:
+            session.close()
+
+        progress = queue.progress(args.job)
+        print(f"📊 Job {args.job}: {progress.get('done', 0)}/{len(chunks)} chunk xong")
+        if args.merge and progress.get("done", 0) == len(chunks):
+            merge_queue_job(queue, args.job, args.download_dir, args)
+        return 0 if progress.get("failed", 0) == 0 else 2
+    finally:
+        queue.close()
+        if live_stream is not None:
+            live_stream.close()
+
+
+def run_simulate_command(args: argparse.Namespace) -> int:
+    model = TraceModel(load_traces(args.traces))
+    chunks = args.chunks if args.chunks is not None else len(split_text_file(args.text, args.max_length, args.chunking))
+    print(f"📈 Trace: latency trung vị {statistics.median(model.ok_latency):.1f}s, "
+          f"tỉ lệ lỗi {model.failure_rate:.1%}, restart trung vị {statistics.median(model.restart_cost):.1f}s")
+    print(f"📚 Mô phỏng {chunks} chunk x {args.runs} lần\n")
+    print(f"{'workers':>7} {'tabs':>4} {'delay':>6} {'retry':>5} | {'trung bình':>11} {'p90':>11} {'bỏ cuộc':>8} {'lần thử/chunk':>13}")
+    for workers, tabs, delay, retries in itertools.product(args.workers, args.tabs, args.delay, args.retries):
+        config = SimulationConfig(
+            workers=workers,
+            tabs_per_browser=tabs,
+            delay_between_downloads=delay,
+            max_retries=retries,
+            timeout=args.timeout,
+            runs=args.runs,
+            seed=args.seed,
+        )
+        result = simulate_schedule(model, chunks, config)
+        print(f"{workers:>7} {tabs:>4} {delay:>6g} {retries:>5} | "
+              f"{format_duration(result.wall_clock_mean):>11} {format_duration(result.wall_clock_p90):>11} "
+              f"{result.failure_rate:>8.2%} {result.attempts_per_chunk:>13.2f}")
+    return 0
+
+
+def run_cost_model_command(args: argparse.Namespace) -> int:
+    model = ChunkCostModel.load(args.model)
+    if args.cost_command == "update":
+        count = sum(model.absorb(path) for path in args.traces)
+        model.save()
+        print(f"✓ Đã học thêm {count} trace ({model.samples} lần thử thành công trong model)")
+        return 0
+
+    if model.samples < 2:
+        print(f"❌ Model chưa có dữ liệu ({args.model}), chạy 'cost-model update' trước")
+        return 1
+    print(f"{'ký tự':>6} | {'latency':>8} {'P(lỗi)':>7} {'kỳ vọng':>8} {'giây/1000 ký tự':>16}")
+    for chars in range(200, args.max_length + 1, 100):
+        expected = model.expected_chunk_time(chars, args.delay)
+        print(f"{chars:>6} | {model.expected_latency(chars):>7.1f}s {model.failure_probability(chars):>7.1%} "
+              f"{expected:>7.1f}s {expected * 1000 / chars:>15.1f}s")
+    if args.text is not None:
+        text = args.text.read_text(encoding="utf-8")
+        plan_max_length(text, args.max_length, args.chunking, args.delay, model=model)
+    return 0
+
+
+def main(argv: list[str] | None = None):
+    args = build_arg_parser().parse_args(argv)
+    if args.command == "batch":
+        return run_batch_command(args)
+    if args.command == "profiles":
+        return run_profiles_command(args)
+    if args.command == "simulate":
+        return run_simulate_command(args)
+    if args.command == "split":
+        return run_split_command(args)
+    if args.command == "queue":
+        return run_queue_command(args)
+    if args.command == "worker":
+        return run_worker_command(args)
+    if args.command == "merge":
+        return run_merge_command(args)
+    if args.command == "cost-model":
+        return run_cost_model_command(args)
+
+    input_file = SCRIPT_DIR / "input.txt"
+    download_dir = SCRIPT_DIR / "downloads"
+    filename_template = DEFAULT_FILENAME_TEMPLATE
+    final_filename = DEFAULT_FINAL_FILENAME
+
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+
+    ffmpeg_path = SCRIPT_DIR / "ffmpeg.exe"
+    if not configure_ffmpeg(ffmpeg_path):
+        print("❌ Thiếu ffmpeg.exe trong cùng thư mục với script.")
+        input("Nhấn Enter để thoát...")
+        return
+
+    if not input_file.exists():
+        print(f"❌ Không tìm thấy file 'input.txt' trong thư mục: {SCRIPT_DIR}")
+        input("Nhấn Enter để thoát...")
+        return
+
+    print("🚀 Bắt đầu automation...")
+    chunks = split_text_file(input_file)
+    print(f"📄 Đã chia thành {len(chunks)} chunk")
+
+    results = automate_google_ai_simple(
+        chunks, 
+        download_dir, 
+        filename_template=filename_template
+    )
+    
+    print(f"\n📊 Kết quả: {len(results)}/{len(chunks)} chunk có trong thư mục 'downloads'")
+    
+    if results:
+        merge_audio_files(download_dir, results, len(chunks), final_filename)
+    
+    print("\n🎉 Hoàn tất!")
+    input("Nhấn Enter để thoát...")